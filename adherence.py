@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ALL_DAYS_MASK = 0b1111111
+
+
+def weekday_mask(frequency: str) -> int:
+    """Bit ``i`` is set when the reminder fires on weekday ``i`` (Monday is 0)."""
+    if frequency == "Daily":
+        return ALL_DAYS_MASK
+    if frequency == "Once":
+        # One-shot reminders are scheduled by their Date, not by weekday
+        return 0
+    days = {d.strip() for d in (frequency or "").split(",")}
+    return sum(1 << i for i, name in enumerate(WEEKDAYS) if name in days)
+
+
+def _day(value) -> np.datetime64:
+    try:
+        return np.datetime64(value, "D")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "D")
+
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday
+    return (days.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+def daily_counts(medicines, timestamps) -> pd.DataFrame:
+    """Doses taken per day (rows) and medicine (columns)."""
+    if len(medicines) == 0:
+        return pd.DataFrame(dtype=np.int64, index=pd.DatetimeIndex([], name="day"))
+    frame = pd.DataFrame(
+        {"day": pd.DatetimeIndex(timestamps).normalize(), "medicine": medicines}
+    )
+    return frame.groupby(["day", "medicine"]).size().unstack(fill_value=0)
+
+
+class AdherenceRollup:
+    """Materialized per-day taken counts for completed days.
+
+    Each refresh only needs the history recorded since ``next_day``; today is
+    never materialized because its doses may still be taken.
+    """
+
+    def __init__(self):
+        self.taken = daily_counts([], [])
+        self.next_day = None
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.taken.__sizeof__()
+
+    def extend(self, medicines, timestamps, today: pd.Timestamp):
+        counts = daily_counts(medicines, timestamps)
+        counts = counts[counts.index < today]
+        if not counts.empty:
+            self.taken = (
+                pd.concat([self.taken, counts])
+                .groupby(level=0)
+                .sum()
+                .fillna(0)
+                .astype(np.int64)
+            )
+        self.next_day = today
+
+
+def _longest_run(flags: np.ndarray) -> int:
+    padded = np.concatenate(([0], flags.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return int((ends - starts).max()) if len(starts) else 0
+
+
+def _trailing_run(flags: np.ndarray) -> int:
+    misses = np.flatnonzero(~flags)
+    return int(len(flags) - misses[-1] - 1) if len(misses) else len(flags)
+
+
+def compute_adherence(taken: pd.DataFrame, reminders: list, start, end) -> dict:
+    """Doses taken vs scheduled between ``start`` and ``end`` (inclusive days).
+
+    Every reminder contributes one scheduled dose on each day its weekday mask
+    allows, from the day it was ``Created`` on; a "Once" reminder only on its
+    ``Date``. Reminders saved before they carried a creation date count over
+    the whole window. On a given day a medicine's doses are filled in reminder-time order,
+    so with two reminders and one dose taken the later one counts as missed.
+    """
+    days = np.arange(
+        np.datetime64(pd.Timestamp(start).date(), "D"),
+        np.datetime64(pd.Timestamp(end).date(), "D") + 1,
+    )
+    reminders = sorted(
+        (r for r in reminders if r.get("Medicine") and r.get("Time")),
+        key=lambda r: (r["Medicine"], r["Time"]),
+    )
+    medicine_names = sorted({r["Medicine"] for r in reminders} | set(taken.columns))
+    med_code = {name: i for i, name in enumerate(medicine_names)}
+
+    rem_med = np.array([med_code[r["Medicine"]] for r in reminders], dtype=np.int64)
+    rem_hour = np.array([int(r["Time"][:2]) for r in reminders], dtype=np.int64)
+    rem_mask = np.array([weekday_mask(r.get("Frequency")) for r in reminders], dtype=np.int64)
+    rem_created = np.array([_day(r.get("Created")) for r in reminders], dtype="datetime64[D]")
+    rem_once = np.array(
+        [_day(r.get("Date")) if r.get("Frequency") == "Once" else None for r in reminders],
+        dtype="datetime64[D]",
+    )
+
+    taken_matrix = (
+        taken.reindex(index=pd.DatetimeIndex(days), columns=medicine_names, fill_value=0)
+        .to_numpy(dtype=np.int64)
+    )
+    weekday = _weekday(days)
+
+    # scheduled[d, r]: reminder r fires on day d
+    scheduled = ((rem_mask[None, :] >> weekday[:, None]) & 1).astype(bool)
+    scheduled |= days[:, None] == rem_once[None, :]
+    # Comparisons with NaT are False, so reminders without a Created date stay in
+    scheduled &= ~(days[:, None] < rem_created[None, :])
+    # rank[d, r]: position of reminder r among that day's scheduled doses of its medicine
+    running = np.cumsum(scheduled, axis=1)
+    group_start = np.searchsorted(rem_med, rem_med, side="left")
+    before = np.where(group_start > 0, running[:, np.maximum(group_start - 1, 0)], 0)
+    rank = running - before - 1
+    filled = scheduled & (rank < taken_matrix[:, rem_med])
+    missed = scheduled & ~filled
+
+    n_meds = len(medicine_names)
+    scheduled_per_med = np.bincount(rem_med, weights=scheduled.sum(axis=0), minlength=n_meds)
+    filled_per_med = np.bincount(rem_med, weights=filled.sum(axis=0), minlength=n_meds)
+    by_medicine = pd.DataFrame(
+        {
+            "Medicine": medicine_names,
+            "Scheduled": scheduled_per_med.astype(np.int64),
+            "Taken": taken_matrix.sum(axis=0),
+            "Adherence %": np.round(
+                100 * np.divide(
+                    filled_per_med,
+                    scheduled_per_med,
+                    out=np.full(n_meds, np.nan),
+                    where=scheduled_per_med > 0,
+                ),
+                1,
+            ),
+        }
+    )
+
+    def missed_rate(keys, missed_counts, scheduled_counts, labels):
+        missed_total = np.bincount(keys, weights=missed_counts, minlength=len(labels))
+        scheduled_total = np.bincount(keys, weights=scheduled_counts, minlength=len(labels))
+        rate = np.divide(
+            missed_total,
+            scheduled_total,
+            out=np.zeros(len(labels)),
+            where=scheduled_total > 0,
+        )
+        return pd.Series(np.round(100 * rate, 1), index=labels, name="Missed %")
+
+    by_weekday = missed_rate(weekday, missed.sum(axis=1), scheduled.sum(axis=1), WEEKDAYS)
+    by_hour = missed_rate(
+        rem_hour, missed.sum(axis=0), scheduled.sum(axis=0), [f"{h:02d}:00" for h in range(24)]
+    )
+
+    scheduled_days = scheduled.any(axis=1)
+    complete_days = ~missed.any(axis=1)[scheduled_days]
+    total_scheduled = int(scheduled.sum())
+    return {
+        "overall": (
+            round(100 * float(filled.sum()) / total_scheduled, 1) if total_scheduled else None
+        ),
+        "current_streak": _trailing_run(complete_days),
+        "longest_streak": _longest_run(complete_days),
+        "by_medicine": by_medicine,
+        "missed_by_weekday": by_weekday,
+        "missed_by_hour": by_hour,
+    }
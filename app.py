@@ -1,14 +1,23 @@
 import streamlit as st
 
 from auth import render_authentication
-from data_layer import initialize_firestore, initialize_scheduler
+from data_layer import (
+    check_reminders,
+    initialize_repository,
+    initialize_scheduler,
+    stop_scheduler,
+)
+from metrics import init_metrics, is_admin, span
 from pages import (
     render_chatbot_page,
     render_diet_page,
+    render_glucose_page,
     render_home_page,
     render_medication_page,
+    render_metrics_page,
     render_schedule_page,
 )
+from sessions import end_session
 
 st.set_page_config(page_title="Diabetes Manager", layout="wide")
 
@@ -23,26 +32,43 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-db = initialize_firestore()
-initialize_scheduler(db)
+db = initialize_repository()
+metrics_registry = init_metrics(db)
 render_authentication(db)
+initialize_scheduler(db)
+
+
+@st.fragment(run_every="30s")
+def reminder_notifications():
+    check_reminders(db)
+
+
+reminder_notifications()
 
 st.sidebar.title("Navigation")
-menu = st.sidebar.radio(
-    "Main Menu",
-    ["Home", "Chatbot", "Schedule", "Diet Plan", "Medication Reminders"],
-)
+menu_items = ["Home", "Blood Glucose", "Chatbot", "Schedule", "Diet Plan", "Medication Reminders"]
+if metrics_registry is not None and is_admin(st.session_state.user):
+    menu_items.append("Metrics")
+menu = st.sidebar.radio("Main Menu", menu_items)
 if st.sidebar.button("🚪 Logout"):
+    stop_scheduler(db)
     st.session_state.clear()
+    # After the clear, so the cookie removal it queues survives the rerun
+    end_session()
     st.rerun()
 
-if menu == "Home":
-    render_home_page()
-elif menu == "Chatbot":
-    render_chatbot_page()
-elif menu == "Schedule":
-    render_schedule_page(db)
-elif menu == "Diet Plan":
-    render_diet_page()
-elif menu == "Medication Reminders":
-    render_medication_page(db)
+with span(f"page.{menu}"):
+    if menu == "Home":
+        render_home_page(db)
+    elif menu == "Blood Glucose":
+        render_glucose_page(db)
+    elif menu == "Chatbot":
+        render_chatbot_page()
+    elif menu == "Schedule":
+        render_schedule_page(db)
+    elif menu == "Diet Plan":
+        render_diet_page()
+    elif menu == "Medication Reminders":
+        render_medication_page(db)
+    elif menu == "Metrics":
+        render_metrics_page(db, metrics_registry)
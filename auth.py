@@ -1,30 +1,65 @@
 import json
+import logging
 import os
 import re
+import time
+from contextlib import contextmanager
 
-import google_auth_oauthlib.flow
-import pytz
-import requests
 import streamlit as st
-from firebase_admin import firestore
-from googleapiclient.discovery import build
+
+from metrics import span
+from services import HTTP_TIMEOUT, get_http_session
+from sessions import restore_session, start_session, sync_session_cookie
+
+logger = logging.getLogger(__name__)
 
 # Allow insecure transport for local development (http instead of https)
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
-FIREBASE_API_KEY = st.secrets.firebase.api_key
 GOOGLE_CLIENT_SECRETS_FILE = "google_credentials.json"
 SCOPES = [
     "openid",
     "https://www.googleapis.com/auth/userinfo.profile",
     "https://www.googleapis.com/auth/userinfo.email",
 ]
+GOOGLE_USERINFO_URL = "https://openidconnect.googleapis.com/v1/userinfo"
+
+
+@contextmanager
+def login_step(name: str):
+    start = time.perf_counter()
+    try:
+        with span(f"login.{name}"):
+            yield
+    finally:
+        logger.info("login step %s took %.1f ms", name, (time.perf_counter() - start) * 1000)
+
+
+@st.cache_resource
+def google_client_config() -> dict:
+    with open(GOOGLE_CLIENT_SECRETS_FILE) as f:
+        return json.load(f)
+
+
+def _firebase_api_key() -> str:
+    return st.secrets.firebase.api_key
+
+
+def _google_flow():
+    import google_auth_oauthlib.flow
+
+    return google_auth_oauthlib.flow.Flow.from_client_config(
+        google_client_config(),
+        scopes=SCOPES,
+        redirect_uri=st.secrets.google_auth.redirect_uri,
+    )
 
 
 def firebase_sign_up(email: str, password: str):
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={FIREBASE_API_KEY}"
+    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={_firebase_api_key()}"
     payload = {"email": email, "password": password, "returnSecureToken": True}
-    resp = requests.post(url, json=payload)
+    with login_step("firebase.sign_up"):
+        resp = get_http_session().post(url, json=payload, timeout=HTTP_TIMEOUT)
     if not resp.ok:
         error_msg = resp.json().get("error", {}).get("message", "Unknown error")
         raise Exception(error_msg)
@@ -34,10 +69,11 @@ def firebase_sign_up(email: str, password: str):
 def firebase_sign_in(email: str, password: str):
     url = (
         "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword"
-        f"?key={FIREBASE_API_KEY}"
+        f"?key={_firebase_api_key()}"
     )
     payload = {"email": email, "password": password, "returnSecureToken": True}
-    resp = requests.post(url, json=payload)
+    with login_step("firebase.sign_in"):
+        resp = get_http_session().post(url, json=payload, timeout=HTTP_TIMEOUT)
     if not resp.ok:
         error_msg = resp.json().get("error", {}).get("message", "Unknown error")
         raise Exception(error_msg)
@@ -45,46 +81,74 @@ def firebase_sign_in(email: str, password: str):
 
 
 def get_google_login_url():
-    flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-        GOOGLE_CLIENT_SECRETS_FILE,
-        scopes=SCOPES,
-        redirect_uri=st.secrets.google_auth.redirect_uri,
-    )
+    # Reuse the URL across reruns of the login screen so its verifier stays valid
+    if "google_auth_url" in st.session_state:
+        return st.session_state.google_auth_url
+    flow = _google_flow()
     # Generate authorization URL and store the verifier in session state
     authorization_url, state = flow.authorization_url(
         access_type="offline", include_granted_scopes="true"
     )
     st.session_state.google_auth_state = state
     st.session_state.google_auth_verifier = flow.code_verifier
+    st.session_state.google_auth_url = authorization_url
     return authorization_url
 
 
-def handle_google_callback():
+def fetch_google_userinfo(access_token: str) -> dict:
+    resp = get_http_session().get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=HTTP_TIMEOUT,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def handle_google_callback(db):
     if "code" in st.query_params and "google_auth_verifier" in st.session_state:
         try:
             # Clear params IMMEDIATELY so re-runs don't try the same code twice
             code = st.query_params["code"]
             st.query_params.clear()
 
-            flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-                GOOGLE_CLIENT_SECRETS_FILE,
-                scopes=SCOPES,
-                redirect_uri=st.secrets.google_auth.redirect_uri,
-            )
+            flow = _google_flow()
             # Use the saved verifier to satisfy PKCE
-            flow.fetch_token(code=code, code_verifier=st.session_state.google_auth_verifier)
+            with login_step("google.fetch_token"):
+                flow.fetch_token(
+                    code=code, code_verifier=st.session_state.google_auth_verifier
+                )
 
             credentials = flow.credentials
-            service = build("oauth2", "v2", credentials=credentials)
-            user_info = service.userinfo().get().execute()
+            with login_step("google.userinfo"):
+                user_info = fetch_google_userinfo(credentials.token)
 
+            uid = f"google:{user_info.get('sub')}"
+            with login_step("google.profile_read"):
+                profile = db.get_user(uid)
+            if profile is None:
+                # The notification worker finds users through their profiles
+                profile = {
+                    "first_name": user_info.get("given_name", "User"),
+                    "last_name": user_info.get("family_name", ""),
+                    "email": user_info.get("email"),
+                }
+                db.save_user(uid, profile)
             st.session_state.user = {
+                "uid": uid,
                 "email": user_info.get("email"),
                 "first_name": user_info.get("given_name", "User"),
                 "last_name": user_info.get("family_name", ""),
+                "timezone": profile.get("timezone"),
             }
+            start_session(
+                st.session_state.user,
+                st.session_state.user["uid"],
+                "google",
+                credentials.refresh_token,
+            )
             # Final cleanup
-            for key in ["google_auth_state", "google_auth_verifier"]:
+            for key in ["google_auth_state", "google_auth_verifier", "google_auth_url"]:
                 if key in st.session_state:
                     del st.session_state[key]
             st.rerun()
@@ -99,10 +163,11 @@ def handle_google_callback():
 
 def render_authentication(db) -> bool:
     if "user" not in st.session_state:
-        st.session_state.user = None
+        st.session_state.user = restore_session()
 
     # Handle completion of Google Sign-in flow
-    handle_google_callback()
+    handle_google_callback(db)
+    sync_session_cookie()
 
     if st.session_state.user:
         return True
@@ -149,6 +214,8 @@ def render_authentication(db) -> bool:
                     phone = st.text_input("Phone Number (+1234567890)")
                     if phone and not re.match(r"^\+[1-9]\d{1,14}$", phone):
                         st.error("Please enter valid E.164 format: +[country code][number]")
+                    import pytz
+
                     utc_index = pytz.common_timezones.index("UTC")
                     timezone = st.selectbox(
                         "Timezone", pytz.common_timezones, index=utc_index
@@ -165,48 +232,61 @@ def render_authentication(db) -> bool:
                                 st.error("Passwords do not match!")
                             else:
                                 user = firebase_sign_up(email, password)
-                                db.collection("users").document(user["localId"]).set(
+                                db.save_user(
+                                    user["localId"],
                                     {
                                         "first_name": first_name,
                                         "last_name": last_name,
                                         "email": email,
                                         "phone": phone,
                                         "timezone": timezone,
-                                        "created_at": firestore.SERVER_TIMESTAMP,
-                                    }
+                                    },
                                 )
                                 st.session_state.user = {
+                                    "uid": user["localId"],
                                     "email": email,
                                     "first_name": first_name,
                                     "last_name": last_name,
+                                    "timezone": timezone,
                                 }
+                                start_session(
+                                    st.session_state.user,
+                                    user["localId"],
+                                    "firebase",
+                                    user.get("refreshToken"),
+                                )
                                 st.success(f"Welcome, {first_name}! 🎉")
                                 st.rerun()
                         else:
                             user = firebase_sign_in(email, password)
-                            user_doc = db.collection("users").document(user["localId"]).get()
-                            if user_doc.exists:
-                                user_data = user_doc.to_dict()
+                            with login_step("firebase.profile_read"):
+                                user_data = db.get_user(user["localId"])
+                            if user_data:
                                 st.session_state.user = {
+                                    "uid": user["localId"],
                                     "email": email,
                                     "first_name": user_data.get("first_name", "User"),
                                     "last_name": user_data.get("last_name", ""),
+                                    "timezone": user_data.get("timezone"),
                                 }
                             else:
                                 # Create a basic profile if search fails
-                                db.collection("users").document(user["localId"]).set(
-                                    {
-                                        "first_name": "New User",
-                                        "last_name": "",
-                                        "email": email,
-                                        "created_at": firestore.SERVER_TIMESTAMP,
-                                    }
+                                db.save_user(
+                                    user["localId"],
+                                    {"first_name": "New User", "last_name": "", "email": email},
                                 )
                                 st.session_state.user = {
+                                    "uid": user["localId"],
                                     "email": email,
                                     "first_name": "New User",
                                     "last_name": "",
                                 }
+                            start_session(
+                                st.session_state.user,
+                                user["localId"],
+                                "firebase",
+                                user.get("refreshToken"),
+                            )
                             st.success(
                                 f"Welcome back, {st.session_state.user['first_name']}! 😊"
                             )
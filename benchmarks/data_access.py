@@ -0,0 +1,148 @@
+"""Offline data-access benchmark.
+
+Seeds an ``InMemoryRepository`` with a synthetic user (appointments, reminders,
+a dose history and CGM readings) and renders the app's pages against it with
+Streamlit in bare mode, so no Firebase project or network is needed. For each
+page it reports render time and the documents read, documents written and
+round trips per render::
+
+    python benchmarks/data_access.py [--runs 20] [--latency-ms 0] [--cold] [--per-op]
+
+``--latency-ms`` makes every round trip sleep to model the network hop, and
+``--cold`` clears the app's caches before every render so the numbers show the
+cost of a first visit rather than a rerun.
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+USER = "Bench"
+
+
+def seed(repo, days: int, reminders: int, appointments: int, user: str = USER):
+    import numpy as np
+    import pandas as pd
+
+    from glucose import import_readings
+
+    rng = np.random.default_rng(0)
+    now = datetime.now()
+    for i in range(appointments):
+        repo.add_appointment(
+            user,
+            {"Doctor": f"Dr. {i}", "DateTime": now + timedelta(days=i - appointments // 2), "Notes": ""},
+        )
+    medicines = [f"Med{i}" for i in range(reminders)]
+    for i, medicine in enumerate(medicines):
+        repo.add_reminder(
+            user, {"Medicine": medicine, "Time": f"{8 + i % 12:02d}:00", "Frequency": "Daily"}
+        )
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    for day in range(days):
+        taken = [m for m in medicines if rng.random() < 0.85]
+        repo.log_taken(user, taken, timestamp=start + timedelta(days=day, hours=9))
+
+    times = pd.date_range(now - timedelta(days=days), now, freq="5min")
+    values = np.clip(rng.normal(150, 40, len(times)), 40, 400).round()
+    import_readings(repo, user, pd.DataFrame({"timestamp": times, "mg_dl": values}))
+    repo.stats.reset()
+
+
+def page_renderers(repo):
+    import pages
+
+    def render(page, *fragments):
+        # Bare mode skips ``st.fragment`` bodies, so run the undecorated functions too
+        def run():
+            page(repo)
+            for fragment in fragments:
+                fragment.__wrapped__(repo)
+
+        return run
+
+    return {
+        "home": render(pages.render_home_page),
+        "schedule": render(pages.render_schedule_page, pages._appointments_table),
+        "medication": render(
+            pages.render_medication_page,
+            pages._reminder_form,
+            pages._reminders_table,
+            pages._history_table,
+            pages._export_panel,
+        ),
+        "glucose": render(pages.render_glucose_page),
+    }
+
+
+def clear_app_caches():
+    from data_layer import get_adherence_rollups, get_query_cache
+
+    get_query_cache().clear()
+    get_adherence_rollups().clear()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--cold", action="store_true", help="clear app caches before each render")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--reminders", type=int, default=6)
+    parser.add_argument("--appointments", type=int, default=20)
+    parser.add_argument("--per-op", action="store_true", help="break counts down by operation")
+    args = parser.parse_args(argv)
+
+    # Bare-mode Streamlit warns about the missing script context on every call
+    logging.disable(logging.WARNING)
+    import streamlit as st
+
+    from repository import InMemoryRepository
+
+    repo = InMemoryRepository()
+    seed(repo, args.days, args.reminders, args.appointments)
+    repo.latency = args.latency_ms / 1000
+    st.session_state.user = {"uid": USER, "first_name": USER, "last_name": "", "email": ""}
+
+    print(
+        f"{args.runs} {'cold' if args.cold else 'warm'} renders per page, "
+        f"{args.latency_ms:g} ms per round trip"
+    )
+    print(f"{'page':<12} {'median ms':>10} {'p95 ms':>8} {'reads':>7} {'writes':>7} {'trips':>6}")
+    clear_app_caches()
+    for name, render in page_renderers(repo).items():
+        render()  # first render fills the caches for warm runs
+        repo.stats.reset()
+        timings = []
+        for _ in range(args.runs):
+            if args.cold:
+                clear_app_caches()
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        totals = repo.stats.totals()
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        print(
+            f"{name:<12} {statistics.median(timings):>10.1f} {p95:>8.1f} "
+            f"{totals.reads / args.runs:>7.1f} {totals.writes / args.runs:>7.1f} "
+            f"{totals.round_trips / args.runs:>6.1f}"
+        )
+        if args.per_op:
+            for operation, counts in sorted(repo.stats.snapshot().items()):
+                print(
+                    f"  {operation:<22} calls {counts.calls / args.runs:>5.1f}  "
+                    f"reads {counts.reads / args.runs:>7.1f}  "
+                    f"writes {counts.writes / args.runs:>5.1f}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
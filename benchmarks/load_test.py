@@ -0,0 +1,399 @@
+"""Multi-session load test.
+
+Drives N concurrent logged-in sessions of ``app.py`` with Streamlit's
+``AppTest``. Each session walks the Home, Schedule, Medication Reminders,
+Chatbot and Diet Plan pages, asks the chatbot a question and looks up a food.
+Firestore is replaced by an ``InMemoryRepository``; the USDA and Gemini
+clients are replaced by stubs. Both sleep to model network latency. The run
+reports rerun latency percentiles per page, the peak thread count (including
+the reminder dispatcher) and memory per session::
+
+    python benchmarks/load_test.py [--sessions 8] [--rounds 3] [--latency-ms 20]
+    python benchmarks/load_test.py --save-baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --compare benchmarks/baseline.json [--tolerance 0.2]
+
+``--compare`` exits non-zero when the overall or any page's p95 is slower
+than the baseline by more than the tolerance, or when the baseline was
+recorded with other load options. ``benchmarks/baseline.json`` was recorded
+with the default options by the ``--save-baseline`` command above; the file
+lists the machine it ran on. Timings depend on the hardware, so re-record it
+on the machine that runs the comparison.
+
+Running several ``AppTest`` sessions at once needs a few Streamlit internals
+patched (see ``_patch_apptest_for_concurrency``), so the script only runs on
+the Streamlit release it was written against, ``STREAMLIT_SERIES``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from data_access import seed  # noqa: E402
+
+APP_SCRIPT = REPO_ROOT / "app.py"
+# The AppTest internals patched below are those of this release series
+STREAMLIT_SERIES = "1.65"
+# Options that must match for two runs to be comparable
+LOAD_OPTIONS = ("sessions", "rounds", "latency_ms", "http_latency_ms")
+PAGES = ("Home", "Schedule", "Medication Reminders", "Chatbot", "Diet Plan")
+QUESTIONS = (
+    "What is a normal A1C?",
+    "How much fiber should I eat?",
+    "Can I exercise with low blood sugar?",
+    "What are symptoms of hyperglycemia?",
+    "Is fruit okay for diabetics?",
+    "How often should I check my feet?",
+)
+FOODS = ("apple", "banana", "brown rice", "oatmeal", "lentils", "greek yogurt", "almonds")
+
+
+class _StubResponse:
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class StubHttpSession:
+    """Answers USDA searches with made-up nutrients after ``latency`` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def get(self, url, params=None, timeout=None):
+        time.sleep(self.latency)
+        seed_value = zlib.crc32(params["query"].encode("utf-8"))
+        nutrients = [
+            {"nutrientName": "Carbohydrate, by difference", "value": seed_value % 60},
+            {"nutrientName": "Protein", "value": seed_value % 25},
+        ]
+        return _StubResponse({"foods": [{"foodNutrients": nutrients}]})
+
+
+class _StubChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    """Streams a canned answer in a few chunks, sleeping ``latency`` before each."""
+
+    def __init__(self, latency: float, chunks: int = 4):
+        self.latency = latency
+        self.chunks = chunks
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        words = ("I am not a doctor. Per the ADA, " + prompt.split("[User Question]")[-1]).split()
+        size = max(len(words) // self.chunks, 1)
+        parts = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        if not stream:
+            time.sleep(self.latency * self.chunks)
+            return _StubChunk("".join(parts))
+        return self._stream(parts)
+
+    def _stream(self, parts):
+        for part in parts:
+            time.sleep(self.latency)
+            yield _StubChunk(part)
+
+
+def _patch_apptest_for_concurrency():
+    """Let several AppTest sessions run at once, as sessions do on a real server.
+
+    AppTest installs a mock Runtime when a run starts and clears it when the
+    run ends, which lands in the middle of other sessions' runs; fall back to
+    the last mock installed instead. It also compiles the script afresh for
+    every run, and concurrent compiles are not thread-safe on every Python;
+    share one compiled copy, as the server's script cache does.
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        elif "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return cls._instance or last["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+
+    get_bytecode = ScriptCache.get_bytecode
+    shared = ScriptCache()
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+    # AppTest also patches config.get_option for the length of each run, and
+    # overlapping runs can restore the unpatched one mid-run; make it agree
+    config.set_option("global.appTest", True)
+
+
+def install_stubs(args, cache_dir: str):
+    """Point the app at local stand-ins; returns the shared repository."""
+    import streamlit as st
+    from streamlit.runtime.secrets import Secrets
+
+    import data_layer
+    import services
+    from repository import InMemoryRepository
+
+    # Set once for the whole process: AppTest swaps st.secrets per run, which
+    # is not safe with several sessions running at the same time
+    secrets = Secrets()
+    secrets._secrets = {
+        "metrics": {"enabled": False},
+        "usda": {"api_key": "stub"},
+        "nutrition": {"backend": "remote"},
+        "nutrition_cache": {"sqlite_path": f"{cache_dir}/nutrition.sqlite3"},
+        "chat_cache": {"sqlite_path": f"{cache_dir}/chat.sqlite3"},
+    }
+    st.secrets = secrets
+    _patch_apptest_for_concurrency()
+
+    repo = InMemoryRepository()
+    for i in range(args.sessions + args.memory_sessions):
+        seed(repo, args.days, args.reminders, args.appointments, user=_user(i)["uid"])
+    repo.latency = args.latency_ms / 1000
+
+    http_session = StubHttpSession(args.http_latency_ms / 1000)
+    model = StubGeminiModel(args.http_latency_ms / 1000)
+    data_layer.initialize_repository = lambda: repo
+    services.get_http_session = lambda: http_session
+    services.get_gemini_model = lambda: model
+    return repo
+
+
+def _user(i: int) -> dict:
+    return {
+        "uid": f"load{i}",
+        "first_name": f"Load{i}",
+        "last_name": "Test",
+        "email": f"load{i}@example.com",
+    }
+
+
+class Session:
+    def __init__(self, index: int, seed_value: int):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.random = random.Random(seed_value)
+        self.app = AppTest.from_file(str(APP_SCRIPT), default_timeout=120)
+        self.app.session_state["user"] = _user(index)
+        self.timings = []
+        self.errors = []
+
+    def _timed_run(self, page: str, element=None, value=None):
+        started = time.perf_counter()
+        if element is None:
+            self.app.run()
+        else:
+            element.set_value(value).run()
+        self.timings.append((page, (time.perf_counter() - started) * 1000))
+        self.errors.extend(f"{page}: {e.value}" for e in self.app.exception)
+
+    def visit(self, page: str):
+        self._timed_run(page, self.app.sidebar.radio[0], page)
+        if page == "Chatbot":
+            self._timed_run(page, self.app.chat_input[0], self.random.choice(QUESTIONS))
+        elif page == "Diet Plan":
+            self._timed_run(page, self.app.text_input[0], self.random.choice(FOODS))
+
+    def run(self, rounds: int, start: threading.Barrier = None):
+        self._timed_run("First load")
+        if start is not None:
+            start.wait()
+        for _ in range(rounds):
+            for page in PAGES:
+                try:
+                    self.visit(page)
+                except IndexError as e:
+                    # The run failed before rendering the widget to drive next
+                    self.errors.append(f"{page}: widget missing ({e})")
+
+
+def _percentiles(values: list) -> dict:
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return {"p50": value, "p95": value, "p99": value, "count": len(values)}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "count": len(values)}
+
+
+def run_load(args) -> dict:
+    sessions = [Session(i, i) for i in range(args.sessions)]
+    start = threading.Barrier(args.sessions)
+    peak_threads = threading.active_count()
+    done = threading.Event()
+
+    def sample_threads():
+        nonlocal peak_threads
+        while not done.wait(0.05):
+            peak_threads = max(peak_threads, threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, name="thread-sampler", daemon=True)
+    sampler.start()
+    workers = [
+        threading.Thread(target=s.run, args=(args.rounds, start), name=f"session-{s.index}")
+        for s in sessions
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+
+    by_page = {}
+    for session in sessions:
+        for page, ms in session.timings:
+            by_page.setdefault(page, []).append(ms)
+    reruns = [ms for page, values in by_page.items() if page != "First load" for ms in values]
+    background = sorted(
+        t.name for t in threading.enumerate()
+        if not t.name.startswith("session-") and t is not threading.main_thread()
+    )
+    return {
+        "sessions": args.sessions,
+        "rounds": args.rounds,
+        "latency_ms": args.latency_ms,
+        "http_latency_ms": args.http_latency_ms,
+        "elapsed_s": round(elapsed, 2),
+        "reruns_per_s": round(len(reruns) / elapsed, 1),
+        "overall": _percentiles(reruns),
+        "pages": {page: _percentiles(values) for page, values in by_page.items()},
+        # Less the sessions' driver threads and the sampler, which a server wouldn't run
+        "peak_threads": peak_threads - args.sessions - 1,
+        "background_threads": background,
+        "errors": sorted({e for s in sessions for e in s.errors}),
+    }
+
+
+def measure_memory(first_user: int, count: int) -> float:
+    """Traced bytes retained per additional session after it visits every page."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [Session(first_user + i, i) for i in range(count)]
+    for session in sessions:
+        session.run(rounds=1)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def print_report(result: dict):
+    print(
+        f"{result['sessions']} sessions x {result['rounds']} rounds, "
+        f"{result['latency_ms']:g} ms Firestore / {result['http_latency_ms']:g} ms HTTP latency: "
+        f"{result['reruns_per_s']} reruns/s over {result['elapsed_s']} s"
+    )
+    print(f"{'page':<22} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(result["pages"].items()) + [("All reruns", result["overall"])]
+    for page, stats in rows:
+        print(
+            f"{page:<22} {stats['count']:>7} {stats['p50']:>8.1f} "
+            f"{stats['p95']:>8.1f} {stats['p99']:>8.1f}"
+        )
+    print(f"Peak app threads: {result['peak_threads']} ({', '.join(result['background_threads'])})")
+    if "memory_per_session_kb" in result:
+        print(f"Memory per session: {result['memory_per_session_kb']:.0f} KiB")
+    for error in result["errors"]:
+        print(f"ERROR {error}")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    options = [name for name in LOAD_OPTIONS if result[name] != baseline[name]]
+    if options:
+        recorded = ", ".join(f"{name}={baseline[name]}" for name in LOAD_OPTIONS)
+        return [f"baseline was recorded with {recorded}; rerun with the same options"]
+    regressions = []
+    pairs = [("All reruns", result["overall"], baseline["overall"])] + [
+        (page, stats, baseline["pages"][page])
+        for page, stats in result["pages"].items()
+        if page in baseline["pages"]
+    ]
+    print(f"{'vs baseline':<22} {'p95 ms':>8} {'was':>8} {'change':>8}")
+    for page, current, previous in pairs:
+        change = current["p95"] / previous["p95"] - 1 if previous["p95"] else 0.0
+        print(f"{page:<22} {current['p95']:>8.1f} {previous['p95']:>8.1f} {change:>+8.0%}")
+        if change > tolerance:
+            regressions.append(f"{page} p95 {change:+.0%} over baseline")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="per Firestore round trip")
+    parser.add_argument("--http-latency-ms", type=float, default=150.0, help="per USDA/Gemini call")
+    parser.add_argument("--memory-sessions", type=int, default=3)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--reminders", type=int, default=4)
+    parser.add_argument("--appointments", type=int, default=10)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    import streamlit
+
+    if not streamlit.__version__.startswith(f"{STREAMLIT_SERIES}."):
+        print(
+            f"This load test patches Streamlit {STREAMLIT_SERIES} internals; "
+            f"found {streamlit.__version__}"
+        )
+        return 2
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        install_stubs(args, cache_dir)
+        result = run_load(args)
+        if args.memory_sessions:
+            # Measured sequentially, after the load run, with their own seeded users
+            per_session = measure_memory(args.sessions, args.memory_sessions)
+            result["memory_per_session_kb"] = per_session / 1024
+    result["environment"] = {
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+    }
+
+    print_report(result)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2))
+        print(f"Saved baseline to {args.save_baseline}")
+    failures = list(result["errors"])
+    if args.compare:
+        failures += compare(result, json.loads(Path(args.compare).read_text()), args.tolerance)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
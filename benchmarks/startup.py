@@ -0,0 +1,108 @@
+"""Cold-start import benchmark.
+
+Imports the app modules in a fresh interpreter under ``python -X importtime``
+(after Streamlit itself, which every run pays for) and prints the slowest
+imports. Fails when an app module pulls in a dependency that should only be
+loaded by the page that needs it, or when the app's own import time goes over
+budget::
+
+    python benchmarks/startup.py [--runs 5] [--budget-ms 150]
+"""
+
+import argparse
+import ast
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFERRED_MODULES = (
+    "firebase_admin",
+    "google.cloud.firestore",
+    "google.api_core",
+    "google_auth_oauthlib",
+    "googleapiclient",
+    "google.generativeai",
+    "grpc",
+    "numpy",
+    "pandas",
+    "pytz",
+)
+
+
+def app_modules() -> list:
+    """Repo modules that app.py imports at module level, i.e. on every cold start."""
+    tree = ast.parse((REPO_ROOT / "app.py").read_text())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            top = name.split(".")[0]
+            if (REPO_ROOT / f"{top}.py").exists() and top not in modules:
+                modules.append(top)
+    return modules
+
+
+def profile_imports() -> list:
+    """Return (module, self_us, cumulative_us, depth) for imports made by the app."""
+    code = "import streamlit; import " + ", ".join(app_modules())
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    # Everything reported after Streamlit's own top-level entry was imported by the app
+    streamlit_index = next(
+        i for i, entry in enumerate(entries) if entry[0] == "streamlit" and entry[3] == 0
+    )
+    return entries[streamlit_index + 1:]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    runs = [profile_imports() for _ in range(args.runs)]
+    totals_ms = [sum(e[2] for e in entries if e[3] == 0) / 1000 for entries in runs]
+    median_ms = statistics.median(totals_ms)
+    entries = runs[totals_ms.index(median_ms)] if median_ms in totals_ms else runs[0]
+
+    print(f"App import time (median of {args.runs}): {median_ms:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us, depth in sorted(entries, key=lambda e: -e[2])[: args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {'  ' * depth}{name}")
+
+    failures = []
+    imported = {entry[0] for entry in entries}
+    for module in DEFERRED_MODULES:
+        if any(name == module or name.startswith(module + ".") for name in imported):
+            failures.append(f"{module} is imported at startup")
+    if median_ms > args.budget_ms:
+        failures.append(f"app import time {median_ms:.1f} ms exceeds {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
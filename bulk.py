@@ -0,0 +1,78 @@
+import time
+from dataclasses import dataclass, field
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+MAX_ATTEMPTS = 4
+BACKOFF_SECONDS = 0.25
+
+
+def _retryable_errors() -> tuple:
+    # Imported here so BulkWriteResult is usable without the Google client libraries
+    from google.api_core import exceptions as api_exceptions
+
+    return (
+        api_exceptions.Aborted,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.InternalServerError,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServiceUnavailable,
+    )
+
+
+@dataclass
+class BulkWriteResult:
+    succeeded: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def merge(self, other: "BulkWriteResult"):
+        self.succeeded += other.succeeded
+        self.failed += other.failed
+        self.errors.extend(other.errors)
+
+
+def set_op(ref, data: dict):
+    return ("set", ref, data)
+
+
+def delete_op(ref):
+    return ("delete", ref, None)
+
+
+def _commit_chunk(db, chunk) -> BulkWriteResult:
+    retryable = _retryable_errors()
+    for attempt in range(MAX_ATTEMPTS):
+        batch = db.batch()
+        for kind, ref, data in chunk:
+            if kind == "set":
+                batch.set(ref, data)
+            else:
+                batch.delete(ref)
+        try:
+            batch.commit()
+            return BulkWriteResult(succeeded=len(chunk))
+        except retryable as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                return BulkWriteResult(failed=len(chunk), errors=[str(e)])
+            time.sleep(BACKOFF_SECONDS * 2**attempt)
+        except Exception as e:
+            return BulkWriteResult(failed=len(chunk), errors=[str(e)])
+
+
+def bulk_write(db, operations, chunk_size: int = FIRESTORE_BATCH_LIMIT) -> BulkWriteResult:
+    """Commit ``set_op``/``delete_op`` operations in atomic batches.
+
+    Each batch is retried with exponential backoff on transient errors; a batch
+    that still fails is counted as failed without aborting the remaining ones.
+    """
+    result = BulkWriteResult()
+    chunk = []
+    for op in operations:
+        chunk.append(op)
+        if len(chunk) == chunk_size:
+            result.merge(_commit_chunk(db, chunk))
+            chunk = []
+    if chunk:
+        result.merge(_commit_chunk(db, chunk))
+    return result
@@ -0,0 +1,199 @@
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def estimate_size(value) -> int:
+    """Rough recursive byte size of a cached value."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and a memory bound."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            self._pop(key)
+            # Too big to keep; the stale value must not outlive the new one either
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+class SQLiteStore:
+    """On-disk key/value tier with per-entry expiry; values are stored as JSON."""
+
+    def __init__(self, path: str, table: str = "cache", ttl: float = 7 * 24 * 60 * 60):
+        self.ttl = ttl
+        self._table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl),
+            )
+
+    def add(self, key: str, value) -> bool:
+        """Store ``value`` only if ``key`` is absent or expired; returns whether it was stored."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key = ? AND expires_at < ?", (key, now)
+            )
+            cursor = self._conn.execute(
+                f"INSERT OR IGNORE INTO {self._table} VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl),
+            )
+        return cursor.rowcount == 1
+
+    def items(self) -> list:
+        """Every unexpired ``(key, value)`` pair."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM {self._table} WHERE expires_at >= ?", (time.time(),)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def replace(self, key: str, expected, value) -> bool:
+        """Store ``value`` only if ``key`` still holds ``expected``; returns whether it did."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE {self._table} SET value = ?, expires_at = ? WHERE key = ? AND value = ?",
+                (json.dumps(value), time.time() + self.ttl, key, json.dumps(expected)),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> bool:
+        """Remove ``key``; returns whether it was there."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+        return cursor.rowcount == 1
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE expires_at < ?", (time.time(),))
+
+
+class CacheStats:
+    """Lookup counters; meal lookups update them from worker threads."""
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str):
+        """Count one lookup; ``outcome`` is "hits", "disk_hits" or "misses"."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+    @property
+    def lookups(self) -> int:
+        return sum(self.snapshot().values())
+
+    @property
+    def hit_rate(self) -> float:
+        counts = self.snapshot()
+        lookups = sum(counts.values())
+        return (counts["hits"] + counts["disk_hits"]) / lookups if lookups else 0.0
+
+
+class TieredCache:
+    """In-process ``TTLCache`` in front of an optional ``SQLiteStore``."""
+
+    def __init__(self, memory: TTLCache, store: SQLiteStore = None):
+        self.memory = memory
+        self.store = store
+        self.stats = CacheStats()
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats.record("hits")
+            return value
+        if self.store is not None:
+            value = self.store.get(key, _MISSING)
+            if value is not _MISSING:
+                self.stats.record("disk_hits")
+                self.memory.set(key, value)
+                return value
+        self.stats.record("misses")
+        return default
+
+    def set(self, key: str, value):
+        self.memory.set(key, value)
+        if self.store is not None:
+            self.store.set(key, value)
@@ -1,12 +1,46 @@
-from datetime import datetime
+from __future__ import annotations
+
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
 
-import firebase_admin
 import streamlit as st
-from apscheduler.schedulers.background import BackgroundScheduler
-from firebase_admin import credentials, firestore
 
+import summary
+from cache import TTLCache, estimate_size
+from reminders import ReminderDispatcher, one_shot_date
+from repository import FirestoreRepository
+from services import format_firestore_datetime
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from bulk import BulkWriteResult
+
+QUERY_CACHE_TTL_SECONDS = 300
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+HISTORY_PAGE_SIZE = 50
+ADHERENCE_WINDOW_DAYS = 90
+GLUCOSE_WINDOW_DAYS = (14, 30, 90)
+
+
+class LazyFirestoreClient:
+    """Stands in for the Firestore client and creates it on first attribute access.
+
+    Renders that never touch the database, such as the login screen, skip
+    importing and initializing firebase_admin entirely.
+    """
+
+    def __getattr__(self, name):
+        return getattr(_firestore_client(), name)
+
+
+@st.cache_resource
+def _firestore_client():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
 
-def initialize_firestore():
     if not firebase_admin._apps:
         try:
             cred = credentials.Certificate(
@@ -30,30 +64,313 @@ def initialize_firestore():
     return firestore.client()
 
 
-def log_medication_taken(db, med_name: str):
-    db.collection("med_history").add(
-        {
-            "user": st.session_state.user["first_name"],
-            "medicine": med_name,
-            "timestamp": firestore.SERVER_TIMESTAMP,
-        }
+@st.cache_resource
+def initialize_repository():
+    return FirestoreRepository(LazyFirestoreClient())
+
+
+@st.cache_resource
+def get_query_cache():
+    return TTLCache(
+        max_entries=4096, max_bytes=QUERY_CACHE_MAX_BYTES, ttl=QUERY_CACHE_TTL_SECONDS
     )
 
 
-def check_reminders(db):
-    user_email = st.session_state.get("user", {}).get("email", None)
-    if user_email:
-        now = datetime.now().strftime("%H:%M")
-        reminders = db.collection("reminders").where("User", "==", user_email).stream()
-        for rem in reminders:
-            rem_data = rem.to_dict()
-            if rem_data.get("Time") == now:
-                st.toast(f"🔔 Reminder: Time to take {rem_data.get('Medicine')}")
+def _current_user() -> str:
+    return st.session_state.user["uid"]
+
+
+def _cached_query(collection: str, load):
+    cache = get_query_cache()
+    key = (_current_user(), collection)
+    rows = cache.get(key)
+    if rows is None:
+        rows = load(_current_user())
+        cache.set(key, rows)
+    # Callers reformat fields in place, so hand out copies of the cached rows
+    return [(doc_id, dict(data)) for doc_id, data in rows]
+
+
+def _invalidate(collection: str):
+    get_query_cache().invalidate((_current_user(), collection))
+
+
+def load_appointments(db) -> list:
+    return _cached_query("appointments", db.list_appointments)
+
+
+def load_reminders(db) -> list:
+    return _cached_query("reminders", db.list_reminders)
+
+
+def load_summary(db) -> dict:
+    cache = get_query_cache()
+    key = (_current_user(), "summary")
+    cached = cache.get(key)
+    if cached is None:
+        cached = summary.load_summary(db, _current_user())
+        cache.set(key, cached)
+    return cached
+
+
+class HistoryBuffer:
+    """Columnar med_history rows, newest first, filled one cursor page at a time."""
+
+    def __init__(self):
+        self.columns = {"medicine": [], "timestamp": []}
+        self.exhausted = False
+        self._cursor = None
+        # Rows already in _frame; later pages are concatenated onto it
+        self._framed = 0
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns["medicine"])
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + estimate_size(self.columns)
+
+    def fetch_page(self, db, user: str, page_size: int) -> int:
+        with self._lock:
+            if self.exhausted:
+                return 0
+            rows, self._cursor = db.history_page(user, page_size, self._cursor)
+            for _, data in rows:
+                self.columns["medicine"].append(data.get("medicine"))
+                self.columns["timestamp"].append(
+                    format_firestore_datetime(data.get("timestamp"))
+                )
+            self.exhausted = len(rows) < page_size
+            return len(rows)
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            import pandas as pd
+
+            if self._frame is None or self._framed < len(self):
+                page = pd.DataFrame(
+                    {name: values[self._framed :] for name, values in self.columns.items()}
+                )
+                self._frame = (
+                    page
+                    if self._frame is None
+                    else pd.concat([self._frame, page], ignore_index=True)
+                )
+                self._framed = len(self)
+            return self._frame
+
+
+def get_history_buffer(db) -> HistoryBuffer:
+    cache = get_query_cache()
+    key = (_current_user(), "med_history")
+    buffer = cache.get(key)
+    if buffer is None:
+        buffer = HistoryBuffer()
+        buffer.fetch_page(db, _current_user(), HISTORY_PAGE_SIZE)
+        cache.set(key, buffer)
+    return buffer
+
+
+def load_more_history(db):
+    buffer = get_history_buffer(db)
+    if buffer.fetch_page(db, _current_user(), HISTORY_PAGE_SIZE):
+        # Re-insert so the cache re-accounts the grown buffer against its memory bound
+        get_query_cache().set((_current_user(), "med_history"), buffer)
+
+
+def add_appointment(db, data: dict):
+    doc_id = db.add_appointment(_current_user(), data)
+    _invalidate("appointments")
+    summary.on_appointment_added(db, _current_user(), doc_id, data)
+    _invalidate("summary")
+
+
+def delete_appointments(db, doc_ids) -> BulkWriteResult:
+    result = db.delete_appointments(_current_user(), doc_ids)
+    _invalidate("appointments")
+    summary.on_appointments_deleted(db, _current_user(), doc_ids)
+    _invalidate("summary")
+    return result
+
+
+def add_reminder(db, data: dict):
+    tz = st.session_state.user.get("timezone")
+    data = {**data, "Timezone": tz} if tz else dict(data)
+    if data.get("Frequency") == "Once":
+        data["Date"] = one_shot_date(data["Time"], tz)
+    # Adherence only expects doses from this day on
+    data["Created"] = date.today().isoformat()
+    doc_id = db.add_reminder(_current_user(), data)
+    _invalidate("reminders")
+    summary.on_reminder_added(db, _current_user(), doc_id, data)
+    _invalidate("summary")
+
+
+def delete_reminders(db, doc_ids) -> BulkWriteResult:
+    result = db.delete_reminders(_current_user(), doc_ids)
+    _invalidate("reminders")
+    summary.on_reminders_deleted(db, _current_user(), doc_ids)
+    _invalidate("summary")
+    return result
+
+
+def log_medications_taken(db, med_names) -> BulkWriteResult:
+    user = _current_user()
+    result = db.log_taken(user, med_names)
+    _invalidate("med_history")
+    if result.succeeded:
+        summary.on_medications_taken(db, user, result.succeeded)
+        _invalidate("summary")
+    return result
+
+
+def log_medication_taken(db, med_name: str) -> BulkWriteResult:
+    return log_medications_taken(db, [med_name])
+
+
+@st.cache_resource
+def get_adherence_rollups():
+    return TTLCache(max_entries=2048, max_bytes=QUERY_CACHE_MAX_BYTES, ttl=24 * 60 * 60)
+
+
+def load_adherence(db, days: int = ADHERENCE_WINDOW_DAYS):
+    """Adherence over the last ``days`` completed days, or None without history.
+
+    The user's rollup is extended with only the history recorded since it was
+    last refreshed, so each view reads at most a day's worth of documents.
+    """
+    import pandas as pd
+
+    from adherence import AdherenceRollup, compute_adherence
+
+    rollups = get_adherence_rollups()
+    user = _current_user()
+    rollup = rollups.get(user) or AdherenceRollup()
+    local_tz = datetime.now().astimezone().tzinfo
+    today = pd.Timestamp.now(tz=local_tz).normalize()
+
+    if rollup.next_day is None or rollup.next_day < today.tz_localize(None):
+        since = None
+        if rollup.next_day is not None:
+            since = rollup.next_day.tz_localize(local_tz).to_pydatetime()
+        medicines, timestamps = [], []
+        for data in db.history_range(user, since, today.to_pydatetime()):
+            medicines.append(data.get("medicine"))
+            timestamps.append(data.get("timestamp"))
+        local_times = pd.to_datetime(timestamps, utc=True).tz_convert(local_tz).tz_localize(None)
+        rollup.extend(medicines, local_times, today.tz_localize(None))
+        rollups.set(user, rollup)
+
+    if rollup.taken.empty:
+        return None
+    end = today.tz_localize(None) - pd.Timedelta(days=1)
+    start = max(rollup.taken.index.min(), end - pd.Timedelta(days=days - 1))
+    reminders = [data for _, data in load_reminders(db)]
+    return compute_adherence(rollup.taken, reminders, start, end)
+
+
+def export_records(db, dataset: str, fmt: str, start: date = None, end: date = None):
+    """A no-argument callable that writes the export, for ``st.download_button``.
+
+    ``start`` and ``end`` are inclusive days. The user is resolved here since
+    Streamlit calls the returned function on another thread, on click only.
+    """
+    from zoneinfo import ZoneInfo
+
+    from export import export_file
+
+    user = _current_user()
+    tz = st.session_state.user.get("timezone")
+    # Doses carry real UTC server timestamps; appointments are saved as naive
+    # wall-clock times, so their bounds stay naive too
+    tzinfo = ZoneInfo(tz) if tz and dataset == "med_history" else None
+
+    def bound(day):
+        return None if day is None else datetime.combine(day, datetime.min.time(), tzinfo)
+
+    end_bound = bound(end + timedelta(days=1)) if end else None
+    return lambda: export_file(db, user, dataset, fmt, bound(start), end_bound)
+
+
+def _record_glucose_import(db, report: dict) -> dict:
+    _invalidate("glucose")
+    if report["last"]:
+        summary.on_reading(db, _current_user(), report["last"])
+        _invalidate("summary")
+    return report
+
+
+def import_glucose_csv(db, file) -> dict:
+    from glucose import import_readings, parse_cgm_csv
+
+    return _record_glucose_import(db, import_readings(db, _current_user(), parse_cgm_csv(file)))
+
+
+def add_glucose_reading(db, when: datetime, value: float) -> dict:
+    import pandas as pd
+
+    from glucose import import_readings
+
+    readings = pd.DataFrame({"timestamp": [pd.Timestamp(when)], "mg_dl": [round(value)]})
+    return _record_glucose_import(db, import_readings(db, _current_user(), readings))
+
+
+def load_glucose(db, days: int):
+    """Readings for the last ``days`` days as (datetime64[s], mg/dL) arrays.
+
+    The longest window is read once and cached; shorter windows are slices of it.
+    """
+    import numpy as np
+
+    from glucose import load_readings
+
+    cache = get_query_cache()
+    key = (_current_user(), "glucose")
+    today = date.today()
+    cached = cache.get(key)
+    if cached is None or cached[0] != today:
+        start = today - timedelta(days=max(GLUCOSE_WINDOW_DAYS) - 1)
+        times, values = load_readings(db, _current_user(), start.isoformat(), today.isoformat())
+        cached = (today, times, values)
+        cache.set(key, cached)
+    _, times, values = cached
+    first = np.searchsorted(times, np.datetime64(today - timedelta(days=days - 1), "s"))
+    return times[first:], values[first:]
+
+
+@st.cache_resource
+def get_reminder_dispatcher(_db):
+    return ReminderDispatcher(_db)
+
+
+def _reminder_session_id():
+    if "reminder_session_id" not in st.session_state:
+        st.session_state.reminder_session_id = uuid.uuid4().hex
+    return st.session_state.reminder_session_id
 
 
 def initialize_scheduler(db):
-    if "scheduler" not in st.session_state:
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(lambda: check_reminders(db), "interval", minutes=1)
-        scheduler.start()
-        st.session_state.scheduler = scheduler
+    user = st.session_state.get("user")
+    if user:
+        get_reminder_dispatcher(db).subscribe(
+            user["uid"], _reminder_session_id(), user.get("timezone")
+        )
+
+
+def stop_scheduler(db):
+    user = st.session_state.get("user")
+    if user and "reminder_session_id" in st.session_state:
+        get_reminder_dispatcher(db).unsubscribe(
+            user["uid"], st.session_state.reminder_session_id
+        )
+
+
+def check_reminders(db):
+    user = st.session_state.get("user")
+    if user and "reminder_session_id" in st.session_state:
+        messages = get_reminder_dispatcher(db).drain(
+            user["uid"], st.session_state.reminder_session_id
+        )
+        for message in messages:
+            st.toast(message)
@@ -0,0 +1,105 @@
+"""Streaming CSV/Parquet exports of a user's dose history and appointments.
+
+Rows come out of the repository one cursor page at a time, with the date
+range applied in the query, and are written to a temporary file as they
+arrive: CSV rows, or one Parquet row group per page. No full result set or
+DataFrame is built while writing, but ``st.download_button`` keeps the whole
+finished file in memory to serve it, so an export costs its file size in RAM.
+"""
+
+import csv
+import io
+import tempfile
+from datetime import datetime, timezone
+
+EXPORT_PAGE_SIZE = 1000
+# Format -> (file extension, MIME type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+# Dataset -> (label, columns, time column -> zone). Doses carry real UTC
+# timestamps; appointments are naive wall-clock times (zone None) and are
+# exported without a zone, so they read the same wherever they are opened
+DATASETS = {
+    "med_history": ("Medication history", ("medicine", "timestamp"), {"timestamp": "UTC"}),
+    "appointments": ("Appointments", ("Doctor", "DateTime", "Notes"), {"DateTime": None}),
+}
+
+
+def _as_time(value, zone):
+    if not isinstance(value, datetime):
+        return None
+    # Firestore stores naive datetimes as UTC and reads them back as such
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    elif zone:
+        value = value.replace(tzinfo=timezone.utc)
+    return value if zone else value.replace(tzinfo=None)
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_pages(repo, user: str, dataset: str, start=None, end=None,
+                 page_size: int = EXPORT_PAGE_SIZE):
+    """Yield column dicts (name -> list of values), one per repository page."""
+    _, columns, time_columns = DATASETS[dataset]
+    if dataset == "med_history":
+        pages = repo.history_pages(user, start, end, page_size)
+    else:
+        pages = repo.appointment_pages(user, start, end, page_size)
+    for page in pages:
+        yield {
+            column: [
+                _as_time(row.get(column), time_columns[column])
+                if column in time_columns
+                else row.get(column)
+                for row in page
+            ]
+            for column in columns
+        }
+
+
+def write_csv(pages, columns, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for page in pages:
+        writer.writerows(zip(*([_csv_value(v) for v in page[column]] for column in columns)))
+    text.detach()
+
+
+def write_parquet(pages, columns, time_columns, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            (
+                column,
+                pa.timestamp("us", tz=time_columns[column])
+                if column in time_columns
+                else pa.string(),
+            )
+            for column in columns
+        ]
+    )
+    with pq.ParquetWriter(out, schema) as writer:
+        for page in pages:
+            writer.write_table(pa.table(page, schema=schema))
+
+
+def export_file(repo, user: str, dataset: str, fmt: str, start=None, end=None,
+                page_size: int = EXPORT_PAGE_SIZE) -> bytes:
+    """The finished export file, written through a temporary file."""
+    _, columns, time_columns = DATASETS[dataset]
+    pages = export_pages(repo, user, dataset, start, end, page_size)
+    with tempfile.TemporaryFile() as out:
+        if fmt == "Parquet":
+            write_parquet(pages, columns, time_columns, out)
+        else:
+            write_csv(pages, columns, out)
+        out.seek(0)
+        return out.read()
@@ -0,0 +1,276 @@
+"""Offline FoodData Central index.
+
+Builds a compact, memory-mapped columnar index from a FoodData Central bulk CSV
+export (``food.csv``, ``food_nutrient.csv`` and ``nutrient.csv``) so nutrition
+lookups can be answered locally::
+
+    python fdc_index.py import path/to/FoodData_Central_csv [--index-dir fdc_index]
+
+Re-running the import against a newer dump merges it into the existing index:
+only foods that are new or have a newer publication date have their nutrient
+rows re-extracted.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_INDEX_DIR = "fdc_index"
+CARBS_NUTRIENT = "Carbohydrate, by difference"
+PROTEIN_NUTRIENT = "Protein"
+SOURCE_FILES = ("food.csv", "food_nutrient.csv", "nutrient.csv")
+NUTRIENT_CHUNK_ROWS = 1_000_000
+INDEX_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _stem(token: str) -> str:
+    """Drop a plural ending (or a "y" that pluralizes as "ies"), so the stem
+    is a prefix of both the singular and the plural."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3]  # berries -> berr (berry, berries)
+    if token.endswith("y") and token[-2] not in "aeiou":
+        return token[:-1]  # berry -> berr
+    if token.endswith("es") and token[-3] in "osxh":
+        return token[:-2]  # potatoes -> potato, peaches -> peach
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+class FdcIndex:
+    """Read-only view over an index directory; arrays stay memory-mapped."""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.fdc_id = load("fdc_id.npy")
+        self.carbs = load("carbs.npy")
+        self.protein = load("protein.npy")
+        self._desc_offsets = load("desc_offsets.npy")
+        self._postings = load("postings.npy")
+        self._posting_offsets = load("posting_offsets.npy")
+        desc_path = os.path.join(index_dir, "descriptions.bin")
+        self._descriptions = (
+            np.memmap(desc_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(desc_path)
+            else np.zeros(0, dtype=np.uint8)
+        )
+        with open(os.path.join(index_dir, "vocab.txt"), encoding="utf-8") as f:
+            self._vocab = f.read().split("\n") if len(self.fdc_id) else []
+
+    def __len__(self):
+        return len(self.fdc_id)
+
+    def description(self, row: int) -> str:
+        start, end = self._desc_offsets[row], self._desc_offsets[row + 1]
+        return bytes(self._descriptions[start:end]).decode("utf-8")
+
+    def _rows_for_range(self, lo: int, hi: int) -> np.ndarray:
+        start, end = self._posting_offsets[lo], self._posting_offsets[hi]
+        return np.unique(self._postings[start:end])
+
+    def search(self, query: str, limit: int = 10) -> np.ndarray:
+        """Row ids matching every query token as a word prefix, in any order.
+
+        Plural endings are dropped first, so "potatoes raw" finds "Potato, raw".
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return np.zeros(0, dtype=np.int32)
+
+        rows = None
+        for token in dict.fromkeys(map(_stem, tokens)):
+            lo = bisect_left(self._vocab, token)
+            hi = bisect_left(self._vocab, token + "\uffff", lo)
+            matches = self._rows_for_range(lo, hi)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+            if not len(rows):
+                return rows
+
+        # Shortest description first: the least qualified food is the best match
+        lengths = self._desc_offsets[rows + 1] - self._desc_offsets[rows]
+        return rows[np.argsort(lengths, kind="stable")[:limit]]
+
+    def lookup(self, query: str):
+        for row in self.search(query):
+            carbs, protein = self.carbs[row], self.protein[row]
+            if not (np.isnan(carbs) or np.isnan(protein)):
+                return {"carbs": round(float(carbs), 2), "protein": round(float(protein), 2)}
+        return None
+
+
+def _source_stats(dump_dir: str) -> dict:
+    stats = {}
+    for name in SOURCE_FILES:
+        st_result = os.stat(os.path.join(dump_dir, name))
+        stats[name] = [st_result.st_size, int(st_result.st_mtime)]
+    return stats
+
+
+def _read_manifest(index_dir: str) -> dict:
+    try:
+        with open(os.path.join(index_dir, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _load_existing(index_dir: str) -> pd.DataFrame:
+    if _read_manifest(index_dir).get("version") != INDEX_VERSION:
+        return pd.DataFrame(columns=["fdc_id", "description", "published", "carbs", "protein"])
+    index = FdcIndex(index_dir)
+    return pd.DataFrame(
+        {
+            "fdc_id": np.asarray(index.fdc_id),
+            "description": [index.description(row) for row in range(len(index))],
+            "published": np.load(os.path.join(index_dir, "published.npy")),
+            "carbs": np.asarray(index.carbs),
+            "protein": np.asarray(index.protein),
+        }
+    )
+
+
+def _nutrient_ids(dump_dir: str) -> dict:
+    nutrients = pd.read_csv(os.path.join(dump_dir, "nutrient.csv"), usecols=["id", "name"])
+    ids = {}
+    for column, name in (("carbs", CARBS_NUTRIENT), ("protein", PROTEIN_NUTRIENT)):
+        match = nutrients.loc[nutrients["name"] == name, "id"]
+        if match.empty:
+            raise ValueError(f"nutrient.csv has no '{name}' row")
+        ids[int(match.iloc[0])] = column
+    return ids
+
+
+def _extract_nutrients(dump_dir: str, fdc_ids: np.ndarray) -> pd.DataFrame:
+    nutrient_ids = _nutrient_ids(dump_dir)
+    parts = []
+    for chunk in pd.read_csv(
+        os.path.join(dump_dir, "food_nutrient.csv"),
+        usecols=["fdc_id", "nutrient_id", "amount"],
+        chunksize=NUTRIENT_CHUNK_ROWS,
+    ):
+        chunk = chunk[chunk["nutrient_id"].isin(nutrient_ids) & chunk["fdc_id"].isin(fdc_ids)]
+        if not chunk.empty:
+            parts.append(chunk)
+    if not parts:
+        return pd.DataFrame(columns=["carbs", "protein"], index=pd.Index([], name="fdc_id"))
+    rows = pd.concat(parts, ignore_index=True)
+    rows["nutrient"] = rows["nutrient_id"].map(nutrient_ids)
+    return rows.pivot_table(index="fdc_id", columns="nutrient", values="amount", aggfunc="first")
+
+
+def _write_index(foods: pd.DataFrame, index_dir: str, manifest: dict):
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    foods = foods.sort_values("fdc_id").reset_index(drop=True)
+    encoded = [description.encode("utf-8") for description in foods["description"]]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+
+    postings_by_token = {}
+    for row, description in enumerate(foods["description"]):
+        for token in set(tokenize(description)):
+            postings_by_token.setdefault(token, []).append(row)
+    vocab = sorted(postings_by_token)
+    posting_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum([len(postings_by_token[token]) for token in vocab], out=posting_offsets[1:])
+    postings = np.fromiter(
+        (row for token in vocab for row in postings_by_token[token]),
+        dtype=np.int32,
+        count=int(posting_offsets[-1]),
+    )
+
+    def save(name, array):
+        np.save(os.path.join(tmp_dir, name), array)
+
+    save("fdc_id.npy", foods["fdc_id"].to_numpy(dtype=np.int64))
+    save("published.npy", foods["published"].to_numpy(dtype="datetime64[D]"))
+    save("carbs.npy", foods["carbs"].to_numpy(dtype=np.float32))
+    save("protein.npy", foods["protein"].to_numpy(dtype=np.float32))
+    save("desc_offsets.npy", offsets)
+    save("postings.npy", postings)
+    save("posting_offsets.npy", posting_offsets)
+    with open(os.path.join(tmp_dir, "descriptions.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(tmp_dir, "vocab.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({**manifest, "version": INDEX_VERSION, "rows": len(foods)}, f)
+
+    old_dir = index_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def import_dump(dump_dir: str, index_dir: str = DEFAULT_INDEX_DIR) -> int:
+    """Merge a FoodData Central CSV dump into the index; returns foods (re)indexed."""
+    sources = _source_stats(dump_dir)
+    manifest = _read_manifest(index_dir)
+    if manifest.get("version") == INDEX_VERSION and manifest.get("sources") == sources:
+        return 0
+
+    existing = _load_existing(index_dir)
+    foods = pd.read_csv(
+        os.path.join(dump_dir, "food.csv"),
+        usecols=["fdc_id", "description", "publication_date"],
+        dtype={"description": str},
+    ).rename(columns={"publication_date": "published"})
+    foods["published"] = pd.to_datetime(foods["published"], errors="coerce")
+    foods["description"] = foods["description"].fillna("")
+
+    known = existing.set_index("fdc_id")["published"]
+    previous = pd.to_datetime(foods["fdc_id"].map(known))
+    changed = foods[previous.isna() | (foods["published"] > previous)]
+    if changed.empty and not existing.empty:
+        _write_index(existing, index_dir, {"sources": sources})
+        return 0
+
+    nutrients = _extract_nutrients(dump_dir, changed["fdc_id"].to_numpy())
+    changed = changed.join(nutrients, on="fdc_id")
+    for column in ("carbs", "protein"):
+        if column not in changed:
+            changed[column] = np.nan
+
+    merged = pd.concat(
+        [existing[~existing["fdc_id"].isin(changed["fdc_id"])], changed[existing.columns]],
+        ignore_index=True,
+    )
+    _write_index(merged, index_dir, {"sources": sources})
+    return len(changed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the offline FoodData Central index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Build or update the index from a CSV dump")
+    import_parser.add_argument("dump_dir", help="Directory holding food.csv, food_nutrient.csv and nutrient.csv")
+    import_parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        updated = import_dump(args.dump_dir, args.index_dir)
+        print(f"Indexed {updated} new or updated foods into {args.index_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+MMOL_TO_MG_DL = 18.0182
+# Dexcom exports readings outside the sensor range as "Low"/"High"
+SENSOR_LIMITS = {"low": 40, "high": 400}
+TARGET_RANGE = (70, 180)
+
+
+def encode_block(offsets: np.ndarray, values: np.ndarray) -> dict:
+    """One day of readings as two packed arrays: seconds since midnight and mg/dL."""
+    return {
+        "offsets": offsets.astype("<i4").tobytes(),
+        "values": values.astype("<u2").tobytes(),
+        "count": int(len(values)),
+    }
+
+
+def decode_block(block: dict):
+    return (
+        np.frombuffer(block["offsets"], dtype="<i4"),
+        np.frombuffer(block["values"], dtype="<u2"),
+    )
+
+
+def _find_column(columns, *keywords, prefer=None):
+    matches = [c for c in columns if all(k in c.lower() for k in keywords)]
+    if prefer:
+        preferred = [c for c in matches if prefer in c.lower()]
+        matches = preferred or matches
+    return matches[0] if matches else None
+
+
+def parse_cgm_csv(file) -> pd.DataFrame:
+    """Readings from a Dexcom, Libre or generic CGM export as (timestamp, mg_dl)."""
+    raw = pd.read_csv(file, dtype=str)
+    # LibreView exports start with a metadata line above the real header
+    if _find_column(raw.columns, "time") is None and len(raw):
+        file.seek(0)
+        raw = pd.read_csv(file, dtype=str, skiprows=1)
+
+    time_col = _find_column(raw.columns, "timestamp") or _find_column(raw.columns, "time")
+    value_col = _find_column(raw.columns, "glucose", prefer="historic")
+    if time_col is None or value_col is None:
+        raise ValueError("Could not find timestamp and glucose columns in the CSV")
+
+    # Dexcom mixes calibrations and events in with the sensor readings (EGV rows)
+    event_col = _find_column(raw.columns, "event type")
+    if event_col is not None:
+        raw = raw[raw[event_col].str.upper() == "EGV"]
+
+    values = raw[value_col].str.strip().str.lower().replace(SENSOR_LIMITS)
+    readings = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(raw[time_col], errors="coerce"),
+            "mg_dl": pd.to_numeric(values, errors="coerce"),
+        }
+    ).dropna()
+    if "mmol" in value_col.lower():
+        readings["mg_dl"] *= MMOL_TO_MG_DL
+    if readings["timestamp"].dt.tz is not None:
+        readings["timestamp"] = readings["timestamp"].dt.tz_localize(None)
+    readings["mg_dl"] = readings["mg_dl"].round().clip(0, 65535)
+    return readings.drop_duplicates("timestamp", keep="last").sort_values("timestamp")
+
+
+def merge_into_blocks(existing: dict, readings: pd.DataFrame) -> dict:
+    """Merge new readings into per-day blocks; a new reading replaces one at the same second.
+
+    ``existing`` maps ``YYYY-MM-DD`` to stored blocks; returns the updated blocks
+    for every day touched by ``readings``.
+    """
+    days = readings["timestamp"].dt.normalize()
+    offsets = (readings["timestamp"] - days).dt.total_seconds().to_numpy(dtype=np.int64)
+    values = readings["mg_dl"].to_numpy(dtype=np.int64)
+    day_keys = days.dt.strftime("%Y-%m-%d").to_numpy()
+
+    updated = {}
+    order = np.argsort(day_keys, kind="stable")
+    unique_days, starts = np.unique(day_keys[order], return_index=True)
+    for day, rows in zip(unique_days, np.split(order, starts[1:])):
+        new_offsets, new_values = offsets[rows], values[rows]
+        if day in existing:
+            old_offsets, old_values = decode_block(existing[day])
+            new_offsets = np.concatenate([new_offsets, old_offsets])
+            new_values = np.concatenate([new_values, old_values])
+        # np.unique keeps the first occurrence, which is the newly imported reading
+        merged_offsets, first = np.unique(new_offsets, return_index=True)
+        updated[day] = encode_block(merged_offsets, new_values[first])
+    return updated
+
+
+def import_readings(repo, user: str, readings: pd.DataFrame) -> dict:
+    """Merge readings into the user's day blocks with batched writes."""
+    if readings.empty:
+        return {"days": 0, "readings": 0, "result": None, "last": None}
+
+    day_keys = sorted(set(readings["timestamp"].dt.strftime("%Y-%m-%d")))
+    blocks = merge_into_blocks(repo.get_glucose_blocks(user, day_keys), readings)
+    result = repo.put_glucose_blocks(user, blocks)
+    last = readings.iloc[-1]
+    return {
+        "days": len(blocks),
+        "readings": len(readings),
+        "result": result,
+        "last": {"timestamp": last["timestamp"].to_pydatetime(), "value": int(last["mg_dl"])},
+    }
+
+
+def load_readings(repo, user: str, start_day: str, end_day: str):
+    """Concatenate day blocks into (timestamps as datetime64[s], mg/dL) arrays."""
+    times, values = [], []
+    for block in repo.glucose_blocks_between(user, start_day, end_day):
+        offsets, block_values = decode_block(block)
+        times.append(np.datetime64(block["day"], "s") + offsets.astype("timedelta64[s]"))
+        values.append(block_values)
+    if not times:
+        return np.zeros(0, dtype="datetime64[s]"), np.zeros(0, dtype=np.float64)
+    return np.concatenate(times), np.concatenate(values).astype(np.float64)
+
+
+def latest_reading(repo, user: str):
+    block = repo.latest_glucose_block(user)
+    if block is None:
+        return None
+    offsets, values = decode_block(block)
+    last = int(np.argmax(offsets))
+    timestamp = np.datetime64(block["day"], "s") + np.timedelta64(int(offsets[last]), "s")
+    return {"timestamp": pd.Timestamp(timestamp).to_pydatetime(), "value": int(values[last])}
+
+
+def glucose_stats(values: np.ndarray) -> dict:
+    """Standard CGM summary metrics (international consensus definitions)."""
+    if not len(values):
+        return None
+    mean = float(values.mean())
+    sd = float(values.std())
+    low, high = TARGET_RANGE
+    return {
+        "mean": round(mean, 1),
+        "sd": round(sd, 1),
+        "cv": round(100 * sd / mean, 1) if mean else None,
+        "gmi": round(3.31 + 0.02392 * mean, 1),
+        "tir": round(100 * float(((values >= low) & (values <= high)).mean()), 1),
+        "tbr": round(100 * float((values < low).mean()), 1),
+        "tbr_severe": round(100 * float((values < 54).mean()), 1),
+        "tar": round(100 * float((values > high).mean()), 1),
+        "tar_severe": round(100 * float((values > 250).mean()), 1),
+        "readings": int(len(values)),
+    }
+
+
+def daily_rollup(times: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+    """Per-day mean and time in range, plus a 7-day rolling mean of the daily means."""
+    days = times.astype("datetime64[D]")
+    unique_days, index = np.unique(days, return_inverse=True)
+    counts = np.bincount(index)
+    low, high = TARGET_RANGE
+    in_range = np.bincount(index, weights=(values >= low) & (values <= high))
+    frame = pd.DataFrame(
+        {
+            "Mean mg/dL": np.round(np.bincount(index, weights=values) / counts, 1),
+            "Time in range %": np.round(100 * in_range / counts, 1),
+        },
+        index=pd.DatetimeIndex(unique_days, name="Day"),
+    )
+    frame["7-day mean mg/dL"] = frame["Mean mg/dL"].rolling("7D").mean().round(1)
+    return frame
+
+
+def hourly_series(times: np.ndarray, values: np.ndarray) -> pd.Series:
+    """Readings averaged per hour, which is plenty of resolution for a 90-day chart."""
+    hours = times.astype("datetime64[h]")
+    unique_hours, index = np.unique(hours, return_inverse=True)
+    means = np.bincount(index, weights=values) / np.bincount(index)
+    return pd.Series(np.round(means, 1), index=pd.DatetimeIndex(unique_hours), name="mg/dL")
@@ -0,0 +1,229 @@
+"""Timing spans, latency histograms and a Prometheus text export.
+
+Instrumentation is off unless ``[metrics] enabled = true`` is set in the
+secrets. While it is off ``span`` hands back a shared no-op context manager
+and ``timed`` calls straight through, so instrumented code pays one global
+lookup per call.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+import streamlit as st
+
+# Upper bounds in milliseconds, Prometheus-style (the last bucket is +Inf)
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NOOP = nullcontext()
+_registry = None
+# Cache name -> CacheStats, registered whether or not instrumentation is on
+_caches = {}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the quantile."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    lower = self.buckets[i - 1] if i else 0.0
+                    upper = self.buckets[i] if i < len(self.buckets) else self.max
+                    return lower + (upper - lower) * (rank - seen) / n
+                seen += n
+            return self.max
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def record_error(self, name: str):
+        with self._lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.histogram(self.name).observe((time.perf_counter() - self.start) * 1000)
+        # Streamlit's rerun/stop control flow raises too, but isn't a failure
+        if exc_type is not None and exc_type.__module__.split(".")[0] != "streamlit":
+            self.registry.record_error(self.name)
+        return False
+
+
+def span(name: str):
+    """Time the enclosed block into the ``name`` latency histogram."""
+    registry = _registry
+    if registry is None:
+        return _NOOP
+    return _Span(registry, name)
+
+
+def timed(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            registry = _registry
+            if registry is None:
+                return func(*args, **kwargs)
+            with _Span(registry, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def register_cache(name: str, stats):
+    """Report a cache's ``CacheStats`` on the metrics page and in the export."""
+    _caches[name] = stats
+
+
+def cache_stats() -> dict:
+    """Cache name -> counts snapshot (hits, disk_hits, misses)."""
+    return {name: stats.snapshot() for name, stats in sorted(_caches.items())}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(registry: MetricsRegistry, repo_stats=None) -> str:
+    lines = [
+        "# HELP app_span_duration_ms Duration of instrumented spans in milliseconds.",
+        "# TYPE app_span_duration_ms histogram",
+    ]
+    for name, histogram in sorted(registry.histograms.items()):
+        label = _label(name)
+        with histogram._lock:
+            counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+        cumulative = 0
+        for bound, n in zip(list(histogram.buckets) + ["+Inf"], counts):
+            cumulative += n
+            lines.append(f'app_span_duration_ms_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'app_span_duration_ms_sum{{span="{label}"}} {total:.3f}')
+        lines.append(f'app_span_duration_ms_count{{span="{label}"}} {count}')
+
+    lines += [
+        "# HELP app_span_errors_total Spans that exited with an exception.",
+        "# TYPE app_span_errors_total counter",
+    ]
+    for name, n in sorted(registry.errors.items()):
+        lines.append(f'app_span_errors_total{{span="{_label(name)}"}} {n}')
+
+    lines += [
+        "# HELP app_cache_lookups_total Cache lookups by outcome.",
+        "# TYPE app_cache_lookups_total counter",
+    ]
+    for name, counts in cache_stats().items():
+        for result, key in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses")):
+            lines.append(
+                f'app_cache_lookups_total{{cache="{_label(name)}",result="{result}"}} {counts[key]}'
+            )
+
+    if repo_stats is not None:
+        operations = sorted(repo_stats.snapshot().items())
+        for metric, attribute, help_text in (
+            ("firestore_reads_total", "reads", "Documents read, as billed."),
+            ("firestore_writes_total", "writes", "Documents written."),
+            ("firestore_round_trips_total", "round_trips", "Requests sent to Firestore."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for operation, counts in operations:
+                collection, _, op = operation.partition(".")
+                lines.append(
+                    f'{metric}{{collection="{_label(collection)}",operation="{_label(op)}"}} '
+                    f"{getattr(counts, attribute)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+def _start_server(host: str, port: int, registry: MetricsRegistry, repo_stats):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text(registry, repo_stats).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def metrics_config() -> dict:
+    return st.secrets.get("metrics", {})
+
+
+@st.cache_resource
+def init_metrics(_repo=None):
+    """Turn instrumentation on for this process if configured; returns the registry or None."""
+    global _registry
+    config = metrics_config()
+    if not config.get("enabled"):
+        return None
+    _registry = MetricsRegistry()
+    if config.get("port"):
+        _start_server(
+            config.get("host", "127.0.0.1"),
+            int(config["port"]),
+            _registry,
+            _repo.stats if _repo else None,
+        )
+    return _registry
+
+
+def is_admin(user: dict) -> bool:
+    return bool(user) and user.get("email") in metrics_config().get("admins", [])
@@ -0,0 +1,230 @@
+"""Move per-user data into ``users/{uid}`` subcollections.
+
+Appointments, reminders, dose history and glucose blocks used to live in
+shared top-level collections, tagged with the owner's first name. This copies
+each document to ``users/{uid}/<collection>/<id>`` with the owner field
+rewritten to the uid::
+
+    python migrate.py --dry-run                 # report what would move
+    python migrate.py [--delete-source] [--map "John=uid123" ...]
+
+Names are resolved to uids from the ``users`` profiles. A name shared by
+several profiles, or with no profile at all (Google sign-ins), is left in
+place and reported unless ``--map`` assigns it; the IDs left behind are kept
+in the checkpoint and retried by the next run, e.g. once ``--map`` names their
+owner. Documents are read in
+document-ID order, ``--chunk-size`` at a time, and each chunk is committed
+in batches before its last ID is written to the checkpoint file, so an
+interrupted run picks up where it stopped. Copies are plain sets of the same
+IDs, which makes replaying a partly committed chunk harmless. Home page
+summaries are not copied; they are rebuilt under the uid on first visit.
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+from bulk import FIRESTORE_BATCH_LIMIT, bulk_write, delete_op, set_op
+from repository import GLUCOSE_BLOCK_COLLECTION
+
+# Top-level collection -> field holding the owner's first name
+SOURCES = {
+    "appointments": "User",
+    "reminders": "User",
+    "med_history": "user",
+    GLUCOSE_BLOCK_COLLECTION: "user",
+}
+# A copy and a delete per document must fit in one Firestore batch
+DEFAULT_CHUNK_SIZE = FIRESTORE_BATCH_LIMIT // 2
+DEFAULT_CHECKPOINT = "migrate_checkpoint.json"
+
+
+class Checkpoint:
+    """Per-collection progress, saved atomically after every committed chunk."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def collection(self, name: str) -> dict:
+        state = self.state.setdefault(
+            name, {"last_id": None, "done": False, "copied": 0, "skipped": 0, "unmapped": []}
+        )
+        if "unmapped" not in state:
+            # Written before skipped IDs were kept: rescan, copies are idempotent
+            state.update(last_id=None, done=False, skipped=0, unmapped=[])
+        return state
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def resolve_owners(client, overrides: dict) -> tuple:
+    """Map first names to uids; returns the mapping and the ambiguous names."""
+    uids = {}
+    for doc in client.collection("users").select(["first_name"]).stream():
+        uids.setdefault(doc.to_dict().get("first_name"), []).append(doc.id)
+    owners = {name: ids[0] for name, ids in uids.items() if len(ids) == 1}
+    ambiguous = {name for name, ids in uids.items() if len(ids) > 1} - set(overrides)
+    owners.update(overrides)
+    return owners, ambiguous
+
+
+def _target_id(collection: str, doc) -> str:
+    if collection == GLUCOSE_BLOCK_COLLECTION:
+        # Blocks were keyed "{first_name}_{day}"; under the user they are keyed by day
+        return doc.to_dict()["day"]
+    return doc.id
+
+
+def _chunks(client, collection: str, after_id: str, chunk_size: int):
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    source = client.collection(collection)
+    while True:
+        query = source.order_by(FieldPath.document_id())
+        if after_id is not None:
+            query = query.where(
+                filter=FieldFilter(FieldPath.document_id(), ">", source.document(after_id))
+            )
+        docs = list(query.limit(chunk_size).stream())
+        if not docs:
+            return
+        yield docs
+        after_id = docs[-1].id
+
+
+def _documents(client, collection: str, doc_ids: list) -> list:
+    """The documents of ``doc_ids`` that still exist, in one round trip."""
+    source = client.collection(collection)
+    return [doc for doc in client.get_all([source.document(i) for i in doc_ids]) if doc.exists]
+
+
+def _copy_chunk(client, collection: str, docs: list, owners: dict, dry_run: bool,
+                delete_source: bool) -> list:
+    """Copy the documents whose owner is known; returns the others."""
+    field = SOURCES[collection]
+    users = client.collection("users")
+    operations = []
+    left = []
+    for doc in docs:
+        data = doc.to_dict()
+        uid = owners.get(data.get(field))
+        if uid is None:
+            left.append(doc)
+            continue
+        target = users.document(uid).collection(collection)
+        target = target.document(_target_id(collection, doc))
+        operations.append(set_op(target, {**data, field: uid}))
+        if delete_source:
+            operations.append(delete_op(doc.reference))
+
+    if not dry_run:
+        result = bulk_write(client, operations)
+        if result.failed:
+            raise RuntimeError(
+                f"{collection}: {result.failed} writes failed in {docs[0].id!r}..{docs[-1].id!r}: "
+                f"{result.errors[0]}"
+            )
+    return left
+
+
+def migrate_collection(client, collection: str, owners: dict, checkpoint: Checkpoint,
+                       chunk_size: int, dry_run: bool, delete_source: bool) -> Counter:
+    """Copy one collection; returns documents left behind, by owner name.
+
+    Documents left behind by earlier runs are retried first, so a rerun with
+    more ``--map`` owners picks them up even after the scan has finished.
+    """
+    field = SOURCES[collection]
+    state = checkpoint.collection(collection)
+    unmapped = Counter()
+
+    def copy(docs: list) -> list:
+        left = _copy_chunk(client, collection, docs, owners, dry_run, delete_source)
+        state["copied"] += len(docs) - len(left)
+        unmapped.update(doc.to_dict().get(field) for doc in left)
+        return [doc.id for doc in left]
+
+    def save():
+        state["skipped"] = len(state["unmapped"])
+        checkpoint.save()
+        print(f"  {collection}: {state['copied']} copied, {state['skipped']} left")
+
+    retry = state["unmapped"]
+    kept = []
+    for i in range(0, len(retry), chunk_size):
+        kept += copy(_documents(client, collection, retry[i:i + chunk_size]))
+        state["unmapped"] = kept + retry[i + chunk_size:]
+        save()
+
+    if not state["done"]:
+        for docs in _chunks(client, collection, state["last_id"], chunk_size):
+            state["unmapped"] = state["unmapped"] + copy(docs)
+            state["last_id"] = docs[-1].id
+            save()
+        state["done"] = True
+        checkpoint.save()
+    return unmapped
+
+
+def _parse_map(values) -> dict:
+    overrides = {}
+    for value in values or ():
+        name, sep, uid = value.partition("=")
+        if not sep or not uid:
+            raise ValueError(f"--map expects NAME=UID, got {value!r}")
+        overrides[name] = uid
+    return overrides
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="read and report without writing")
+    parser.add_argument("--delete-source", action="store_true", help="remove migrated originals")
+    parser.add_argument("--map", action="append", metavar="NAME=UID", help="owner of a name")
+    parser.add_argument("--collections", default=",".join(SOURCES))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args(argv)
+    if args.chunk_size * (2 if args.delete_source else 1) > FIRESTORE_BATCH_LIMIT:
+        parser.error(f"--chunk-size is limited to {FIRESTORE_BATCH_LIMIT} writes per batch")
+    try:
+        overrides = _parse_map(args.map)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from data_layer import initialize_repository
+
+    client = initialize_repository().client
+    owners, ambiguous = resolve_owners(client, overrides)
+    # A dry run reports from the start and leaves real progress untouched
+    checkpoint = Checkpoint(None if args.dry_run else args.checkpoint)
+
+    left = Counter()
+    for collection in args.collections.split(","):
+        print(f"{'Checking' if args.dry_run else 'Migrating'} {collection}")
+        left += migrate_collection(
+            client, collection, owners, checkpoint, args.chunk_size, args.dry_run,
+            args.delete_source,
+        )
+
+    for name, n in left.most_common():
+        reason = "shared by several users" if name in ambiguous else "no matching user"
+        print(f"Left {n} documents of {name!r} in place ({reason}); assign with --map")
+    return 1 if left else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
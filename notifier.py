@@ -0,0 +1,541 @@
+"""Standalone reminder notification worker.
+
+Runs outside Streamlit, watches every user's reminders and, as they fall due
+in their own time zone, pushes them through an asyncio delivery queue to the
+configured channels (SMS to the profile phone, email, webhook)::
+
+    python notifier.py [--once] [--sink DIR] [--channels sms,email]
+
+Each channel has its own queue, batch size and concurrency limit. Every
+notification carries an idempotency key (reminder, fire time, channel) that is
+claimed in a SQLite ledger before it is queued, so a restart or an overlapping
+catch-up window never sends the same reminder twice. Only workers that share
+the ledger file, i.e. run on the same host, are deduplicated against each
+other: a worker on another host has its own ledger and would send duplicates,
+so run one worker per deployment. A claim still in flight after
+``CLAIM_TIMEOUT_SECONDS`` (its worker died before sending) is taken over and
+sent again. A notification that fails every attempt is parked in the ledger
+and requeued with a growing delay, across restarts, before the worker gives up
+on it. ``--sink DIR`` swaps every channel for a local JSON-lines file for
+testing.
+
+Reminders and profiles (contact details, time zones) are both followed with
+snapshot listeners, so after the initial snapshot only changed documents are
+read.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cache import SQLiteStore
+from reminders import ReminderIndex, reminder_text
+
+logger = logging.getLogger("notifier")
+
+DEFAULT_CHANNELS = ("sms", "email")
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_WAIT_SECONDS = 0.5
+DEFAULT_CONCURRENCY = 4
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 2.0
+# Rounds of MAX_ATTEMPTS before giving up; after failed round n the notification
+# is requeued REQUEUE_DELAY_SECONDS * 2**(n-1) later
+MAX_ROUNDS = 5
+REQUEUE_DELAY_SECONDS = 5 * 60
+INITIAL_SNAPSHOT_TIMEOUT_SECONDS = 60
+# Longer than any delivery can take, batches waiting for a connection included
+CLAIM_TIMEOUT_SECONDS = 30 * 60
+CATCH_UP_MINUTES = 5
+LEDGER_TTL_SECONDS = 3 * 24 * 60 * 60
+HTTP_TIMEOUT = (3.05, 10)
+
+
+@dataclass(frozen=True)
+class Notification:
+    key: str
+    channel: str
+    recipient: str
+    user: str
+    medicine: str
+    fire_at: str
+    text: str
+
+
+class DeliveryLedger:
+    """Idempotency keys of notifications that were queued or sent, the claims
+    still in flight, and the failed notifications waiting to be requeued."""
+
+    def __init__(self, path: str, ttl: float = LEDGER_TTL_SECONDS):
+        self._store = SQLiteStore(path, table="notifications", ttl=ttl)
+        self._claims = SQLiteStore(path, table="notification_claims", ttl=ttl)
+        self._retries = SQLiteStore(path, table="notification_retries", ttl=ttl)
+
+    def claim(self, notification: Notification, rounds: int = 0) -> bool:
+        if not self._store.add(notification.key, "pending"):
+            return False
+        self._track(notification, rounds, time.time())
+        return True
+
+    def mark_sent(self, key: str):
+        self._store.set(key, "sent")
+        self._claims.delete(key)
+
+    def mark_failed(self, key: str):
+        self._store.set(key, "failed")
+        self._claims.delete(key)
+
+    def defer(self, notification: Notification, rounds: int, retry_at: float):
+        """Park a notification for another round; its key stays claimed meanwhile."""
+        self._retries.set(
+            notification.key,
+            {"notification": asdict(notification), "rounds": rounds, "retry_at": retry_at},
+        )
+        self._claims.delete(notification.key)
+
+    def due_retries(self, now: float) -> list:
+        """Take the ``(notification, rounds done)`` pairs whose retry time has come."""
+        due = []
+        for key, entry in self._retries.items():
+            if entry["retry_at"] <= now and self._retries.delete(key):
+                notification = Notification(**entry["notification"])
+                self._track(notification, entry["rounds"], now)
+                due.append((notification, entry["rounds"]))
+        return due
+
+    def stale_claims(self, now: float) -> list:
+        """Take over claims in flight for over ``CLAIM_TIMEOUT_SECONDS``, as
+        ``(notification, rounds done)`` pairs; their worker died before sending."""
+        stale = []
+        for key, entry in self._claims.items():
+            if entry["claimed_at"] > now - CLAIM_TIMEOUT_SECONDS:
+                continue
+            # Another worker sharing the ledger may be taking the same claim over
+            if self._claims.replace(key, entry, {**entry, "claimed_at": now}):
+                stale.append((Notification(**entry["notification"]), entry["rounds"]))
+        return stale
+
+    def _track(self, notification: Notification, rounds: int, now: float):
+        self._claims.set(
+            notification.key,
+            {"notification": asdict(notification), "rounds": rounds, "claimed_at": now},
+        )
+
+
+# Channels
+
+
+class Channel:
+    """Delivers batches of notifications; subclasses implement ``_send``.
+
+    ``concurrency`` is the number of batches in flight at once, i.e. the
+    number of simultaneous connections to the provider.
+    """
+
+    field = None  # profile field holding the recipient address
+
+    def __init__(self, name: str, concurrency: int = DEFAULT_CONCURRENCY,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.name = name
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def recipient(self, uid: str, profile: dict):
+        return profile.get(self.field) if self.field else uid
+
+    async def send_batch(self, notifications: list) -> list:
+        """One result per notification: ``None`` when sent, else the error."""
+        return await asyncio.to_thread(self._send, notifications)
+
+    def _send(self, notifications: list) -> list:
+        raise NotImplementedError
+
+
+class SmsChannel(Channel):
+    """Twilio Messages API; one request per message over a shared connection."""
+
+    field = "phone"
+    API_URL = "https://api.twilio.com/2010-04-01/Accounts/{}/Messages.json"
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, **kwargs):
+        super().__init__("sms", **kwargs)
+        self.url = self.API_URL.format(account_sid)
+        self.auth = (account_sid, auth_token)
+        self.from_number = from_number
+
+    def _send(self, notifications: list) -> list:
+        import requests
+
+        results = []
+        with requests.Session() as session:
+            for notification in notifications:
+                try:
+                    response = session.post(
+                        self.url,
+                        auth=self.auth,
+                        data={
+                            "From": self.from_number,
+                            "To": notification.recipient,
+                            "Body": notification.text,
+                        },
+                        timeout=HTTP_TIMEOUT,
+                    )
+                    response.raise_for_status()
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        return results
+
+
+class EmailChannel(Channel):
+    """SMTP; one login per batch."""
+
+    field = "email"
+
+    def __init__(self, host: str, sender: str, port: int = 587, username: str = None,
+                 password: str = None, **kwargs):
+        super().__init__("email", **kwargs)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+
+    def _send(self, notifications: list) -> list:
+        import smtplib
+        from email.message import EmailMessage
+
+        with smtplib.SMTP(self.host, self.port, timeout=HTTP_TIMEOUT[1]) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            results = []
+            for notification in notifications:
+                message = EmailMessage()
+                message["From"] = self.sender
+                message["To"] = notification.recipient
+                message["Subject"] = "Medication reminder"
+                message.set_content(notification.text)
+                try:
+                    smtp.send_message(message)
+                    results.append(None)
+                except smtplib.SMTPException as e:
+                    results.append(e)
+        return results
+
+
+class WebhookChannel(Channel):
+    """POSTs each batch as one JSON document; the recipient is the user ID."""
+
+    def __init__(self, url: str, headers: dict = None, **kwargs):
+        super().__init__("webhook", **kwargs)
+        self.url = url
+        self.headers = dict(headers or {})
+
+    def _send(self, notifications: list) -> list:
+        import requests
+
+        # Covers the whole batch, so a retried subset is not mistaken for the original
+        batch_key = hashlib.sha256(
+            "\n".join(sorted(n.key for n in notifications)).encode("utf-8")
+        ).hexdigest()
+        response = requests.post(
+            self.url,
+            json={"notifications": [asdict(n) for n in notifications]},
+            headers={"Idempotency-Key": batch_key, **self.headers},
+            timeout=HTTP_TIMEOUT,
+        )
+        response.raise_for_status()
+        return [None] * len(notifications)
+
+
+class LocalSinkChannel(Channel):
+    """Appends notifications to ``<directory>/<name>.jsonl`` instead of sending them."""
+
+    def __init__(self, name: str, directory: str, field: str = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.field = field
+        self.path = Path(directory) / f"{name}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _send(self, notifications: list) -> list:
+        with self.path.open("a", encoding="utf-8") as f:
+            for notification in notifications:
+                f.write(json.dumps(asdict(notification), ensure_ascii=False) + "\n")
+        return [None] * len(notifications)
+
+
+CHANNEL_TYPES = {"sms": SmsChannel, "email": EmailChannel, "webhook": WebhookChannel}
+
+
+def build_channels(config: dict, names, sink_dir: str = None) -> dict:
+    channels = {}
+    for name in names:
+        options = dict(config.get(name, {}))
+        limits = {
+            "concurrency": int(options.pop("concurrency", DEFAULT_CONCURRENCY)),
+            "batch_size": int(
+                options.pop("batch_size", config.get("batch_size", DEFAULT_BATCH_SIZE))
+            ),
+        }
+        if sink_dir:
+            channels[name] = LocalSinkChannel(
+                name, sink_dir, field=getattr(CHANNEL_TYPES.get(name), "field", None), **limits
+            )
+        elif name in CHANNEL_TYPES:
+            channels[name] = CHANNEL_TYPES[name](**options, **limits)
+        else:
+            raise ValueError(f"Unknown notification channel: {name}")
+    return channels
+
+
+# Delivery
+
+
+class DeliveryQueue:
+    """Per-channel asyncio queues drained in batches under a concurrency limit."""
+
+    def __init__(self, channels: dict, ledger: DeliveryLedger,
+                 batch_wait: float = DEFAULT_BATCH_WAIT_SECONDS):
+        self.channels = channels
+        self.ledger = ledger
+        self.batch_wait = batch_wait
+        self.sent = self.failed = self.deferred = self.duplicates = 0
+        # Idempotency key -> rounds already attempted, for requeued notifications
+        self._rounds = {}
+        self._queues = {}
+        self._limits = {}
+        self._tasks = set()
+
+    def start(self):
+        for name, channel in self.channels.items():
+            self._queues[name] = asyncio.Queue()
+            self._limits[name] = asyncio.Semaphore(channel.concurrency)
+            self._spawn(self._consume(name))
+
+    def submit(self, notification: Notification) -> bool:
+        """Queue ``notification`` unless its idempotency key was already claimed."""
+        if not self.ledger.claim(notification):
+            self.duplicates += 1
+            return False
+        self._queues[notification.channel].put_nowait(notification)
+        return True
+
+    def resubmit(self, notification: Notification, rounds: int):
+        """Queue a deferred or abandoned notification again; its key is already claimed."""
+        self._rounds[notification.key] = rounds
+        self._queues[notification.channel].put_nowait(notification)
+
+    async def drain(self):
+        await asyncio.gather(*(queue.join() for queue in self._queues.values()))
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _next_batch(self, name: str) -> list:
+        queue = self._queues[name]
+        batch = [await queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.channels[name].batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self, name: str):
+        while True:
+            batch = await self._next_batch(name)
+            self._spawn(self._deliver(name, batch))
+
+    async def _deliver(self, name: str, batch: list):
+        channel = self.channels[name]
+        pending = batch
+        for attempt in range(MAX_ATTEMPTS):
+            async with self._limits[name]:
+                try:
+                    results = await channel.send_batch(pending)
+                except Exception as e:
+                    results = [e] * len(pending)
+            failed = []
+            for notification, error in zip(pending, results):
+                if error is None:
+                    self.ledger.mark_sent(notification.key)
+                    self._rounds.pop(notification.key, None)
+                    self.sent += 1
+                else:
+                    failed.append((notification, error))
+            pending = [notification for notification, _ in failed]
+            if not pending:
+                break
+            if attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2**attempt)
+        for notification, error in failed:
+            rounds = self._rounds.pop(notification.key, 0) + 1
+            if rounds < MAX_ROUNDS:
+                delay = REQUEUE_DELAY_SECONDS * 2 ** (rounds - 1)
+                logger.warning("Retrying %s in %d s: %s", notification.key, delay, error)
+                self.ledger.defer(notification, rounds, time.time() + delay)
+                self.deferred += 1
+            else:
+                logger.warning("Giving up on %s: %s", notification.key, error)
+                self.ledger.mark_failed(notification.key)
+                self.failed += 1
+        for _ in batch:
+            self._queues[name].task_done()
+
+
+# Worker
+
+
+class NotificationWorker:
+    """Evaluates due reminders for every user and feeds the delivery queue."""
+
+    def __init__(self, repo, queue: DeliveryQueue, catch_up_minutes: int = CATCH_UP_MINUTES):
+        self.repo = repo
+        self.queue = queue
+        # Fire times missed while the worker was down are still sent, up to this far back
+        self.index = ReminderIndex(start=time.time() - catch_up_minutes * 60)
+        self._fields = {"timezone"} | {c.field for c in queue.channels.values() if c.field}
+        self._contacts = {}
+        self._watches = []
+
+    async def start(self):
+        users_ready, reminders_ready = threading.Event(), threading.Event()
+        self._watches.append(
+            self.repo.watch_users(
+                self._on_profile,
+                lambda uid: self._contacts.pop(uid, None),
+                on_ready=users_ready.set,
+            )
+        )
+        self._watches.append(
+            self.repo.watch_reminders(
+                self.index.upsert, self.index.remove, on_ready=reminders_ready.set
+            )
+        )
+        # Ticking before the initial snapshots land would skip every reminder in them
+        for ready in (users_ready, reminders_ready):
+            if not await asyncio.to_thread(ready.wait, INITIAL_SNAPSHOT_TIMEOUT_SECONDS):
+                raise TimeoutError("No initial snapshot from the repository")
+        self.queue.start()
+
+    def _on_profile(self, uid: str, profile: dict):
+        self._contacts[uid] = {field: profile.get(field) for field in self._fields}
+        self.index.set_timezone(uid, profile.get("timezone"))
+
+    def notifications_for(self, due: list) -> list:
+        notifications = []
+        for reminder_id, user, medicine, fire_at in due:
+            profile = self._contacts.get(user)
+            if profile is None:
+                # Not in the listener's cache yet; pop_due has already re-armed the
+                # reminder, so skipping it would lose this dose for good
+                profile = self.repo.get_user(user)
+                if profile is not None:
+                    self._on_profile(user, profile)
+                # Without a profile the webhook, keyed by uid, still gets it
+                profile = self._contacts.get(user, {})
+            fired = datetime.fromtimestamp(fire_at, timezone.utc)
+            for name, channel in self.queue.channels.items():
+                recipient = channel.recipient(user, profile)
+                if not recipient:
+                    continue
+                notifications.append(
+                    Notification(
+                        key=f"{reminder_id}:{fired:%Y-%m-%dT%H:%MZ}:{name}",
+                        channel=name,
+                        recipient=recipient,
+                        user=user,
+                        medicine=medicine,
+                        fire_at=fired.isoformat(),
+                        text=reminder_text(medicine),
+                    )
+                )
+        return notifications
+
+    async def tick(self, now: float = None) -> int:
+        """Queue reminders due since the last tick, due retries and abandoned claims."""
+        now = time.time() if now is None else now
+        due = self.index.pop_due(now)
+        notifications = await asyncio.to_thread(self.notifications_for, due)
+        queued = sum(map(self.queue.submit, notifications))
+        ledger = self.queue.ledger
+        for requeue in (ledger.due_retries, ledger.stale_claims):
+            for notification, rounds in await asyncio.to_thread(requeue, now):
+                self.queue.resubmit(notification, rounds)
+                queued += 1
+        return queued
+
+    async def run(self, once: bool = False):
+        try:
+            await self.start()
+            while True:
+                queued = await self.tick()
+                if queued:
+                    logger.info("Queued %d notifications", queued)
+                if once:
+                    await self.queue.drain()
+                    return
+                # Reminders added meanwhile are picked up within a minute
+                next_fire = self.index.next_fire_time() or float("inf")
+                await asyncio.sleep(min(max(next_fire - time.time(), 0), 60) + 0.05)
+        finally:
+            for watch in self._watches:
+                watch.unsubscribe()
+            await self.queue.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--once", action="store_true", help="send what is due now and exit")
+    parser.add_argument("--channels", help="comma-separated channel names (default from secrets)")
+    parser.add_argument("--sink", metavar="DIR", help="write notifications to DIR instead of sending")
+    parser.add_argument("--catch-up-minutes", type=int, default=CATCH_UP_MINUTES)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    import streamlit as st
+
+    from data_layer import initialize_repository
+
+    config = st.secrets.get("notifier", {})
+    names = args.channels.split(",") if args.channels else config.get("channels", DEFAULT_CHANNELS)
+    channels = build_channels(config, names, sink_dir=args.sink)
+    ledger = DeliveryLedger(config.get("ledger_path", "notifier.sqlite3"))
+    queue = DeliveryQueue(
+        channels, ledger, config.get("batch_wait_seconds", DEFAULT_BATCH_WAIT_SECONDS)
+    )
+    worker = NotificationWorker(initialize_repository(), queue, args.catch_up_minutes)
+    try:
+        asyncio.run(worker.run(once=args.once))
+    except KeyboardInterrupt:
+        pass
+    logger.info(
+        "Sent %d, failed %d, deferred %d, skipped %d duplicates",
+        queue.sent, queue.failed, queue.deferred, queue.duplicates,
+    )
+    return 1 if queue.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,79 @@
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-import pandas as pd
 import streamlit as st
-from firebase_admin import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
 
-from data_layer import log_medication_taken
-from services import format_firestore_datetime, get_gemini_response, get_nutrition_info
+from data_layer import (
+    ADHERENCE_WINDOW_DAYS,
+    GLUCOSE_WINDOW_DAYS,
+    add_appointment,
+    add_glucose_reading,
+    add_reminder,
+    delete_appointments,
+    delete_reminders,
+    export_records,
+    get_history_buffer,
+    import_glucose_csv,
+    load_adherence,
+    load_appointments,
+    load_glucose,
+    load_more_history,
+    load_reminders,
+    load_summary,
+    log_medications_taken,
+)
+from export import DATASETS, FORMATS
+from services import (
+    MEAL_TOTAL,
+    format_firestore_datetime,
+    get_meal_nutrition,
+    get_nutrition_info,
+    stream_gemini_response,
+    triage_prompt,
+)
+from summary import medications_remaining
+
+TIME_OPTIONS = tuple(f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 15, 30, 45))
+DAY_OPTIONS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _format_time_option(hhmm: str) -> str:
+    return datetime.strptime(hhmm, "%H:%M").strftime("%I:%M %p")
+
+
+def _report_bulk_result(result, action: str, noun: str, scope: str = "app"):
+    if result.failed:
+        total = result.succeeded + result.failed
+        st.error(
+            f"{action} {result.succeeded} of {total} {noun}; "
+            f"{result.failed} failed: {result.errors[0]}"
+        )
+    else:
+        st.success(f"{action} {result.succeeded} {noun}!")
+        st.rerun(scope=scope)
 
 
-def render_home_page():
+def render_home_page(db):
     st.title(f"Welcome back, {st.session_state.user['first_name']}!")
     today = datetime.today().strftime("%A, %B %d")
     st.markdown(f"**Today is {today}** - Here's your daily overview:")
+    summary = load_summary(db)
+
+    appointment = summary.get("next_appointment")
+    last_reading = summary.get("last_reading")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Next Appointment", "Dr. Smith\n3:00 PM")
-    col2.metric("Medications Due", "2 Remaining")
-    col3.metric("Blood Sugar", "120 mg/dL")
+    col1.metric(
+        "Next Appointment",
+        (
+            f"{appointment['Doctor']}\n{format_firestore_datetime(appointment['DateTime'])}"
+            if appointment
+            else "None scheduled"
+        ),
+    )
+    col2.metric("Medications Due", f"{medications_remaining(summary)} Remaining")
+    col3.metric(
+        "Blood Sugar", f"{last_reading['value']} mg/dL" if last_reading else "No readings"
+    )
 
 
 def render_chatbot_page():
@@ -30,45 +86,24 @@ def render_chatbot_page():
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
 
-    quick_responses = {
-        "emergency": "🚨 If experiencing confusion, seizures, or loss of consciousness, seek immediate medical help!",
-        "hi": "Hello! I'm your diabetes assistant. How can I help today?",
-        "thanks": "You're welcome! Remember to always consult your healthcare team for personal advice.",
-    }
-
-    emergency_keywords = {
-        "emergency": "🚨 Seek immediate medical help for:",
-        "hypo": "Hypoglycemia symptoms: Shaking, sweating. Treat with 15g fast-acting carbs",
-        "hyper": "Hyperglycemia symptoms: Thirst, fatigue. Check blood sugar, contact doctor",
-    }
-
     if prompt := st.chat_input("Ask about diabetes"):
         st.session_state.messages.append({"role": "user", "content": prompt})
-
-        lower_prompt = prompt.lower()
-        quick_response = next(
-            (response for key, response in quick_responses.items() if key in lower_prompt),
-            None,
-        )
-        emergency_response = next(
-            (
-                response
-                for key, response in emergency_keywords.items()
-                if key in lower_prompt
-            ),
-            None,
-        )
-
-        with st.spinner("Analyzing your question..."):
-            if quick_response:
-                response = quick_response
-            elif emergency_response:
-                response = emergency_response
+        match = triage_prompt(prompt)
+
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            if match is not None and match.emergency:
+                response = match.response
+                st.error(response)
+            elif match is not None:
+                response = match.response
+                st.markdown(response)
             else:
-                response = get_gemini_response(prompt)
+                response = st.write_stream(stream_gemini_response(prompt))
 
         st.session_state.messages.append({"role": "assistant", "content": response})
-        st.rerun()
 
 
 def render_schedule_page(db):
@@ -83,13 +118,13 @@ def render_schedule_page(db):
         if st.form_submit_button("Add Appointment"):
             try:
                 selected_datetime = datetime.combine(appt_date, appt_time)
-                db.collection("appointments").add(
+                add_appointment(
+                    db,
                     {
                         "Doctor": doc_name,
                         "DateTime": selected_datetime,
                         "Notes": notes,
-                        "User": st.session_state.user["first_name"],
-                    }
+                    },
                 )
                 st.success("Appointment added!")
             except Exception as e:
@@ -97,21 +132,21 @@ def render_schedule_page(db):
             st.rerun()
 
     st.subheader("Upcoming Appointments")
-    try:
-        appointments = (
-            db.collection("appointments")
-            .where(filter=FieldFilter("User", "==", st.session_state.user["first_name"]))
-            .order_by("DateTime")
-            .stream()
-        )
+    _appointments_table(db)
+
+
+@st.fragment
+def _appointments_table(db):
+    """Editing or deleting rows reruns only this table."""
+    import pandas as pd
 
+    try:
         appointment_list = []
         doc_ids = []
-        for doc in appointments:
-            data = doc.to_dict()
+        for doc_id, data in load_appointments(db):
             data["DateTime"] = format_firestore_datetime(data["DateTime"])
             appointment_list.append(data)
-            doc_ids.append(doc.id)
+            doc_ids.append(doc_id)
 
         df = pd.DataFrame(appointment_list)
         if df.empty:
@@ -132,31 +167,43 @@ def render_schedule_page(db):
 
         if st.button("Delete Selected Appointments") and st.checkbox("Confirm deletion"):
             selected_indices = edited_df[edited_df["Delete"]].index
-            for idx in selected_indices:
-                db.collection("appointments").document(doc_ids[idx]).delete()
-            st.success("Selected appointments deleted!")
-            st.rerun()
+            result = delete_appointments(db, [doc_ids[idx] for idx in selected_indices])
+            _report_bulk_result(result, "Deleted", "appointments", scope="fragment")
 
         if st.button("⚠️ Delete ALL Appointments") and st.checkbox("Confirm deletion"):
-            for doc_id in doc_ids:
-                db.collection("appointments").document(doc_id).delete()
-            st.success("All appointments deleted!")
-            st.rerun()
+            result = delete_appointments(db, doc_ids)
+            _report_bulk_result(result, "Deleted", "appointments", scope="fragment")
     except Exception as e:
         st.error(f"Error loading appointments: {str(e)}")
 
 
 def render_diet_page():
     st.title("Diabetes-Friendly Diet Guide")
-    food = st.text_input("Check food nutrition")
-    if food:
-        nutrition = get_nutrition_info(food)
-        if nutrition:
-            st.write(
-                f"🍞 Carbs: {nutrition['carbs']}g | 🥩 Protein: {nutrition['protein']}g"
-            )
-        else:
-            st.warning("No data found - try exact terms like 'raw potato'")
+    mode = st.radio("Lookup", ["Single food", "Whole meal"], horizontal=True)
+    if mode == "Single food":
+        food = st.text_input("Check food nutrition")
+        if food:
+            nutrition = get_nutrition_info(food)
+            if nutrition:
+                st.write(
+                    f"🍞 Carbs: {nutrition['carbs']}g | 🥩 Protein: {nutrition['protein']}g"
+                )
+            else:
+                st.warning("No data found - try exact terms like 'raw potato'")
+    else:
+        meal = st.text_area(
+            "List the foods in your meal", placeholder="oatmeal, banana, whole milk"
+        )
+        if meal:
+            meal_df = get_meal_nutrition(meal)
+            st.dataframe(meal_df, hide_index=True, width="stretch")
+            items = ~meal_df["Food"].str.startswith(MEAL_TOTAL)
+            missing = meal_df.loc[items & meal_df["Carbs (g)"].isna(), "Food"].tolist()
+            if missing:
+                st.warning(
+                    f"No data found for: {', '.join(missing)}. "
+                    "The meal total leaves these out."
+                )
 
     with st.expander("📌 Key Dietary Principles"):
         st.write(
@@ -172,7 +219,51 @@ def render_diet_page():
 
 def render_medication_page(db):
     st.title("Medication Reminders")
+    _reminder_form(db)
+
+    st.subheader("Active Reminders")
+    _reminders_table(db)
+
+    st.subheader("Medication History")
+    _history_table(db)
+
+    _adherence_report(db)
+
+    with st.expander("📤 Export records"):
+        _export_panel(db)
+
+
+@st.fragment
+def _export_panel(db):
+    """History and appointments as CSV or Parquet, e.g. to share with a clinician."""
+    col1, col2 = st.columns(2)
+    dataset = col1.selectbox(
+        "Records", list(DATASETS), format_func=lambda name: DATASETS[name][0]
+    )
+    fmt = col2.radio("Format", list(FORMATS), horizontal=True)
+    everything = st.checkbox("All dates", value=True)
+    start = end = None
+    if not everything:
+        col1, col2 = st.columns(2)
+        start = col1.date_input("From", value=date.today() - timedelta(days=90))
+        end = col2.date_input("To", value=date.today())
+        if start > end:
+            st.error("The start date must not be after the end date")
+            return
 
+    extension, mime = FORMATS[fmt]
+    period = "all" if everything else f"{start:%Y%m%d}-{end:%Y%m%d}"
+    st.download_button(
+        "Download",
+        data=export_records(db, dataset, fmt, start, end),
+        file_name=f"{dataset}_{period}.{extension}",
+        mime=mime,
+    )
+
+
+@st.fragment
+def _reminder_form(db):
+    """Changing the frequency reruns only the form; saving a reminder reruns the page."""
     if "frequency" not in st.session_state:
         st.session_state.frequency = "Daily"
     if "selected_days" not in st.session_state:
@@ -197,27 +288,17 @@ def render_medication_page(db):
             )
 
         with col2:
-            time_options = [f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 15, 30, 45)]
             selected_time = st.select_slider(
                 "Select Reminder Time",
-                options=time_options,
+                options=TIME_OPTIONS,
                 value="09:00",
-                format_func=lambda x: datetime.strptime(x, "%H:%M").strftime("%I:%M %p"),
+                format_func=_format_time_option,
             )
 
         if st.session_state.frequency == "Specific Days":
-            days_options = [
-                "Monday",
-                "Tuesday",
-                "Wednesday",
-                "Thursday",
-                "Friday",
-                "Saturday",
-                "Sunday",
-            ]
             st.session_state.selected_days = st.multiselect(
                 "Select Days",
-                options=days_options,
+                options=DAY_OPTIONS,
                 default=["Monday", "Wednesday", "Friday"],
                 help="Select days for reminders",
             )
@@ -235,7 +316,8 @@ def render_medication_page(db):
             ):
                 st.error("Please select at least one day")
             else:
-                db.collection("reminders").add(
+                add_reminder(
+                    db,
                     {
                         "Medicine": med_name,
                         "Time": selected_time,
@@ -244,93 +326,257 @@ def render_medication_page(db):
                             if st.session_state.frequency != "Specific Days"
                             else ", ".join(st.session_state.selected_days)
                         ),
-                        "User": st.session_state.user["first_name"],
-                    }
+                    },
                 )
                 st.success("Reminder set!")
                 st.rerun()
 
-    st.subheader("Active Reminders")
-    reminders = (
-        db.collection("reminders")
-        .where(filter=FieldFilter("User", "==", st.session_state.user["first_name"]))
-        .order_by("Time", direction=firestore.Query.ASCENDING)
-        .stream()
-    )
+
+@st.fragment
+def _reminders_table(db):
+    """Ticking rows and deleting rerun only this table; logging doses reruns the page."""
+    import pandas as pd
 
     reminder_list = []
     doc_ids = []
-    for doc in reminders:
-        data = doc.to_dict()
+    for doc_id, data in load_reminders(db):
         data["Time"] = format_firestore_datetime(data.get("Time"))
         reminder_list.append(data)
-        doc_ids.append(doc.id)
+        doc_ids.append(doc_id)
 
-    if reminder_list:
-        df = pd.DataFrame(reminder_list)
-        df["Delete"] = False
-        edited_df = st.data_editor(
-            df,
-            column_config={
-                "Delete": st.column_config.CheckboxColumn(
-                    "Delete?", help="Select reminders to delete", default=False
-                )
-            },
-            hide_index=True,
-            width="stretch",
-            column_order=("Medicine", "Time", "Frequency", "Delete"),
-        )
+    if not reminder_list:
+        st.info("No active reminders found")
+        return
+
+    df = pd.DataFrame(reminder_list)
+    df["Delete"] = False
+    edited_df = st.data_editor(
+        df,
+        column_config={
+            "Delete": st.column_config.CheckboxColumn(
+                "Delete?", help="Select reminders to delete", default=False
+            )
+        },
+        hide_index=True,
+        width="stretch",
+        column_order=("Medicine", "Time", "Frequency", "Delete"),
+    )
 
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            if st.button("Delete Selected"):
-                selected_indices = edited_df[edited_df["Delete"]].index
-                for idx in selected_indices:
-                    db.collection("reminders").document(doc_ids[idx]).delete()
-                st.success("Selected reminders deleted!")
-                st.rerun()
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        if st.button("Delete Selected"):
+            selected_indices = edited_df[edited_df["Delete"]].index
+            result = delete_reminders(db, [doc_ids[idx] for idx in selected_indices])
+            # Adherence below is scored against the active reminders
+            _report_bulk_result(result, "Deleted", "reminders")
 
-        with col2:
-            if st.button("✅ Mark as Taken"):
-                selected_indices = edited_df[edited_df["Delete"]].index
-                for idx in selected_indices:
-                    log_medication_taken(db, edited_df.iloc[idx]["Medicine"])
-                st.success(f"Logged {len(selected_indices)} medications taken!")
+    with col2:
+        if st.button("✅ Mark as Taken"):
+            selected_indices = edited_df[edited_df["Delete"]].index
+            result = log_medications_taken(
+                db, [edited_df.iloc[idx]["Medicine"] for idx in selected_indices]
+            )
+            if not result.failed:
                 st.balloons()
-                st.rerun()
-
-        with col3:
-            if st.button("⚠️ Delete ALL Reminders", type="secondary"):
-                for doc_id in doc_ids:
-                    db.collection("reminders").document(doc_id).delete()
-                st.success("All reminders deleted!")
-                st.rerun()
-    else:
-        st.info("No active reminders found")
+            # History and adherence below change too
+            _report_bulk_result(result, "Logged", "medications taken")
 
-    st.subheader("Medication History")
-    try:
-        history_docs = (
-            db.collection("med_history")
-            .where(filter=FieldFilter("user", "==", st.session_state.user["first_name"]))
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .stream()
-        )
+    with col3:
+        if st.button("⚠️ Delete ALL Reminders", type="secondary"):
+            result = delete_reminders(db, doc_ids)
+            _report_bulk_result(result, "Deleted", "reminders")
 
-        history_data = []
-        for doc in history_docs:
-            data = doc.to_dict()
-            data["timestamp"] = format_firestore_datetime(data.get("timestamp"))
-            history_data.append(data)
 
-        if history_data:
+@st.fragment
+def _history_table(db):
+    try:
+        history = get_history_buffer(db)
+        if len(history):
             st.dataframe(
-                pd.DataFrame(history_data),
+                history.frame(),
                 column_config={"timestamp": "Time Taken", "medicine": "Medication"},
                 hide_index=True,
                 width="stretch",
             )
+            if not history.exhausted:
+                st.button("Load older history", on_click=load_more_history, args=(db,))
         else:
             st.info("No medication history recorded yet")
     except Exception as e:
         st.error(f"Error loading history: {str(e)}")
+
+
+def _adherence_report(db):
+    st.subheader(f"Adherence (last {ADHERENCE_WINDOW_DAYS} days)")
+    try:
+        report = load_adherence(db)
+        if report is None:
+            st.info("Adherence statistics appear once you have logged doses")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric(
+                "Doses on time",
+                f"{report['overall']}%" if report["overall"] is not None else "N/A",
+            )
+            col2.metric("Current streak", f"{report['current_streak']} days")
+            col3.metric("Longest streak", f"{report['longest_streak']} days")
+            st.dataframe(report["by_medicine"], hide_index=True, width="stretch")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.caption("Missed doses by weekday (%)")
+                st.bar_chart(report["missed_by_weekday"])
+            with col2:
+                st.caption("Missed doses by reminder hour (%)")
+                st.bar_chart(report["missed_by_hour"])
+    except Exception as e:
+        st.error(f"Error computing adherence: {str(e)}")
+
+
+def render_glucose_page(db):
+    from glucose import TARGET_RANGE, daily_rollup, glucose_stats, hourly_series
+
+    st.title("Blood Glucose")
+
+    with st.expander("📥 Import CGM export"):
+        upload = st.file_uploader(
+            "Dexcom Clarity or LibreView CSV", type="csv", help="Readings already imported are replaced"
+        )
+        if upload is not None and st.button("Import readings"):
+            try:
+                report = import_glucose_csv(db, upload)
+                result = report["result"]
+                if result is None:
+                    st.warning("No glucose readings found in that file")
+                elif result.failed:
+                    st.error(
+                        f"Imported {result.succeeded} of {report['days']} days; "
+                        f"{result.failed} failed: {result.errors[0]}"
+                    )
+                else:
+                    st.success(f"Imported {report['readings']} readings over {report['days']} days!")
+            except ValueError as e:
+                st.error(f"Could not read that file: {str(e)}")
+
+    with st.form("glucose_form"):
+        col1, col2, col3 = st.columns(3)
+        reading_date = col1.date_input("Date")
+        reading_time = col2.time_input("Time")
+        value = col3.number_input("Glucose (mg/dL)", min_value=20, max_value=600, value=100)
+        if st.form_submit_button("Log Reading"):
+            try:
+                add_glucose_reading(db, datetime.combine(reading_date, reading_time), value)
+                st.success("Reading logged!")
+            except Exception as e:
+                st.error(f"Error saving reading: {str(e)}")
+
+    days = st.radio(
+        "Window",
+        GLUCOSE_WINDOW_DAYS,
+        index=len(GLUCOSE_WINDOW_DAYS) - 1,
+        format_func=lambda d: f"{d} days",
+        horizontal=True,
+    )
+    try:
+        times, values = load_glucose(db, days)
+    except Exception as e:
+        st.error(f"Error loading readings: {str(e)}")
+        return
+    stats = glucose_stats(values)
+    if stats is None:
+        st.info("No glucose readings in this window yet")
+        return
+
+    low, high = TARGET_RANGE
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Average", f"{stats['mean']} mg/dL")
+    col2.metric("GMI", f"{stats['gmi']}%", help="Glucose management indicator (estimated A1C)")
+    col3.metric(f"Time in range ({low}-{high})", f"{stats['tir']}%")
+    col4.metric("Variability (CV)", f"{stats['cv']}%", help="Below 36% is considered stable")
+    st.caption(
+        f"Below range {stats['tbr']}% (very low {stats['tbr_severe']}%) · "
+        f"Above range {stats['tar']}% (very high {stats['tar_severe']}%) · "
+        f"{stats['readings']} readings"
+    )
+
+    st.line_chart(hourly_series(times, values))
+    rollup = daily_rollup(times, values)
+    st.dataframe(rollup.sort_index(ascending=False), width="stretch")
+
+
+def render_metrics_page(db, registry):
+    import pandas as pd
+
+    from metrics import CONTENT_TYPE, cache_stats, prometheus_text
+
+    st.title("Metrics")
+
+    st.subheader("Latency")
+    spans = [
+        {
+            "Span": name,
+            "Count": histogram.count,
+            "Errors": registry.errors.get(name, 0),
+            "Mean ms": round(histogram.sum / histogram.count, 1) if histogram.count else 0.0,
+            "p50 ms": round(histogram.quantile(0.5), 1),
+            "p95 ms": round(histogram.quantile(0.95), 1),
+            "p99 ms": round(histogram.quantile(0.99), 1),
+            "Max ms": round(histogram.max, 1),
+        }
+        for name, histogram in sorted(registry.histograms.items())
+    ]
+    if spans:
+        st.dataframe(pd.DataFrame(spans), hide_index=True, width="stretch")
+        selected = st.selectbox("Histogram", [row["Span"] for row in spans])
+        histogram = registry.histograms[selected]
+        labels = [f"≤{bound:g} ms" for bound in histogram.buckets] + ["more"]
+        st.bar_chart(pd.Series(list(histogram.counts), index=pd.Index(labels, name="Bucket")))
+    else:
+        st.info("No spans recorded yet")
+
+    st.subheader("Firestore")
+    operations = db.stats.snapshot()
+    if operations:
+        rows = [
+            {
+                "Collection": name.partition(".")[0],
+                "Operation": name.partition(".")[2],
+                "Calls": counts.calls,
+                "Reads": counts.reads,
+                "Writes": counts.writes,
+                "Round trips": counts.round_trips,
+            }
+            for name, counts in sorted(operations.items())
+        ]
+        frame = pd.DataFrame(rows)
+        st.dataframe(
+            frame.groupby("Collection")[["Reads", "Writes", "Round trips"]].sum(),
+            width="stretch",
+        )
+        with st.expander("By operation"):
+            st.dataframe(frame, hide_index=True, width="stretch")
+    else:
+        st.info("No Firestore operations recorded yet")
+
+    st.subheader("Caches")
+    caches = cache_stats()
+    if caches:
+        rows = []
+        for name, counts in caches.items():
+            lookups = sum(counts.values())
+            hits = counts["hits"] + counts["disk_hits"]
+            rows.append(
+                {
+                    "Cache": name,
+                    "Lookups": lookups,
+                    "Memory hits": counts["hits"],
+                    "Disk hits": counts["disk_hits"],
+                    "Misses": counts["misses"],
+                    "Hit rate %": round(100 * hits / lookups, 1) if lookups else 0.0,
+                }
+            )
+        st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+    else:
+        st.info("No caches in use yet")
+
+    text = prometheus_text(registry, db.stats)
+    st.download_button("Download Prometheus metrics", text, "metrics.txt", mime=CONTENT_TYPE)
@@ -0,0 +1,217 @@
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+SESSION_TTL_SECONDS = 30 * 60
+SWEEP_INTERVAL_SECONDS = 5 * 60
+
+
+def reminder_text(medicine: str) -> str:
+    return f"🔔 Reminder: Time to take {medicine}"
+
+
+def one_shot_date(hhmm: str, tz: str = None) -> str:
+    """The date a "Once" reminder set now for ``hhmm`` fires on, in ``tz``."""
+    from zoneinfo import ZoneInfo
+
+    now = datetime.now(ZoneInfo(tz)) if tz else datetime.now()
+    day = now.date() if hhmm > now.strftime("%H:%M") else now.date() + timedelta(days=1)
+    return day.isoformat()
+
+
+class ReminderIndex:
+    """Reminders with a min-heap of their next fire times, kept current by a reminder watch.
+
+    ``upsert`` and ``remove`` only record the change. Pending reminders are
+    compiled together, and their next fire times computed in one vectorized
+    pass, the next time the index is read.
+    """
+
+    def __init__(self, start: float = None):
+        self._docs = {}
+        self._pending = set()
+        self._fire_at = {}
+        self._heap = []
+        self._timezones = {}
+        self._cursor = time.time() if start is None else start
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    def upsert(self, reminder_id: str, data: dict):
+        with self._lock:
+            self._docs[reminder_id] = data
+            self._pending.add(reminder_id)
+        if self.on_change:
+            self.on_change()
+
+    def remove(self, reminder_id: str):
+        with self._lock:
+            self._docs.pop(reminder_id, None)
+            self._pending.discard(reminder_id)
+            self._fire_at.pop(reminder_id, None)
+
+    def set_timezone(self, user: str, tz: str):
+        """Zone for the user's reminders that were saved without one."""
+        with self._lock:
+            if self._timezones.get(user) == tz:
+                return
+            self._timezones[user] = tz
+            self._pending.update(
+                rid
+                for rid, data in self._docs.items()
+                if data.get("User") == user and not data.get("Timezone")
+            )
+        if self.on_change:
+            self.on_change()
+
+    def next_fire_time(self):
+        """Epoch seconds of the earliest scheduled reminder, or None."""
+        with self._lock:
+            self._compile_pending()
+            while self._heap and self._fire_at.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list:
+        """``(reminder_id, user, medicine, fire_at)`` for everything due by ``now``.
+
+        Each returned reminder is re-armed for its next occurrence after ``now``.
+        """
+        with self._lock:
+            self._compile_pending()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, reminder_id = heapq.heappop(self._heap)
+                if self._fire_at.get(reminder_id) != fire_at:
+                    continue
+                del self._fire_at[reminder_id]
+                data = self._docs[reminder_id]
+                due.append((reminder_id, data.get("User"), data.get("Medicine"), fire_at))
+            self._cursor = max(self._cursor, now)
+            if due:
+                self._schedule([entry[0] for entry in due], self._cursor)
+        return due
+
+    def _compile_pending(self):
+        if self._pending:
+            pending = list(self._pending)
+            self._pending.clear()
+            self._schedule(pending, self._cursor)
+
+    def _schedule(self, reminder_ids: list, after: float):
+        import numpy as np
+
+        from schedule import CompiledSchedule
+
+        compiled = CompiledSchedule.compile(
+            [(rid, self._docs[rid]) for rid in reminder_ids], self._timezones
+        )
+        fires = compiled.next_fire(datetime.fromtimestamp(after, timezone.utc))
+        scheduled = {
+            rid: float(seconds)
+            for rid, seconds, exhausted in zip(
+                compiled.ids, fires.astype(np.int64), np.isnat(fires)
+            )
+            if not exhausted
+        }
+        for reminder_id in reminder_ids:
+            fire_at = scheduled.get(reminder_id)
+            if fire_at is None:
+                self._fire_at.pop(reminder_id, None)
+            elif self._fire_at.get(reminder_id) != fire_at:
+                self._fire_at[reminder_id] = fire_at
+                heapq.heappush(self._heap, (fire_at, reminder_id))
+
+
+class _Subscription:
+    def __init__(self):
+        self.events = deque()
+        self.last_seen = time.time()
+
+
+class ReminderDispatcher:
+    """Process-wide reminder engine shared by every Streamlit session.
+
+    One daemon thread sleeps until the earliest fire time in the
+    ``ReminderIndex`` (in each reminder's own time zone) is due. At that point
+    every due reminder is queued on its user's subscriptions to be drained by
+    the session on its next rerun.
+    """
+
+    def __init__(self, repo):
+        self._subscribers = {}
+        self._cond = threading.Condition()
+        self._next_sweep = time.time() + SWEEP_INTERVAL_SECONDS
+
+        self.index = ReminderIndex()
+        self.index.on_change = self._wake
+        self._watch = repo.watch_reminders(self.index.upsert, self.index.remove)
+
+        self._thread = threading.Thread(
+            target=self._run, name="reminder-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def subscribe(self, user: str, session_id: str, tz: str = None):
+        if tz:
+            self.index.set_timezone(user, tz)
+        with self._cond:
+            sessions = self._subscribers.setdefault(user, {})
+            if session_id in sessions:
+                sessions[session_id].last_seen = time.time()
+            else:
+                sessions[session_id] = _Subscription()
+
+    def unsubscribe(self, user: str, session_id: str):
+        with self._cond:
+            sessions = self._subscribers.get(user)
+            if sessions is None:
+                return
+            sessions.pop(session_id, None)
+            if not sessions:
+                del self._subscribers[user]
+
+    def drain(self, user: str, session_id: str) -> list:
+        with self._cond:
+            subscription = self._subscribers.get(user, {}).get(session_id)
+            if subscription is None:
+                return []
+            subscription.last_seen = time.time()
+            messages = list(subscription.events)
+            subscription.events.clear()
+        return messages
+
+    def close(self):
+        self._watch.unsubscribe()
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _expire_sessions(self, now: float):
+        for user, sessions in list(self._subscribers.items()):
+            for session_id, subscription in list(sessions.items()):
+                if now - subscription.last_seen > SESSION_TTL_SECONDS:
+                    del sessions[session_id]
+            if not sessions:
+                del self._subscribers[user]
+        self._next_sweep = now + SWEEP_INTERVAL_SECONDS
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = time.time()
+                if now >= self._next_sweep:
+                    self._expire_sessions(now)
+
+                for _, user, medicine, _ in self.index.pop_due(now):
+                    for subscription in self._subscribers.get(user, {}).values():
+                        subscription.events.append(reminder_text(medicine))
+
+                wake_at = self._next_sweep
+                next_fire = self.index.next_fire_time()
+                if next_fire is not None:
+                    wake_at = min(wake_at, next_fire)
+                self._cond.wait(max(wake_at - time.time(), 0))
@@ -0,0 +1,843 @@
+"""Data access for every collection the app reads or writes.
+
+``FirestoreRepository`` is what the app runs against. ``InMemoryRepository``
+keeps the same data in per-user sorted indexes, so render paths can be
+profiled without a Firebase project (see ``benchmarks/data_access.py``).
+Per-user data lives in subcollections of ``users/{uid}``, so every query
+touches only that user's documents (``migrate.py`` moves data from the older
+top-level collections keyed by first name). Both count documents read,
+documents written and round trips per operation in ``repo.stats`` using
+Firestore's billing rules, so the numbers from an offline run are the numbers
+production would see.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from itertools import count
+
+from bulk import FIRESTORE_BATCH_LIMIT, BulkWriteResult, bulk_write, delete_op, set_op
+
+SUMMARY_COLLECTION = "user_summaries"
+SESSION_COLLECTION = "sessions"
+GLUCOSE_BLOCK_COLLECTION = "glucose_blocks"
+# Subcollections of users/{uid}
+USER_COLLECTIONS = ("appointments", "reminders", "med_history", GLUCOSE_BLOCK_COLLECTION)
+
+
+@dataclass
+class OperationCounts:
+    calls: int = 0
+    reads: int = 0
+    writes: int = 0
+    round_trips: int = 0
+
+    def add(self, other: "OperationCounts"):
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+
+class RepositoryStats:
+    """Per-operation counters, safe to update from any session thread."""
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, reads: int = 0, writes: int = 0, round_trips: int = 1):
+        with self._lock:
+            counts = self._operations.setdefault(operation, OperationCounts())
+            counts.add(OperationCounts(1, reads, writes, round_trips))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: OperationCounts(**vars(c)) for name, c in self._operations.items()}
+
+    def totals(self) -> OperationCounts:
+        total = OperationCounts()
+        for counts in self.snapshot().values():
+            total.add(counts)
+        return total
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+def _batches(n: int) -> int:
+    return -(-n // FIRESTORE_BATCH_LIMIT)
+
+
+class Repository:
+    """Operations shared by both backends.
+
+    Rows are ``(doc_id, data)`` tuples. A query is billed at least one read
+    even when it matches nothing, and a ``count()`` aggregation one read per
+    1000 matched entries; both backends record reads that way.
+    """
+
+    def __init__(self):
+        self.stats = RepositoryStats()
+
+    def _record_query(self, operation: str, matched: int):
+        self.stats.record(operation, reads=max(matched, 1))
+
+    def _record_count(self, operation: str, matched: int):
+        self.stats.record(operation, reads=max(-(-matched // 1000), 1))
+
+    def _record_batch_write(self, operation: str, n: int):
+        if n:
+            self.stats.record(operation, writes=n, round_trips=_batches(n))
+
+
+class _Watch:
+    def __init__(self, listeners: list, listener):
+        self._listeners = listeners
+        self._listener = listener
+
+    def unsubscribe(self):
+        if self._listener in self._listeners:
+            self._listeners.remove(self._listener)
+
+
+class FirestoreRepository(Repository):
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def _user_collection(self, user: str, collection: str):
+        return self.client.collection("users").document(user).collection(collection)
+
+    def _where(self, user: str, collection: str, *conditions):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = self._user_collection(user, collection)
+        for field, op, value in conditions:
+            query = query.where(filter=FieldFilter(field, op, value))
+        return query
+
+    def _stream(self, operation: str, query) -> list:
+        docs = list(query.stream())
+        self._record_query(operation, len(docs))
+        return docs
+
+    def _pages(self, operation: str, query, page_size: int):
+        cursor = None
+        while True:
+            page = query.limit(page_size)
+            if cursor is not None:
+                page = page.start_after(cursor)
+            docs = self._stream(operation, page)
+            if docs:
+                yield [doc.to_dict() for doc in docs]
+            if len(docs) < page_size:
+                return
+            cursor = docs[-1]
+
+    def _bulk(self, operation: str, operations: list):
+        result = bulk_write(self.client, operations)
+        self._record_batch_write(operation, len(operations))
+        return result
+
+    def _delete_all(self, operation: str, user: str, collection: str, doc_ids):
+        ref = self._user_collection(user, collection)
+        return self._bulk(operation, [delete_op(ref.document(doc_id)) for doc_id in doc_ids])
+
+    def _add(self, operation: str, user: str, collection: str, data: dict) -> str:
+        _, ref = self._user_collection(user, collection).add(data)
+        self.stats.record(operation, writes=1)
+        return ref.id
+
+    # users
+
+    def get_user(self, uid: str):
+        snapshot = self.client.collection("users").document(uid).get()
+        self.stats.record("users.get", reads=1)
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def save_user(self, uid: str, data: dict):
+        from firebase_admin import firestore
+
+        self.client.collection("users").document(uid).set(
+            {**data, "created_at": firestore.SERVER_TIMESTAMP}
+        )
+        self.stats.record("users.save", writes=1)
+
+    def watch_users(self, on_upsert, on_remove, on_ready=None):
+        """Call ``on_upsert(uid, profile)``/``on_remove(uid)`` for every profile change.
+
+        As with ``watch_reminders``, only changed profiles are read after the
+        initial snapshot.
+        """
+        first = [True]
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            self.stats.record("users.watch", reads=len(changes), round_trips=0)
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    on_remove(change.document.id)
+                else:
+                    on_upsert(change.document.id, change.document.to_dict())
+            if first[0]:
+                first[0] = False
+                if on_ready is not None:
+                    on_ready()
+
+        return self.client.collection("users").on_snapshot(on_snapshot)
+
+    # appointments
+
+    def list_appointments(self, user: str) -> list:
+        query = self._where(user, "appointments").order_by("DateTime")
+        return [(doc.id, doc.to_dict()) for doc in self._stream("appointments.list", query)]
+
+    def next_appointment(self, user: str, after: datetime):
+        query = (
+            self._where(user, "appointments", ("DateTime", ">=", after))
+            .order_by("DateTime")
+            .limit(1)
+        )
+        docs = self._stream("appointments.next", query)
+        return (docs[0].id, docs[0].to_dict()) if docs else None
+
+    def add_appointment(self, user: str, data: dict) -> str:
+        return self._add("appointments.add", user, "appointments", {**data, "User": user})
+
+    def delete_appointments(self, user: str, doc_ids):
+        return self._delete_all("appointments.delete", user, "appointments", doc_ids)
+
+    def appointment_pages(self, user: str, start=None, end=None, page_size: int = 500):
+        """Appointments in ``[start, end)``, oldest first, one page of dicts at a time."""
+        query = self._where(
+            user, "appointments", *_range_conditions("DateTime", start, end)
+        ).order_by("DateTime")
+        return self._pages("appointments.export", query, page_size)
+
+    # reminders
+
+    def list_reminders(self, user: str, fields=None) -> list:
+        query = self._where(user, "reminders")
+        if fields:
+            query = query.select(list(fields))
+        query = query.order_by("Time", direction="ASCENDING")
+        return [(doc.id, doc.to_dict()) for doc in self._stream("reminders.list", query)]
+
+    def add_reminder(self, user: str, data: dict) -> str:
+        return self._add("reminders.add", user, "reminders", {**data, "User": user})
+
+    def delete_reminders(self, user: str, doc_ids):
+        return self._delete_all("reminders.delete", user, "reminders", doc_ids)
+
+    def watch_reminders(self, on_upsert, on_remove, on_ready=None):
+        """Call ``on_upsert(id, data)``/``on_remove(id)`` for every reminder change.
+
+        ``on_ready()`` is called once the initial snapshot, every existing
+        reminder, has been delivered; the listener delivers it asynchronously.
+        """
+        first = [True]
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            self.stats.record("reminders.watch", reads=len(changes), round_trips=0)
+            for change in changes:
+                owner = change.document.reference.parent.parent
+                if owner is None:
+                    # A top-level "reminders" collection left over from before migrate.py
+                    continue
+                if change.type.name == "REMOVED":
+                    on_remove(change.document.id)
+                else:
+                    on_upsert(change.document.id, {**change.document.to_dict(), "User": owner.id})
+            if first[0]:
+                first[0] = False
+                if on_ready is not None:
+                    on_ready()
+
+        return self.client.collection_group("reminders").on_snapshot(on_snapshot)
+
+    # med_history
+
+    def history_page(self, user: str, limit: int, cursor=None):
+        """One page of doses, newest first, and the cursor for the next page."""
+        query = self._where(user, "med_history").order_by("timestamp", direction="DESCENDING")
+        if cursor is not None:
+            query = query.start_after(cursor)
+        docs = self._stream("med_history.page", query.limit(limit))
+        return [(doc.id, doc.to_dict()) for doc in docs], (docs[-1] if docs else cursor)
+
+    def history_range(self, user: str, start: datetime = None, end: datetime = None) -> list:
+        """``medicine`` and ``timestamp`` of doses in ``[start, end)``."""
+        query = self._where(
+            user, "med_history", *_range_conditions("timestamp", start, end)
+        ).select(["medicine", "timestamp"])
+        return [doc.to_dict() for doc in self._stream("med_history.range", query)]
+
+    def history_pages(self, user: str, start=None, end=None, page_size: int = 500):
+        """Doses in ``[start, end)``, oldest first, one page of dicts at a time."""
+        query = (
+            self._where(user, "med_history", *_range_conditions("timestamp", start, end))
+            .select(["medicine", "timestamp"])
+            .order_by("timestamp")
+        )
+        return self._pages("med_history.export", query, page_size)
+
+    def count_history(self, user: str, since: datetime) -> int:
+        result = (
+            self._where(user, "med_history", ("timestamp", ">=", since))
+            .count()
+            .get()
+        )
+        matched = int(result[0][0].value)
+        self._record_count("med_history.count", matched)
+        return matched
+
+    def log_taken(self, user: str, medicines):
+        from firebase_admin import firestore
+
+        collection = self._user_collection(user, "med_history")
+        return self._bulk(
+            "med_history.log",
+            [
+                set_op(
+                    collection.document(),
+                    {"user": user, "medicine": medicine, "timestamp": firestore.SERVER_TIMESTAMP},
+                )
+                for medicine in medicines
+            ],
+        )
+
+    # user summaries
+
+    def _summary_ref(self, user: str):
+        return self.client.collection(SUMMARY_COLLECTION).document(user)
+
+    def get_summary(self, user: str):
+        snapshot = self._summary_ref(user).get()
+        self.stats.record("summaries.get", reads=1)
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def set_summary(self, user: str, data: dict, merge: bool = False):
+        self._summary_ref(user).set(data, merge=merge)
+        self.stats.record("summaries.set", writes=1)
+
+    def remove_summary_reminders(self, user: str, doc_ids):
+        from firebase_admin import firestore
+
+        self.set_summary(
+            user, {"reminders": {doc_id: firestore.DELETE_FIELD for doc_id in doc_ids}}, merge=True
+        )
+
+    def increment_summary_taken(self, user: str, day: str, n: int, prune=()):
+        from firebase_admin import firestore
+
+        taken = {old: firestore.DELETE_FIELD for old in prune}
+        taken[day] = firestore.Increment(n)
+        self.set_summary(user, {"taken": taken}, merge=True)
+
+    # glucose day blocks
+
+    def _block_ref(self, user: str, day: str):
+        return self._user_collection(user, GLUCOSE_BLOCK_COLLECTION).document(day)
+
+    def get_glucose_blocks(self, user: str, days) -> dict:
+        snapshots = list(self.client.get_all([self._block_ref(user, day) for day in days]))
+        self.stats.record("glucose.get", reads=len(snapshots))
+        return {s.get("day"): s.to_dict() for s in snapshots if s.exists}
+
+    def glucose_blocks_between(self, user: str, start_day: str, end_day: str) -> list:
+        query = self._where(
+            user, GLUCOSE_BLOCK_COLLECTION, ("day", ">=", start_day), ("day", "<=", end_day)
+        ).order_by("day")
+        return [doc.to_dict() for doc in self._stream("glucose.range", query)]
+
+    def latest_glucose_block(self, user: str):
+        query = (
+            self._where(user, GLUCOSE_BLOCK_COLLECTION)
+            .order_by("day", direction="DESCENDING")
+            .limit(1)
+        )
+        docs = self._stream("glucose.latest", query)
+        return docs[0].to_dict() if docs else None
+
+    def put_glucose_blocks(self, user: str, blocks: dict):
+        return self._bulk(
+            "glucose.put",
+            [
+                set_op(self._block_ref(user, day), {"user": user, "day": day, **block})
+                for day, block in blocks.items()
+            ],
+        )
+
+    # login sessions
+
+    def _session_ref(self, sid: str):
+        return self.client.collection(SESSION_COLLECTION).document(sid)
+
+    def get_session(self, sid: str):
+        snapshot = self._session_ref(sid).get()
+        self.stats.record("sessions.get", reads=1)
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def save_session(self, sid: str, data: dict, merge: bool = False):
+        self._session_ref(sid).set(data, merge=merge)
+        self.stats.record("sessions.save", writes=1)
+
+    def delete_session(self, sid: str):
+        self._session_ref(sid).delete()
+        self.stats.record("sessions.delete", writes=1)
+
+    def session_by_handoff(self, digest: str):
+        """``(sid, data)`` of the session awaiting this login handoff, or None."""
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = (
+            self.client.collection(SESSION_COLLECTION)
+            .where(filter=FieldFilter("handoff", "==", digest))
+            .limit(1)
+        )
+        docs = self._stream("sessions.handoff", query)
+        return (docs[0].id, docs[0].to_dict()) if docs else None
+
+    def delete_expired_sessions(self, now: datetime, limit: int = FIRESTORE_BATCH_LIMIT) -> int:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = (
+            self.client.collection(SESSION_COLLECTION)
+            .where(filter=FieldFilter("expires_at", "<", now))
+            .limit(limit)
+        )
+        docs = self._stream("sessions.expired", query)
+        self._bulk("sessions.purge", [delete_op(doc.reference) for doc in docs])
+        return len(docs)
+
+
+def _range_conditions(field: str, start=None, end=None) -> list:
+    conditions = []
+    if start is not None:
+        conditions.append((field, ">=", start))
+    if end is not None:
+        conditions.append((field, "<", end))
+    return conditions
+
+
+def _utc(value: datetime) -> datetime:
+    # Firestore stores naive datetimes as UTC; do the same so comparisons match
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class _SortedIndex:
+    """Per-user ``(sort_key, doc_id)`` lists kept sorted for range scans."""
+
+    def __init__(self):
+        self._keys = {}
+
+    def add(self, user: str, key, doc_id: str):
+        insort(self._keys.setdefault(user, []), (key, doc_id))
+
+    def remove(self, user: str, key, doc_id: str):
+        keys = self._keys.get(user, [])
+        i = bisect_left(keys, (key, doc_id))
+        if i < len(keys) and keys[i] == (key, doc_id):
+            del keys[i]
+
+    def range(self, user: str, start=None, end=None, include_end: bool = False) -> list:
+        """``(key, doc_id)`` pairs with ``start <= key < end`` (or ``<=``), in key order."""
+        keys = self._keys.get(user, [])
+        lo = 0 if start is None else bisect_left(keys, (start,))
+        hi = len(keys) if end is None else bisect_left(keys, (end,))
+        if include_end:
+            while hi < len(keys) and keys[hi][0] == end:
+                hi += 1
+        return keys[lo:hi]
+
+    def before(self, user: str, key) -> list:
+        keys = self._keys.get(user, [])
+        return keys[: bisect_left(keys, key)]
+
+    def page(self, user: str, start=None, end=None, after=None, limit: int = None) -> list:
+        """Up to ``limit`` pairs of ``range(user, start, end)`` that sort after ``after``."""
+        keys = self._keys.get(user, [])
+        lo = 0 if start is None else bisect_left(keys, (start,))
+        if after is not None:
+            lo = max(lo, bisect_right(keys, after))
+        hi = len(keys) if end is None else bisect_left(keys, (end,))
+        return keys[lo : min(hi, lo + limit) if limit else hi]
+
+
+class InMemoryRepository(Repository):
+    """Process-local backend with the same operations and read/write accounting.
+
+    Every operation can be made to sleep ``latency`` seconds per round trip to
+    model a network hop when comparing access strategies.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self._ids = count(1)
+        self._lock = threading.RLock()
+        self._users = {}
+        self._user_listeners = []
+        self._appointments = {}
+        self._appointments_by_time = _SortedIndex()
+        self._reminders = {}
+        self._reminders_by_time = _SortedIndex()
+        self._reminder_listeners = []
+        self._history = {}
+        self._history_by_time = _SortedIndex()
+        self._summaries = {}
+        self._glucose = {}
+        self._glucose_by_day = _SortedIndex()
+        self._sessions = {}
+
+    def _new_id(self) -> str:
+        return f"doc{next(self._ids):08d}"
+
+    def _wait(self, round_trips: int = 1):
+        if self.latency and round_trips:
+            time.sleep(self.latency * round_trips)
+
+    # users
+
+    def get_user(self, uid: str):
+        self._wait()
+        self.stats.record("users.get", reads=1)
+        user = self._users.get(uid)
+        return dict(user) if user else None
+
+    def save_user(self, uid: str, data: dict):
+        self._wait()
+        profile = {**data, "created_at": datetime.now(timezone.utc)}
+        with self._lock:
+            self._users[uid] = profile
+            listeners = list(self._user_listeners)
+        self.stats.record("users.save", writes=1)
+        for on_upsert, _ in listeners:
+            on_upsert(uid, dict(profile))
+
+    def watch_users(self, on_upsert, on_remove, on_ready=None):
+        listener = (on_upsert, on_remove)
+        with self._lock:
+            self._user_listeners.append(listener)
+            existing = list(self._users.items())
+        self.stats.record("users.watch", reads=len(existing), round_trips=0)
+        for uid, data in existing:
+            on_upsert(uid, dict(data))
+        if on_ready is not None:
+            on_ready()
+        return _Watch(self._user_listeners, listener)
+
+    # appointments
+
+    def list_appointments(self, user: str) -> list:
+        self._wait()
+        with self._lock:
+            rows = [
+                (doc_id, dict(self._appointments[doc_id]))
+                for _, doc_id in self._appointments_by_time.range(user)
+            ]
+        self._record_query("appointments.list", len(rows))
+        return rows
+
+    def next_appointment(self, user: str, after: datetime):
+        self._wait()
+        with self._lock:
+            keys = self._appointments_by_time.range(user, start=_utc(after))[:1]
+            row = (keys[0][1], dict(self._appointments[keys[0][1]])) if keys else None
+        self._record_query("appointments.next", 1 if row else 0)
+        return row
+
+    def add_appointment(self, user: str, data: dict) -> str:
+        self._wait()
+        with self._lock:
+            doc_id = self._new_id()
+            self._appointments[doc_id] = {**data, "User": user}
+            self._appointments_by_time.add(user, _utc(data["DateTime"]), doc_id)
+        self.stats.record("appointments.add", writes=1)
+        return doc_id
+
+    def delete_appointments(self, user: str, doc_ids):
+        doc_ids = list(doc_ids)
+        self._wait(_batches(len(doc_ids)))
+        with self._lock:
+            for doc_id in doc_ids:
+                data = self._appointments.get(doc_id)
+                if data is not None and data["User"] == user:
+                    del self._appointments[doc_id]
+                    self._appointments_by_time.remove(user, _utc(data["DateTime"]), doc_id)
+        self._record_batch_write("appointments.delete", len(doc_ids))
+        return BulkWriteResult(succeeded=len(doc_ids))
+
+    def _pages(self, operation: str, index, user: str, start, end, page_size: int, row):
+        after = None
+        while True:
+            self._wait()
+            with self._lock:
+                keys = index.page(user, start, end, after, page_size)
+                rows = [row(key, doc_id) for key, doc_id in keys]
+            self._record_query(operation, len(rows))
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after = keys[-1]
+
+    def appointment_pages(self, user: str, start=None, end=None, page_size: int = 500):
+        return self._pages(
+            "appointments.export",
+            self._appointments_by_time,
+            user,
+            None if start is None else _utc(start),
+            None if end is None else _utc(end),
+            page_size,
+            lambda key, doc_id: dict(self._appointments[doc_id]),
+        )
+
+    # reminders
+
+    def list_reminders(self, user: str, fields=None) -> list:
+        self._wait()
+        with self._lock:
+            rows = []
+            for _, doc_id in self._reminders_by_time.range(user):
+                data = self._reminders[doc_id]
+                if fields:
+                    data = {f: data[f] for f in fields if f in data}
+                rows.append((doc_id, dict(data)))
+        self._record_query("reminders.list", len(rows))
+        return rows
+
+    def add_reminder(self, user: str, data: dict) -> str:
+        self._wait()
+        with self._lock:
+            doc_id = self._new_id()
+            self._reminders[doc_id] = {**data, "User": user}
+            self._reminders_by_time.add(user, data.get("Time") or "", doc_id)
+            listeners = list(self._reminder_listeners)
+        self.stats.record("reminders.add", writes=1)
+        for on_upsert, _ in listeners:
+            on_upsert(doc_id, {**data, "User": user})
+        return doc_id
+
+    def delete_reminders(self, user: str, doc_ids):
+        doc_ids = list(doc_ids)
+        self._wait(_batches(len(doc_ids)))
+        with self._lock:
+            for doc_id in doc_ids:
+                data = self._reminders.get(doc_id)
+                if data is not None and data["User"] == user:
+                    del self._reminders[doc_id]
+                    self._reminders_by_time.remove(user, data.get("Time") or "", doc_id)
+            listeners = list(self._reminder_listeners)
+        self._record_batch_write("reminders.delete", len(doc_ids))
+        for _, on_remove in listeners:
+            for doc_id in doc_ids:
+                on_remove(doc_id)
+        return BulkWriteResult(succeeded=len(doc_ids))
+
+    def watch_reminders(self, on_upsert, on_remove, on_ready=None):
+        listener = (on_upsert, on_remove)
+        with self._lock:
+            self._reminder_listeners.append(listener)
+            existing = list(self._reminders.items())
+        self.stats.record("reminders.watch", reads=len(existing), round_trips=0)
+        for doc_id, data in existing:
+            on_upsert(doc_id, dict(data))
+        if on_ready is not None:
+            on_ready()
+        return _Watch(self._reminder_listeners, listener)
+
+    # med_history
+
+    def history_page(self, user: str, limit: int, cursor=None):
+        self._wait()
+        with self._lock:
+            keys = (
+                self._history_by_time.range(user)
+                if cursor is None
+                else self._history_by_time.before(user, cursor)
+            )
+            page = keys[::-1][:limit]
+            rows = [(doc_id, dict(self._history[doc_id])) for _, doc_id in page]
+        self._record_query("med_history.page", len(rows))
+        return rows, (page[-1] if page else cursor)
+
+    def history_range(self, user: str, start: datetime = None, end: datetime = None) -> list:
+        self._wait()
+        with self._lock:
+            keys = self._history_by_time.range(
+                user,
+                None if start is None else _utc(start),
+                None if end is None else _utc(end),
+            )
+            rows = [
+                {"medicine": self._history[doc_id]["medicine"], "timestamp": timestamp}
+                for timestamp, doc_id in keys
+            ]
+        self._record_query("med_history.range", len(rows))
+        return rows
+
+    def history_pages(self, user: str, start=None, end=None, page_size: int = 500):
+        return self._pages(
+            "med_history.export",
+            self._history_by_time,
+            user,
+            None if start is None else _utc(start),
+            None if end is None else _utc(end),
+            page_size,
+            lambda timestamp, doc_id: {
+                "medicine": self._history[doc_id]["medicine"],
+                "timestamp": timestamp,
+            },
+        )
+
+    def count_history(self, user: str, since: datetime) -> int:
+        self._wait()
+        with self._lock:
+            matched = len(self._history_by_time.range(user, start=_utc(since)))
+        self._record_count("med_history.count", matched)
+        return matched
+
+    def log_taken(self, user: str, medicines, timestamp: datetime = None):
+        medicines = list(medicines)
+        timestamp = _utc(timestamp or datetime.now(timezone.utc))
+        self._wait(_batches(len(medicines)))
+        with self._lock:
+            for medicine in medicines:
+                doc_id = self._new_id()
+                self._history[doc_id] = {"user": user, "medicine": medicine, "timestamp": timestamp}
+                self._history_by_time.add(user, timestamp, doc_id)
+        self._record_batch_write("med_history.log", len(medicines))
+        return BulkWriteResult(succeeded=len(medicines))
+
+    # user summaries
+
+    def get_summary(self, user: str):
+        self._wait()
+        self.stats.record("summaries.get", reads=1)
+        with self._lock:
+            summary = self._summaries.get(user)
+            return _deep_copy(summary) if summary is not None else None
+
+    def set_summary(self, user: str, data: dict, merge: bool = False):
+        self._wait()
+        with self._lock:
+            if merge and user in self._summaries:
+                _deep_merge(self._summaries[user], _deep_copy(data))
+            else:
+                self._summaries[user] = _deep_copy(data)
+        self.stats.record("summaries.set", writes=1)
+
+    def remove_summary_reminders(self, user: str, doc_ids):
+        self._wait()
+        with self._lock:
+            reminders = self._summaries.setdefault(user, {}).setdefault("reminders", {})
+            for doc_id in doc_ids:
+                reminders.pop(doc_id, None)
+        self.stats.record("summaries.set", writes=1)
+
+    def increment_summary_taken(self, user: str, day: str, n: int, prune=()):
+        self._wait()
+        with self._lock:
+            taken = self._summaries.setdefault(user, {}).setdefault("taken", {})
+            for old in prune:
+                taken.pop(old, None)
+            taken[day] = taken.get(day, 0) + n
+        self.stats.record("summaries.set", writes=1)
+
+    # glucose day blocks
+
+    def get_glucose_blocks(self, user: str, days) -> dict:
+        days = list(days)
+        self._wait()
+        with self._lock:
+            blocks = {day: dict(self._glucose[(user, day)]) for day in days if (user, day) in self._glucose}
+        self.stats.record("glucose.get", reads=len(days))
+        return blocks
+
+    def glucose_blocks_between(self, user: str, start_day: str, end_day: str) -> list:
+        self._wait()
+        with self._lock:
+            blocks = [
+                dict(self._glucose[(user, day)])
+                for day, _ in self._glucose_by_day.range(user, start_day, end_day, include_end=True)
+            ]
+        self._record_query("glucose.range", len(blocks))
+        return blocks
+
+    def latest_glucose_block(self, user: str):
+        self._wait()
+        with self._lock:
+            keys = self._glucose_by_day.range(user)
+            block = dict(self._glucose[(user, keys[-1][0])]) if keys else None
+        self._record_query("glucose.latest", 1 if block else 0)
+        return block
+
+    def put_glucose_blocks(self, user: str, blocks: dict):
+        self._wait(_batches(len(blocks)))
+        with self._lock:
+            for day, block in blocks.items():
+                if (user, day) not in self._glucose:
+                    self._glucose_by_day.add(user, day, day)
+                self._glucose[(user, day)] = {"user": user, "day": day, **block}
+        self._record_batch_write("glucose.put", len(blocks))
+        return BulkWriteResult(succeeded=len(blocks))
+
+    # login sessions
+
+    def get_session(self, sid: str):
+        self._wait()
+        self.stats.record("sessions.get", reads=1)
+        with self._lock:
+            session = self._sessions.get(sid)
+            return dict(session) if session is not None else None
+
+    def save_session(self, sid: str, data: dict, merge: bool = False):
+        self._wait()
+        with self._lock:
+            if merge and sid in self._sessions:
+                self._sessions[sid].update(data)
+            else:
+                self._sessions[sid] = dict(data)
+        self.stats.record("sessions.save", writes=1)
+
+    def delete_session(self, sid: str):
+        self._wait()
+        with self._lock:
+            self._sessions.pop(sid, None)
+        self.stats.record("sessions.delete", writes=1)
+
+    def session_by_handoff(self, digest: str):
+        self._wait()
+        with self._lock:
+            found = next(
+                ((sid, dict(data)) for sid, data in self._sessions.items() if data.get("handoff") == digest),
+                None,
+            )
+        self._record_query("sessions.handoff", 1 if found else 0)
+        return found
+
+    def delete_expired_sessions(self, now: datetime, limit: int = FIRESTORE_BATCH_LIMIT) -> int:
+        self._wait()
+        with self._lock:
+            expired = [sid for sid, data in self._sessions.items() if data["expires_at"] < now][:limit]
+            for sid in expired:
+                del self._sessions[sid]
+        self._record_query("sessions.expired", len(expired))
+        self._record_batch_write("sessions.purge", len(expired))
+        return len(expired)
+
+
+def _deep_copy(value):
+    if isinstance(value, dict):
+        return {k: _deep_copy(v) for k, v in value.items()}
+    return value
+
+
+def _deep_merge(target: dict, updates: dict):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = value
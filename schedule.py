@@ -0,0 +1,167 @@
+"""Compiled reminder schedules and vectorized next-fire times.
+
+A reminder document (``Time`` "HH:MM", ``Frequency`` "Daily", "Once" or
+"Monday, Wednesday", plus the ``Date`` and ``Timezone`` it was set in)
+compiles to four columns: minute of day, weekday bitmask, one-shot date and
+IANA time zone. ``next_fire`` evaluates every row at once with one
+``tz_localize`` per distinct zone, so reminders keep their wall-clock time
+across DST changes: a time skipped by a spring-forward fires at the end of
+the gap, and a time repeated by a fall-back fires once, at its first
+occurrence.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from adherence import ALL_DAYS_MASK, weekday_mask
+
+DEFAULT_TIMEZONE = "UTC"
+# Today plus a week covers the next occurrence of any weekday mask
+HORIZON_DAYS = 8
+MAX_DST_SHIFT = np.timedelta64(2, "h")
+NO_DATE = np.datetime64("NaT", "D")
+
+
+@lru_cache(maxsize=4096)
+def minute_of_day(hhmm):
+    try:
+        parsed = datetime.strptime(hhmm, "%H:%M")
+    except (TypeError, ValueError):
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+@lru_cache(maxsize=1024)
+def _mask(frequency) -> int:
+    return weekday_mask(frequency) or ALL_DAYS_MASK
+
+
+@lru_cache(maxsize=None)
+def _valid_timezone(name) -> bool:
+    from zoneinfo import ZoneInfo
+
+    try:
+        ZoneInfo(name)
+        return True
+    except (TypeError, ValueError, KeyError, OSError):
+        return False
+
+
+def _once_date(data: dict):
+    try:
+        return np.datetime64(data["Date"], "D")
+    except (KeyError, TypeError, ValueError):
+        return NO_DATE
+
+
+class CompiledSchedule:
+    """Reminders as parallel arrays; rows with no parsable ``Time`` are dropped."""
+
+    def __init__(self, ids, users, medicines, minutes, weekdays, once, zone, zones):
+        self.ids = ids
+        self.users = users
+        self.medicines = medicines
+        self.minutes = minutes
+        self.weekdays = weekdays
+        self.once = once
+        self.zone = zone  # index into ``zones``
+        self.zones = zones
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def compile(cls, reminders, timezones=None, default_tz=DEFAULT_TIMEZONE):
+        """Compile ``(id, data)`` pairs; ``timezones`` maps users to their zone.
+
+        The reminder's own ``Timezone`` wins, then the user's, then ``default_tz``.
+        """
+        timezones = timezones or {}
+        zones = {}
+        rows = []
+        for reminder_id, data in reminders:
+            minute = minute_of_day(data.get("Time"))
+            if minute is None:
+                continue
+            user = data.get("User")
+            frequency = data.get("Frequency")
+            once = _once_date(data) if frequency == "Once" else NO_DATE
+            # "Once" reminders saved before they carried a Date keep firing daily
+            mask = ALL_DAYS_MASK if frequency == "Once" else _mask(frequency)
+            tz = data.get("Timezone") or timezones.get(user)
+            if not _valid_timezone(tz):
+                tz = default_tz
+            rows.append(
+                (
+                    reminder_id,
+                    user,
+                    data.get("Medicine"),
+                    minute,
+                    mask,
+                    once,
+                    zones.setdefault(tz, len(zones)),
+                )
+            )
+        ids, users, medicines, minutes, masks, once, zone = zip(*rows) if rows else ((),) * 7
+        return cls(
+            np.array(ids, dtype=object),
+            np.array(users, dtype=object),
+            np.array(medicines, dtype=object),
+            np.array(minutes, dtype=np.int64),
+            np.array(masks, dtype=np.int64),
+            np.array(once, dtype="datetime64[D]"),
+            np.array(zone, dtype=np.int64),
+            list(zones),
+        )
+
+    def next_fire(self, after: datetime) -> np.ndarray:
+        """First fire time strictly after ``after``, as naive UTC ``datetime64[s]``.
+
+        Rows that will not fire again (one-shot reminders in the past) get NaT.
+        Naive ``after`` values are taken to be UTC.
+        """
+        after = pd.Timestamp(after)
+        if after.tzinfo is None:
+            after = after.tz_localize(timezone.utc)
+        after_utc = after.tz_convert("UTC").tz_localize(None).to_datetime64()
+        result = np.full(len(self), np.datetime64("NaT"), dtype="datetime64[s]")
+
+        for code, tz in enumerate(self.zones):
+            rows = np.flatnonzero(self.zone == code)
+            after_local = after.tz_convert(tz).tz_localize(None).to_datetime64()
+            today = after_local.astype("datetime64[D]")
+            once = self.once[rows]
+            is_once = ~np.isnat(once)
+            dates = np.broadcast_to(today + np.arange(HORIZON_DAYS), (len(rows), HORIZON_DAYS))
+            dates = np.where(is_once[:, None], once[:, None], dates)
+
+            # 1970-01-01 was a Thursday, and bit 0 of the mask is Monday
+            weekday = (dates.astype(np.int64) + 3) % 7
+            valid = ((self.weekdays[rows][:, None] >> weekday) & 1).astype(bool)
+            valid[is_once, 1:] = False
+
+            # Compare wall clocks first so only two candidates per row need a zone
+            # conversion: anything more than a DST shift earlier is in the past,
+            # and the second candidate is at least a day after the first
+            local = dates.astype("datetime64[m]") + self.minutes[rows][:, None].astype("m8[m]")
+            valid &= local >= after_local - MAX_DST_SHIFT
+            valid &= np.cumsum(valid, axis=1) <= 2
+            row, col = np.nonzero(valid)
+            utc = (
+                pd.DatetimeIndex(local[row, col])
+                .tz_localize(
+                    tz, ambiguous=np.ones(len(row), dtype=bool), nonexistent="shift_forward"
+                )
+                .tz_convert("UTC")
+                .tz_localize(None)
+                .to_numpy()
+                .astype("datetime64[s]")
+            )
+            ahead = utc > after_utc
+            # np.nonzero is row-major, so the first hit per row is the earliest
+            hit_rows, first = np.unique(row[ahead], return_index=True)
+            result[rows[hit_rows]] = utc[ahead][first]
+        return result
@@ -0,0 +1,10 @@
+"""ASGI entry point: the Streamlit app plus the session cookie endpoint.
+
+    streamlit run server.py        # or: uvicorn server:app
+"""
+
+import streamlit as st
+
+from sessions import session_routes
+
+app = st.App("app.py", routes=session_routes())
@@ -1,60 +1,297 @@
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-import requests
 import streamlit as st
 
+from cache import SQLiteStore, TieredCache, TTLCache
+from metrics import register_cache, span, timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import requests
+
+USDA_SEARCH_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+# (connect, read) timeouts in seconds
+HTTP_TIMEOUT = (3.05, 10)
+MEAL_LOOKUP_WORKERS = 8
+MEAL_TOTAL = "Meal total"
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_nutrition_cache() -> TieredCache:
+    config = st.secrets.get("nutrition_cache", {})
+    ttl = config.get("ttl_seconds", 30 * 24 * 60 * 60)
+    memory = TTLCache(max_entries=config.get("max_entries", 4096), ttl=ttl)
+    store = SQLiteStore(
+        config.get("sqlite_path", "nutrition_cache.sqlite3"), table="nutrition", ttl=ttl
+    )
+    cache = TieredCache(memory, store)
+    register_cache("nutrition", cache.stats)
+    return cache
+
+
+def normalize_food_query(food: str) -> str:
+    return " ".join(food.lower().split())
+
+
+@timed("usda.search")
+def _fetch_nutrition(session: requests.Session, api_key: str, query: str) -> dict:
+    response = session.get(
+        USDA_SEARCH_URL,
+        params={
+            "api_key": api_key,
+            "query": query,
+            "pageSize": 1,
+        },
+        timeout=HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    if data["foods"]:
+        nutrients = data["foods"][0]["foodNutrients"]
+        return {
+            "carbs": next(
+                n["value"]
+                for n in nutrients
+                if n["nutrientName"] == "Carbohydrate, by difference"
+            ),
+            "protein": next(
+                n["value"] for n in nutrients if n["nutrientName"] == "Protein"
+            ),
+        }
+    return {}
+
+
+@st.cache_resource
+def get_fdc_index():
+    from fdc_index import DEFAULT_INDEX_DIR, FdcIndex
+
+    return FdcIndex(st.secrets.get("nutrition", {}).get("index_dir", DEFAULT_INDEX_DIR))
+
+
+def nutrition_backend() -> str:
+    return st.secrets.get("nutrition", {}).get("backend", "remote")
 
+
+def _nutrition_resolver():
+    """Bind the configured backend into a plain function of a normalized query.
+
+    Secrets and cached resources are resolved here, on the script thread, so
+    the returned function can safely run on worker threads. It returns ``{}``
+    when nothing matches and raises on lookup errors.
+    """
+    if nutrition_backend() == "local":
+        index = get_fdc_index()
+        return lambda query: index.lookup(query) or {}
+
+    cache = get_nutrition_cache()
+    session = get_http_session()
+    api_key = st.secrets.usda.api_key
+
+    def resolve(query: str) -> dict:
+        # Foods with no match are cached as {} so they are not looked up again either
+        nutrition = cache.get(query)
+        if nutrition is None:
+            nutrition = _fetch_nutrition(session, api_key, query)
+            cache.set(query, nutrition)
+        return nutrition
+
+    return resolve
+
+
+@timed("nutrition.lookup")
 def get_nutrition_info(food: str):
     try:
-        response = requests.get(
-            "https://api.nal.usda.gov/fdc/v1/foods/search",
-            params={
-                "api_key": st.secrets.usda.api_key,
-                "query": food,
-                "pageSize": 1,
-            },
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        if data["foods"]:
-            nutrients = data["foods"][0]["foodNutrients"]
-            return {
-                "carbs": next(
-                    n["value"]
-                    for n in nutrients
-                    if n["nutrientName"] == "Carbohydrate, by difference"
-                ),
-                "protein": next(
-                    n["value"] for n in nutrients if n["nutrientName"] == "Protein"
-                ),
-            }
-        return None
+        return _nutrition_resolver()(normalize_food_query(food)) or None
     except Exception as e:
         st.error(f"API Error: {str(e)}")
         return None
 
 
-def get_gemini_response(prompt: str) -> str:
-    try:
-        import google.generativeai as genai
+def parse_meal(text: str) -> list:
+    """Split a free-text meal into unique normalized food names, in order.
+
+    Items are separated by commas, semicolons, "+" or new lines only, since
+    "and" and "&" belong to many dish names ("mac and cheese", "fish & chips").
+    """
+    items = re.split(r"[,;\n+]", text.lower())
+    return list(dict.fromkeys(item for item in map(normalize_food_query, items) if item))
+
+
+@timed("nutrition.meal")
+def get_meal_nutrition(text: str) -> pd.DataFrame:
+    """Look up every item of a meal concurrently and add a meal total row.
+
+    The total is labelled partial when some items had no data, and left out
+    when none had any.
+    """
+    import pandas as pd
+
+    items = parse_meal(text)
+    if not items:
+        return pd.DataFrame(columns=["Food", "Carbs (g)", "Protein (g)"])
 
-        genai.configure(api_key=st.secrets["google_gemini"]["api_key"])
-        model = genai.GenerativeModel("gemini-1.5-pro-latest")
-        chat = model.start_chat(history=[])
-        response = chat.send_message(
-            f"""
+    resolve = _nutrition_resolver()
+    with ThreadPoolExecutor(max_workers=min(MEAL_LOOKUP_WORKERS, len(items))) as pool:
+        futures = [(item, pool.submit(resolve, item)) for item in items]
+
+    rows = []
+    for item, future in futures:
+        try:
+            nutrition = future.result()
+        except Exception as e:
+            st.error(f"API Error for '{item}': {str(e)}")
+            nutrition = {}
+        rows.append(
+            {
+                "Food": item,
+                "Carbs (g)": nutrition.get("carbs"),
+                "Protein (g)": nutrition.get("protein"),
+            }
+        )
+
+    df = pd.DataFrame(rows)
+    found = df["Carbs (g)"].notna()
+    if found.any():
+        totals = df.loc[found, ["Carbs (g)", "Protein (g)"]].sum().round(2)
+        label = MEAL_TOTAL if found.all() else f"{MEAL_TOTAL} (partial)"
+        df.loc[len(df)] = {"Food": label, **totals.to_dict()}
+    return df
+
+
+GEMINI_MODEL = "gemini-1.5-pro-latest"
+GEMINI_FALLBACK = "I'm having trouble connecting. Please try again later."
+
+
+@st.cache_resource
+def get_gemini_model():
+    import google.generativeai as genai
+
+    genai.configure(api_key=st.secrets["google_gemini"]["api_key"])
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+def _build_gemini_prompt(prompt: str) -> str:
+    return f"""
             [System Prompt] You are a diabetes management assistant. Important:
             - Always state \"I am not a doctor\" before medical advice
             - Cite sources from ADA (American Diabetes Association)
             - Never suggest altering medication without doctor consultation
             [User Question] {prompt}
             """
-        )
+
+
+# Only articles are dropped. Question words, prepositions and negations change
+# the question: "how to take metformin", "what to take with metformin" and
+# "can I not take metformin" must each get their own answer
+PROMPT_STOP_WORDS = frozenset(("a", "an", "the"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Cache key of a prompt: case, whitespace, punctuation and articles ignored."""
+    words = re.sub(r"[^\w\s]", " ", prompt.lower()).split()
+    normalized = " ".join(word for word in words if word not in PROMPT_STOP_WORDS)
+    return normalized or " ".join(words)
+
+
+@st.cache_resource
+def get_response_cache() -> TieredCache:
+    config = st.secrets.get("chat_cache", {})
+    ttl = config.get("ttl_seconds", 7 * 24 * 60 * 60)
+    store = None
+    if config.get("sqlite_path"):
+        store = SQLiteStore(config["sqlite_path"], table="chat_responses", ttl=ttl)
+    memory = TTLCache(
+        max_entries=config.get("max_entries", 2048),
+        max_bytes=config.get("max_bytes", 16 * 1024 * 1024),
+        ttl=ttl,
+    )
+    cache = TieredCache(memory, store)
+    register_cache("chat_responses", cache.stats)
+    return cache
+
+
+@timed("gemini.response")
+def get_gemini_response(prompt: str) -> str:
+    cache = get_response_cache()
+    key = normalize_prompt(prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = get_gemini_model().generate_content(_build_gemini_prompt(prompt))
+        if response.text:
+            cache.set(key, response.text)
         return response.text
     except Exception as e:
         st.error(f"Error: {str(e)}")
-        return "I'm having trouble connecting. Please try again later."
+        return GEMINI_FALLBACK
+
+
+@st.cache_resource
+def get_triage_engine():
+    from triage import TriageEngine
+
+    return TriageEngine()
+
+
+@timed("chat.triage")
+def triage_prompt(prompt: str):
+    """The local answer for ``prompt``, or None when the model should answer."""
+    return get_triage_engine().classify(prompt)
+
+
+def stream_gemini_response(prompt: str):
+    """Yield the answer text chunk by chunk as the model generates it.
+
+    Answers already in the response cache are yielded in a single chunk.
+    """
+    cache = get_response_cache()
+    key = normalize_prompt(prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    try:
+        with span("gemini.stream"):
+            response = get_gemini_model().generate_content(
+                _build_gemini_prompt(prompt), stream=True
+            )
+            chunks = []
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+        # An empty stream would otherwise be replayed for the whole TTL
+        if chunks:
+            cache.set(key, "".join(chunks))
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        yield GEMINI_FALLBACK
 
 
 def format_firestore_datetime(value):
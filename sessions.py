@@ -0,0 +1,284 @@
+"""Signed session tokens that keep users logged in across reloads.
+
+The token travels only in an HttpOnly cookie, so it never appears in the URL,
+browser history or Referer headers, and page scripts cannot read it. A
+Streamlit script cannot set response headers, so after a login the page posts
+a one-time handoff code to ``SESSION_ROUTE`` (served by ``server.py``), which
+trades it for the cookie.
+
+Each token has a session record in the repository holding its expiry and the
+provider refresh token. Logging out deletes the record, so a revoked token
+stays revoked across restarts and replicas; expired records are pruned.
+Restoring a session checks the signature and expiry locally; the record is
+read only once per ``REVOCATION_CHECK_SECONDS`` per token, which is how long a
+logout on another replica can take to be noticed.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from cache import TTLCache
+
+SESSION_COOKIE = "diabetes_session"
+SESSION_ROUTE = "/api/session"
+SESSION_TTL_SECONDS = 7 * 24 * 60 * 60
+RENEW_WINDOW_SECONDS = 24 * 60 * 60
+HANDOFF_TTL_SECONDS = 2 * 60
+# How long a token is trusted without re-reading its record; also how long
+# another replica may take to notice a logout
+REVOCATION_CHECK_SECONDS = 30 * 60
+PURGE_INTERVAL_SECONDS = 60 * 60
+FIREBASE_REFRESH_URL = "https://securetoken.googleapis.com/v1/token"
+GOOGLE_REFRESH_URL = "https://oauth2.googleapis.com/token"
+# Session state key of a cookie change waiting to be sent to the browser
+_COOKIE_ACTION = "session_cookie_action"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _digest(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class SessionStore:
+    """Issues and verifies HMAC-signed session tokens backed by session records.
+
+    A reload costs a signature check; the record is re-read only when the
+    token's last check is older than ``REVOCATION_CHECK_SECONDS``.
+    """
+
+    def __init__(self, secret_key: bytes, repo):
+        self._key = secret_key
+        self._repo = repo
+        # Tokens whose record was seen within REVOCATION_CHECK_SECONDS
+        self._checked = TTLCache(max_entries=10_000, ttl=REVOCATION_CHECK_SECONDS)
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+
+    def create(self, user: dict, uid: str, provider: str = None, refresh_token: str = None) -> str:
+        """Record a new session; returns the one-time code that redeems its token."""
+        now = time.time()
+        code = secrets.token_urlsafe(32)
+        self._repo.save_session(
+            secrets.token_urlsafe(16),
+            {
+                "uid": uid,
+                "user": user,
+                "provider": provider,
+                "refresh_token": refresh_token,
+                "expires_at": _utc(now + SESSION_TTL_SECONDS),
+                "handoff": _digest(code),
+                "handoff_expires_at": _utc(now + HANDOFF_TTL_SECONDS),
+            },
+        )
+        self.purge_expired()
+        return code
+
+    def redeem(self, code: str):
+        """The token of the session awaiting ``code``, or None; each code works once."""
+        found = self._repo.session_by_handoff(_digest(code))
+        if found is None:
+            return None
+        sid, record = found
+        self._repo.save_session(sid, {"handoff": None, "handoff_expires_at": None}, merge=True)
+        if record["handoff_expires_at"] < _utc(time.time()):
+            return None
+        payload = {
+            "sid": sid,
+            "sub": record["uid"],
+            "user": record["user"],
+            "exp": int(record["expires_at"].timestamp()),
+        }
+        body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        token = f"{body}.{self._sign(body)}"
+        self._checked.set(token, True)
+        return token
+
+    def verify(self, token: str):
+        try:
+            body, signature = token.split(".", 1)
+            if not hmac.compare_digest(signature, self._sign(body)):
+                return None
+            payload = json.loads(_b64decode(body))
+        except (ValueError, TypeError):
+            return None
+        if payload["exp"] < time.time():
+            return None
+        if self._checked.get(token) is None:
+            if self._repo.get_session(payload["sid"]) is None:
+                return None
+            self._checked.set(token, True)
+        return payload
+
+    def refresh_token_for(self, sid: str):
+        """``(provider, refresh_token)`` of a live session, or None."""
+        record = self._repo.get_session(sid)
+        if not record or not record.get("refresh_token"):
+            return None
+        return record["provider"], record["refresh_token"]
+
+    def revoke(self, token: str):
+        payload = self.verify(token)
+        self._checked.invalidate(token)
+        if payload:
+            self._repo.delete_session(payload["sid"])
+
+    def purge_expired(self):
+        """Delete expired session records, at most once per ``PURGE_INTERVAL_SECONDS``."""
+        now = time.time()
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + PURGE_INTERVAL_SECONDS
+        self._repo.delete_expired_sessions(_utc(now))
+
+    def _sign(self, body: str) -> str:
+        return _b64encode(hmac.new(self._key, body.encode("ascii"), hashlib.sha256).digest())
+
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    from data_layer import initialize_repository
+
+    secret = st.secrets.get("session", {}).get("secret_key")
+    if not secret:
+        # Fall back to a key derived from the service account, which never leaves the server
+        secret = hashlib.sha256(st.secrets.firebase.private_key.encode("utf-8")).hexdigest()
+    return SessionStore(secret.encode("utf-8"), initialize_repository())
+
+
+def session_routes() -> list:
+    """ASGI routes that set (POST a handoff code) and clear (DELETE) the cookie."""
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    async def session(request):
+        response = Response(status_code=204)
+        if request.method == "DELETE":
+            response.delete_cookie(SESSION_COOKIE, path="/")
+            return response
+        code = (await request.body()).decode("utf-8", "replace")
+        token = await run_in_threadpool(get_session_store().redeem, code) if code else None
+        if token is None:
+            return Response(status_code=403)
+        response.set_cookie(
+            SESSION_COOKIE,
+            token,
+            max_age=SESSION_TTL_SECONDS,
+            path="/",
+            httponly=True,
+            secure=request.url.scheme == "https",
+            samesite="lax",
+        )
+        return response
+
+    return [Route(SESSION_ROUTE, session, methods=["POST", "DELETE"])]
+
+
+def _queue_cookie_action(method: str, code: str = None):
+    st.session_state[_COOKIE_ACTION] = (method, code)
+
+
+def sync_session_cookie():
+    """Send a pending cookie change to the browser.
+
+    Called on every run, because logins and logouts end with ``st.rerun``.
+    """
+    action = st.session_state.pop(_COOKIE_ACTION, None)
+    if action is None:
+        return
+    method, code = action
+    st.html(
+        f"<script>fetch({json.dumps(SESSION_ROUTE)}, {{method: {json.dumps(method)}, "
+        f"body: {json.dumps(code)}, credentials: 'same-origin'}});</script>",
+        unsafe_allow_javascript=True,
+    )
+
+
+def _renew_refresh_token(provider: str, refresh_token: str) -> str:
+    """Exchange a provider refresh token; returns the (possibly rotated) token."""
+    from services import HTTP_TIMEOUT, get_http_session
+
+    if provider == "firebase":
+        resp = get_http_session().post(
+            FIREBASE_REFRESH_URL,
+            params={"key": st.secrets.firebase.api_key},
+            data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+            timeout=HTTP_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()["refresh_token"]
+
+    from auth import google_client_config
+
+    client = next(iter(google_client_config().values()))
+    resp = get_http_session().post(
+        GOOGLE_REFRESH_URL,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": client["client_id"],
+            "client_secret": client["client_secret"],
+        },
+        timeout=HTTP_TIMEOUT,
+    )
+    resp.raise_for_status()
+    return resp.json().get("refresh_token", refresh_token)
+
+
+def start_session(user: dict, uid: str, provider: str = None, refresh_token: str = None):
+    _queue_cookie_action("POST", get_session_store().create(user, uid, provider, refresh_token))
+
+
+def restore_session():
+    """Return the user of a valid session cookie, renewing the session if due."""
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return None
+    store = get_session_store()
+    payload = store.verify(token)
+    if payload is None:
+        _queue_cookie_action("DELETE")
+        return None
+
+    if payload["exp"] - time.time() < RENEW_WINDOW_SECONDS:
+        stored = store.refresh_token_for(payload["sid"])
+        if stored:
+            provider, refresh_token = stored
+            try:
+                refresh_token = _renew_refresh_token(provider, refresh_token)
+            except Exception:
+                # The account or grant was revoked upstream: require a fresh login
+                store.revoke(token)
+                _queue_cookie_action("DELETE")
+                return None
+            store.revoke(token)
+            start_session(payload["user"], payload["sub"], provider, refresh_token)
+    # Tokens issued before the user dict carried the uid
+    return {"uid": payload["sub"], **payload["user"]}
+
+
+def end_session():
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if token:
+        get_session_store().revoke(token)
+    _queue_cookie_action("DELETE")
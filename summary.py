@@ -0,0 +1,120 @@
+from datetime import date, datetime
+
+# Summaries written by older code, or partially created by an incremental
+# update before any full rebuild, lack this version and are rebuilt on read.
+SUMMARY_VERSION = 3
+
+
+def scheduled_on(frequency: str, day: date, once_date: str = None) -> bool:
+    if frequency == "Daily":
+        return True
+    if frequency == "Once":
+        # One-shot reminders saved before they carried a Date are never due
+        return once_date == day.isoformat()
+    return day.strftime("%A") in [d.strip() for d in (frequency or "").split(",")]
+
+
+def _appointment_entry(doc_id: str, data: dict) -> dict:
+    return {"id": doc_id, "Doctor": data.get("Doctor"), "DateTime": data.get("DateTime")}
+
+
+def _reminder_entry(data: dict) -> dict:
+    return {
+        "Medicine": data.get("Medicine"),
+        "Time": data.get("Time"),
+        "Frequency": data.get("Frequency"),
+        "Date": data.get("Date"),
+    }
+
+
+def _query_next_appointment(repo, user: str):
+    row = repo.next_appointment(user, datetime.now())
+    return _appointment_entry(*row) if row else None
+
+
+def rebuild_summary(repo, user: str) -> dict:
+    """Recompute a user's summary with a limit(1) query and a count() aggregation."""
+    from glucose import latest_reading
+
+    today = date.today()
+    start_of_day = datetime.combine(today, datetime.min.time())
+    reminders = repo.list_reminders(user, fields=["Medicine", "Time", "Frequency", "Date"])
+    summary = {
+        "version": SUMMARY_VERSION,
+        "next_appointment": _query_next_appointment(repo, user),
+        "reminders": {doc_id: _reminder_entry(data) for doc_id, data in reminders},
+        "taken": {today.isoformat(): repo.count_history(user, start_of_day)},
+        "last_reading": latest_reading(repo, user),
+    }
+    repo.set_summary(user, summary)
+    return summary
+
+
+def load_summary(repo, user: str) -> dict:
+    summary = repo.get_summary(user)
+    if not summary or summary.get("version") != SUMMARY_VERSION:
+        return rebuild_summary(repo, user)
+
+    appointment = summary.get("next_appointment")
+    if appointment and appointment["DateTime"].timestamp() < datetime.now().timestamp():
+        summary["next_appointment"] = _query_next_appointment(repo, user)
+        repo.set_summary(user, {"next_appointment": summary["next_appointment"]}, merge=True)
+    return summary
+
+
+def medications_remaining(summary: dict, day: date = None) -> int:
+    day = day or date.today()
+    due = sum(
+        1
+        for reminder in summary.get("reminders", {}).values()
+        if scheduled_on(reminder.get("Frequency"), day, reminder.get("Date"))
+    )
+    return max(due - summary.get("taken", {}).get(day.isoformat(), 0), 0)
+
+
+def on_appointment_added(repo, user: str, doc_id: str, data: dict):
+    summary = repo.get_summary(user)
+    if summary is None:
+        return
+    current = summary.get("next_appointment")
+    when = data["DateTime"]
+    if when >= datetime.now() and (
+        current is None or when.timestamp() < current["DateTime"].timestamp()
+    ):
+        repo.set_summary(user, {"next_appointment": _appointment_entry(doc_id, data)}, merge=True)
+
+
+def on_appointments_deleted(repo, user: str, doc_ids):
+    summary = repo.get_summary(user)
+    if summary is None:
+        return
+    current = summary.get("next_appointment")
+    if current and current["id"] in set(doc_ids):
+        repo.set_summary(
+            user, {"next_appointment": _query_next_appointment(repo, user)}, merge=True
+        )
+
+
+def on_reminder_added(repo, user: str, doc_id: str, data: dict):
+    repo.set_summary(user, {"reminders": {doc_id: _reminder_entry(data)}}, merge=True)
+
+
+def on_reminders_deleted(repo, user: str, doc_ids):
+    repo.remove_summary_reminders(user, doc_ids)
+
+
+def on_medications_taken(repo, user: str, count: int):
+    today = date.today().isoformat()
+    summary = repo.get_summary(user) or {}
+    # Only today's count is ever read; earlier days are dropped in the same write
+    stale = [day for day in summary.get("taken", {}) if day < today]
+    repo.increment_summary_taken(user, today, count, prune=stale)
+
+
+def on_reading(repo, user: str, reading: dict):
+    summary = repo.get_summary(user)
+    if summary is None:
+        return
+    current = summary.get("last_reading")
+    if current is None or reading["timestamp"].timestamp() > current["timestamp"].timestamp():
+        repo.set_summary(user, {"last_reading": reading}, merge=True)
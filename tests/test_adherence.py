@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from adherence import ALL_DAYS_MASK, AdherenceRollup, compute_adherence, daily_counts, weekday_mask
+
+# 2026-10-12 is a Monday
+START, END = "2026-10-12", "2026-10-18"
+
+
+def taken(*doses):
+    """``(day, medicine)`` pairs to the taken-count frame compute_adherence expects."""
+    return daily_counts([m for _, m in doses], pd.to_datetime([d for d, _ in doses]))
+
+
+def test_weekday_mask():
+    assert weekday_mask("Daily") == ALL_DAYS_MASK
+    assert weekday_mask("Monday, Sunday") == 0b1000001
+    assert weekday_mask("Once") == 0
+    assert weekday_mask(None) == 0
+
+
+def test_daily_reminder_over_a_week():
+    doses = [(f"2026-10-{d}", "A") for d in (12, 13, 14, 16, 17, 18)]
+    reminders = [{"Medicine": "A", "Time": "08:00", "Frequency": "Daily"}]
+    result = compute_adherence(taken(*doses), reminders, START, END)
+    assert result["overall"] == round(100 * 6 / 7, 1)
+    assert result["current_streak"] == 3
+    assert result["longest_streak"] == 3
+    assert result["missed_by_weekday"]["Thursday"] == 100.0
+    assert result["missed_by_hour"]["08:00"] == round(100 / 7, 1)
+
+
+def test_later_reminder_of_the_same_medicine_counts_as_missed():
+    reminders = [
+        {"Medicine": "A", "Time": "20:00", "Frequency": "Daily"},
+        {"Medicine": "A", "Time": "08:00", "Frequency": "Daily"},
+    ]
+    result = compute_adherence(taken(("2026-10-12", "A")), reminders, START, START)
+    assert result["overall"] == 50.0
+    assert result["missed_by_hour"]["20:00"] == 100.0
+    assert result["missed_by_hour"]["08:00"] == 0.0
+
+
+def test_days_before_a_reminder_was_created_are_not_missed():
+    reminders = [{"Medicine": "A", "Time": "08:00", "Frequency": "Daily", "Created": "2026-10-16"}]
+    doses = [(f"2026-10-{d}", "A") for d in (16, 17, 18)]
+    result = compute_adherence(taken(*doses), reminders, START, END)
+    assert result["overall"] == 100.0
+    assert result["by_medicine"].loc[0, "Scheduled"] == 3
+
+
+def test_once_reminder_is_scheduled_on_its_date_only():
+    reminders = [
+        {"Medicine": "B", "Time": "09:00", "Frequency": "Once", "Date": "2026-10-14"},
+        {"Medicine": "C", "Time": "09:00", "Frequency": "Once"},
+    ]
+    result = compute_adherence(taken(), reminders, START, END)
+    assert result["by_medicine"].set_index("Medicine")["Scheduled"].to_dict() == {"B": 1, "C": 0}
+    assert result["overall"] == 0.0
+    assert result["missed_by_weekday"]["Wednesday"] == 100.0
+
+
+def test_no_scheduled_doses():
+    assert compute_adherence(taken(), [], START, END)["overall"] is None
+
+
+def test_rollup_materializes_only_completed_days():
+    rollup = AdherenceRollup()
+    today = pd.Timestamp("2026-10-18")
+    rollup.extend(["A", "A", "B"], pd.to_datetime(["2026-10-16", "2026-10-17", "2026-10-18"]), today)
+    assert list(rollup.taken.index) == list(pd.to_datetime(["2026-10-16", "2026-10-17"]))
+    rollup.extend(["A"], pd.to_datetime(["2026-10-18"]), today + pd.Timedelta(days=1))
+    assert rollup.taken.loc["2026-10-18", "A"] == 1
+    assert rollup.taken.to_numpy().dtype == np.int64
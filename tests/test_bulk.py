@@ -0,0 +1,79 @@
+import pytest
+
+import bulk
+from bulk import BulkWriteResult, bulk_write, delete_op, set_op
+
+
+class TransientError(Exception):
+    pass
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append(("set", ref, data))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref, None))
+
+    def commit(self):
+        self.db.attempts += 1
+        if self.db.failures:
+            raise self.db.failures.pop(0)
+        self.db.commits.append(self.ops)
+
+
+class FakeDB:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.attempts = 0
+        self.commits = []
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+@pytest.fixture(autouse=True)
+def no_google_client(monkeypatch):
+    # The retryable exception types come from google.api_core in production
+    monkeypatch.setattr(bulk, "_retryable_errors", lambda: (TransientError,))
+    monkeypatch.setattr(bulk.time, "sleep", lambda seconds: None)
+
+
+def test_operations_are_split_into_batches():
+    db = FakeDB()
+    ops = [set_op(i, {"n": i}) for i in range(7)] + [delete_op("x")]
+    result = bulk_write(db, ops, chunk_size=3)
+    assert [len(c) for c in db.commits] == [3, 3, 2]
+    assert db.commits[-1][-1] == ("delete", "x", None)
+    assert (result.succeeded, result.failed) == (8, 0)
+
+
+def test_transient_errors_are_retried():
+    db = FakeDB(failures=[TransientError("busy"), TransientError("busy")])
+    result = bulk_write(db, [set_op("a", {})])
+    assert db.attempts == 3
+    assert result.succeeded == 1
+
+
+def test_failed_batch_does_not_abort_the_rest():
+    db = FakeDB(failures=[ValueError("bad document")])
+    result = bulk_write(db, [set_op(i, {}) for i in range(4)], chunk_size=2)
+    assert (result.succeeded, result.failed) == (2, 2)
+    assert result.errors == ["bad document"]
+
+
+def test_retries_give_up_after_max_attempts():
+    db = FakeDB(failures=[TransientError("busy")] * bulk.MAX_ATTEMPTS)
+    result = bulk_write(db, [set_op("a", {})])
+    assert db.attempts == bulk.MAX_ATTEMPTS
+    assert result.failed == 1 and result.errors == ["busy"]
+
+
+def test_results_merge():
+    result = BulkWriteResult(succeeded=1)
+    result.merge(BulkWriteResult(succeeded=2, failed=1, errors=["e"]))
+    assert (result.succeeded, result.failed, result.errors) == (3, 1, ["e"])
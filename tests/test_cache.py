@@ -0,0 +1,99 @@
+import time
+
+from cache import SQLiteStore, TieredCache, TTLCache
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    now[0] += 11
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_respects_byte_bound():
+    cache = TTLCache(max_bytes=1000)
+    for i in range(50):
+        cache.set(i, "x" * 100)
+    assert 0 < len(cache) < 50
+    assert cache._bytes <= 1000
+
+
+def test_oversized_value_drops_previous_entry():
+    cache = TTLCache(max_bytes=1000)
+    cache.set("k", [1])
+    cache.set("k", "x" * 5000)
+    assert cache.get("k") is None
+    assert cache._bytes == 0
+
+
+def test_sqlite_store_round_trip_and_expiry(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), ttl=60)
+    store.set("k", {"a": [1, 2]})
+    assert store.get("k") == {"a": [1, 2]}
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 120)
+    assert store.get("k") is None
+
+
+def test_sqlite_store_add_only_when_absent(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"))
+    assert store.add("k", 1)
+    assert not store.add("k", 2)
+    assert store.get("k") == 1
+    store.delete("k")
+    assert store.add("k", 3)
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"))
+    store.set("k", "from disk")
+    cache = TieredCache(TTLCache(), store)
+    assert cache.get("missing") is None
+    assert cache.get("k") == "from disk"
+    assert cache.get("k") == "from disk"
+    assert (cache.stats.hits, cache.stats.disk_hits, cache.stats.misses) == (1, 1, 1)
+    assert cache.stats.hit_rate == 2 / 3
+
+
+def test_cache_stats_count_concurrent_lookups():
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = TieredCache(TTLCache())
+    cache.set("k", 1)
+
+    def lookups(_):
+        for _ in range(1000):
+            cache.get("k")
+            cache.get("missing")
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lookups, range(8)))
+    assert cache.stats.snapshot() == {"hits": 8000, "disk_hits": 0, "misses": 8000}
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_prompt_key_keeps_question_words():
+    from services import normalize_prompt
+
+    assert normalize_prompt("How to take  Metformin?") == normalize_prompt("how to take metformin")
+    assert normalize_prompt("The A1C target") == "a1c target"
+    keys = {
+        normalize_prompt(p)
+        for p in ("How to take metformin", "What to take with metformin", "Can I not take metformin")
+    }
+    assert len(keys) == 3
@@ -0,0 +1,27 @@
+from data_layer import HistoryBuffer
+
+
+class PagedHistory:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def history_page(self, user, limit, cursor=None):
+        start = cursor or 0
+        page = self.rows[start : start + limit]
+        return [(str(i), row) for i, row in enumerate(page, start)], start + len(page)
+
+
+def test_history_frame_grows_by_appending_pages():
+    db = PagedHistory([{"medicine": f"med{i}", "timestamp": None} for i in range(5)])
+    buffer = HistoryBuffer()
+    buffer.fetch_page(db, "u1", 2)
+    first = buffer.frame()
+    assert buffer.frame() is first
+    assert list(first["medicine"]) == ["med0", "med1"]
+
+    buffer.fetch_page(db, "u1", 2)
+    buffer.fetch_page(db, "u1", 2)
+    frame = buffer.frame()
+    assert buffer.exhausted
+    assert list(frame["medicine"]) == [f"med{i}" for i in range(5)]
+    assert list(frame.index) == list(range(5))
@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+from export import export_file
+from repository import InMemoryRepository
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def repo():
+    repo = InMemoryRepository()
+    for day in range(1, 6):
+        repo.log_taken("u1", ["Metformin"], timestamp=utc(2026, 1, day, 9))
+    repo.log_taken("u2", ["Insulin"], timestamp=utc(2026, 1, 3, 9))
+    repo.add_appointment("u1", {"Doctor": "Dr. A", "DateTime": datetime(2026, 2, 1, 10), "Notes": ""})
+    return repo
+
+
+def test_csv_export_pages_through_the_date_range(repo):
+    data = export_file(
+        repo, "u1", "med_history", "CSV", utc(2026, 1, 2), utc(2026, 1, 5), page_size=2
+    )
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+    assert rows[0] == ["medicine", "timestamp"]
+    assert [row[1] for row in rows[1:]] == [
+        f"2026-01-0{day}T09:00:00+00:00" for day in (2, 3, 4)
+    ]
+    assert {row[0] for row in rows[1:]} == {"Metformin"}
+
+
+def test_parquet_export_round_trips(repo):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    data = export_file(repo, "u1", "med_history", "Parquet", page_size=2)
+    table = pq.read_table(pa.BufferReader(data))
+    assert table.num_rows == 5
+    assert table.schema.field("timestamp").type == pa.timestamp("us", tz="UTC")
+    assert table.column("timestamp")[0].as_py() == utc(2026, 1, 1, 9)
+
+    table = pq.read_table(pa.BufferReader(export_file(repo, "u1", "appointments", "Parquet")))
+    assert table.column("Doctor").to_pylist() == ["Dr. A"]
+    # Appointments are wall-clock times and keep no zone
+    assert table.schema.field("DateTime").type == pa.timestamp("us")
+    assert table.column("DateTime")[0].as_py() == datetime(2026, 2, 1, 10)
+
+
+def test_empty_export_still_has_a_header(repo):
+    data = export_file(repo, "nobody", "appointments", "CSV")
+    assert data.decode("utf-8").splitlines() == ["Doctor,DateTime,Notes"]
+
+
+def test_csv_appointments_are_wall_clock_times(repo):
+    # Firestore hands naive datetimes back as UTC-aware ones
+    repo.add_appointment("u1", {"Doctor": "Dr. B", "DateTime": utc(2026, 3, 1, 9), "Notes": "x"})
+    rows = list(csv.reader(io.StringIO(export_file(repo, "u1", "appointments", "CSV").decode())))
+    assert [row[1] for row in rows[1:]] == ["2026-02-01T10:00:00", "2026-03-01T09:00:00"]
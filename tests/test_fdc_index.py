@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from fdc_index import FdcIndex, import_dump
+
+NUTRIENTS = pd.DataFrame(
+    {"id": [1003, 1005, 1008], "name": ["Protein", "Carbohydrate, by difference", "Energy"]}
+)
+
+
+def write_dump(path, foods, amounts):
+    """``foods`` as (fdc_id, description, publication date); ``amounts`` as
+    {fdc_id: (carbs, protein)}."""
+    path.mkdir(exist_ok=True)
+    pd.DataFrame(foods, columns=["fdc_id", "description", "publication_date"]).to_csv(
+        path / "food.csv", index=False
+    )
+    rows = [
+        (fdc_id, nutrient, amount)
+        for fdc_id, (carbs, protein) in amounts.items()
+        for nutrient, amount in ((1005, carbs), (1003, protein), (1008, 100.0))
+    ]
+    pd.DataFrame(rows, columns=["fdc_id", "nutrient_id", "amount"]).to_csv(
+        path / "food_nutrient.csv", index=False
+    )
+    NUTRIENTS.to_csv(path / "nutrient.csv", index=False)
+    return str(path)
+
+
+FOODS = [
+    (1, "Potato, raw", "2020-01-01"),
+    (2, "Potatoes, mashed, home-prepared", "2020-01-01"),
+    (3, "Strawberries, raw", "2020-01-01"),
+    (4, "Rice, white, cooked", "2020-01-01"),
+]
+AMOUNTS = {1: (17.5, 2.0), 2: (16.8, 1.9), 3: (7.7, 0.7), 4: (28.2, 2.7)}
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    index_dir = str(tmp_path / "index")
+    assert import_dump(write_dump(tmp_path / "dump", FOODS, AMOUNTS), index_dir) == 4
+    return index_dir
+
+
+def descriptions(index, query):
+    return [index.description(row) for row in index.search(query)]
+
+
+def test_import_builds_a_searchable_index(index_dir):
+    index = FdcIndex(index_dir)
+    assert len(index) == 4
+    assert index.lookup("white rice") == {"carbs": 28.2, "protein": 2.7}
+    assert index.lookup("pizza") is None
+
+
+@pytest.mark.parametrize("query", ["raw potato", "potato raw", "potatoes raw", "pot ra"])
+def test_tokens_match_in_any_order_and_number(index_dir, query):
+    assert descriptions(FdcIndex(index_dir), query) == ["Potato, raw"]
+
+
+def test_plural_and_singular_find_each_other(index_dir):
+    index = FdcIndex(index_dir)
+    # Shortest description first
+    assert descriptions(index, "potato") == ["Potato, raw", "Potatoes, mashed, home-prepared"]
+    assert descriptions(index, "strawberry") == ["Strawberries, raw"]
+    assert descriptions(index, "raw rice") == []
+
+
+def test_reimport_updates_only_newer_publications(tmp_path, index_dir):
+    foods = FOODS[:3] + [(4, "Rice, white, cooked", "2024-06-01"), (5, "Banana, raw", "2024-06-01")]
+    amounts = {**AMOUNTS, 1: (99.0, 99.0), 4: (30.0, 3.0), 5: (22.8, 1.1)}
+    dump = write_dump(tmp_path / "dump2", foods, amounts)
+    assert import_dump(dump, index_dir) == 2
+
+    index = FdcIndex(index_dir)
+    assert len(index) == 5
+    assert index.lookup("rice") == {"carbs": 30.0, "protein": 3.0}
+    assert index.lookup("banana") == {"carbs": 22.8, "protein": 1.1}
+    # Same publication date: the old nutrient values are kept
+    assert index.lookup("raw potato") == {"carbs": 17.5, "protein": 2.0}
+    # An unchanged dump is not re-imported
+    assert import_dump(dump, index_dir) == 0
+    assert os.path.exists(os.path.join(index_dir, "manifest.json"))
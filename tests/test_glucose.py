@@ -0,0 +1,106 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from glucose import (
+    daily_rollup,
+    decode_block,
+    encode_block,
+    glucose_stats,
+    hourly_series,
+    import_readings,
+    latest_reading,
+    load_readings,
+    merge_into_blocks,
+    parse_cgm_csv,
+)
+from repository import InMemoryRepository
+
+DEXCOM_CSV = """Index,Timestamp (YYYY-MM-DDThh:mm:ss),Event Type,Glucose Value (mg/dL)
+1,,FirstName,
+2,2026-10-17T08:00:00,EGV,110
+3,2026-10-17T08:05:00,Calibration,115
+4,2026-10-17T08:10:00,EGV,Low
+5,2026-10-17T08:15:00,EGV,High
+"""
+
+LIBRE_CSV = """Patient report,Generated on,18-10-2026
+Device,Serial Number,Device Timestamp,Record Type,Historic Glucose mmol/L,Scan Glucose mmol/L
+FreeStyle,X,2026-10-17 09:00,0,5.5,
+FreeStyle,X,2026-10-17 09:15,0,10.0,
+"""
+
+
+def readings(*pairs):
+    return pd.DataFrame(
+        {"timestamp": pd.to_datetime([t for t, _ in pairs]), "mg_dl": [v for _, v in pairs]}
+    )
+
+
+def test_parse_dexcom_keeps_sensor_readings_only():
+    parsed = parse_cgm_csv(io.StringIO(DEXCOM_CSV))
+    assert parsed["mg_dl"].tolist() == [110, 40, 400]
+    assert parsed["timestamp"].iloc[0] == pd.Timestamp("2026-10-17 08:00")
+
+
+def test_parse_libre_skips_metadata_line_and_converts_mmol():
+    parsed = parse_cgm_csv(io.StringIO(LIBRE_CSV))
+    assert parsed["mg_dl"].tolist() == [99, 180]
+
+
+def test_parse_rejects_unknown_layout():
+    with pytest.raises(ValueError):
+        parse_cgm_csv(io.StringIO("a,b\n1,2\n"))
+
+
+def test_block_round_trip():
+    offsets, values = np.array([0, 300, 86399]), np.array([100, 65535, 40])
+    decoded = decode_block(encode_block(offsets, values))
+    assert decoded[0].tolist() == offsets.tolist()
+    assert decoded[1].tolist() == values.tolist()
+
+
+def test_merge_replaces_readings_at_the_same_second():
+    first = merge_into_blocks({}, readings(("2026-10-17 08:00", 100), ("2026-10-18 00:05", 120)))
+    assert sorted(first) == ["2026-10-17", "2026-10-18"]
+    merged = merge_into_blocks(first, readings(("2026-10-17 08:00", 150), ("2026-10-17 07:00", 90)))
+    offsets, values = decode_block(merged["2026-10-17"])
+    assert offsets.tolist() == [7 * 3600, 8 * 3600]
+    assert values.tolist() == [90, 150]
+
+
+def test_import_and_load_round_trip():
+    repo = InMemoryRepository()
+    report = import_readings(
+        repo, "u1", readings(("2026-10-16 23:55", 80), ("2026-10-17 00:05", 200))
+    )
+    assert (report["days"], report["readings"], report["last"]["value"]) == (2, 2, 200)
+    times, values = load_readings(repo, "u1", "2026-10-16", "2026-10-17")
+    assert times.tolist() == list(pd.to_datetime(["2026-10-16 23:55", "2026-10-17 00:05"]))
+    assert values.tolist() == [80.0, 200.0]
+    assert latest_reading(repo, "u1")["value"] == 200
+    assert import_readings(repo, "u1", readings())["days"] == 0
+
+
+def test_glucose_stats():
+    stats = glucose_stats(np.array([50.0, 100.0, 150.0, 300.0]))
+    assert stats["mean"] == 150.0
+    assert stats["tir"] == 50.0
+    assert (stats["tbr"], stats["tbr_severe"]) == (25.0, 25.0)
+    assert (stats["tar"], stats["tar_severe"]) == (25.0, 25.0)
+    assert stats["gmi"] == round(3.31 + 0.02392 * 150, 1)
+    assert glucose_stats(np.array([])) is None
+
+
+def test_daily_rollup_and_hourly_series():
+    times = np.array(
+        ["2026-10-17T08:00", "2026-10-17T08:30", "2026-10-18T09:00"], dtype="datetime64[s]"
+    )
+    values = np.array([100.0, 200.0, 60.0])
+    daily = daily_rollup(times, values)
+    assert daily["Mean mg/dL"].tolist() == [150.0, 60.0]
+    assert daily["Time in range %"].tolist() == [50.0, 0.0]
+    assert daily["7-day mean mg/dL"].tolist() == [150.0, 105.0]
+    assert hourly_series(times, values).tolist() == [150.0, 60.0]
@@ -0,0 +1,31 @@
+import services
+from services import MEAL_TOTAL, get_meal_nutrition, parse_meal
+
+
+def test_dish_names_are_not_split():
+    assert parse_meal("Mac and cheese, fish & chips; peanut butter and jelly\n apple + Apple") == [
+        "mac and cheese", "fish & chips", "peanut butter and jelly", "apple",
+    ]
+
+
+def lookup(monkeypatch, table):
+    monkeypatch.setattr(services, "_nutrition_resolver", lambda: lambda item: table.get(item, {}))
+
+
+def test_meal_total(monkeypatch):
+    lookup(
+        monkeypatch,
+        {"oatmeal": {"carbs": 12.0, "protein": 2.5}, "banana": {"carbs": 23.0, "protein": 1.1}},
+    )
+    df = get_meal_nutrition("oatmeal, banana")
+    assert df.iloc[-1].to_dict() == {"Food": MEAL_TOTAL, "Carbs (g)": 35.0, "Protein (g)": 3.6}
+
+
+def test_total_is_partial_when_an_item_has_no_data(monkeypatch):
+    lookup(monkeypatch, {"oatmeal": {"carbs": 12.0, "protein": 2.5}})
+    df = get_meal_nutrition("oatmeal, mystery stew")
+    assert df["Food"].tolist() == ["oatmeal", "mystery stew", f"{MEAL_TOTAL} (partial)"]
+    assert df.iloc[-1]["Carbs (g)"] == 12.0
+
+    df = get_meal_nutrition("mystery stew")
+    assert df["Food"].tolist() == ["mystery stew"]
@@ -0,0 +1,194 @@
+from collections import Counter
+
+import pytest
+
+import migrate
+from bulk import BulkWriteResult
+from migrate import Checkpoint, _parse_map, _target_id, migrate_collection, resolve_owners
+from repository import GLUCOSE_BLOCK_COLLECTION
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data, path=""):
+        self.id = doc_id
+        self._data = data
+        self.reference = f"{path}{doc_id}"
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeRef:
+    def __init__(self, path):
+        self.path = path
+
+    def collection(self, name):
+        return FakeRef(f"{self.path}/{name}")
+
+    def document(self, doc_id):
+        return FakeRef(f"{self.path}/{doc_id}")
+
+    def select(self, field_paths):
+        return self
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class FakeClient:
+    def __init__(self, profiles=()):
+        self.users = FakeRef("users")
+        self.users.docs = [FakeDoc(uid, {"first_name": name}) for uid, name in profiles]
+
+    def collection(self, name):
+        return self.users if name == "users" else FakeRef(name)
+
+
+@pytest.fixture
+def source(monkeypatch):
+    """Serve ``docs`` through ``migrate._chunks`` and capture ``bulk_write`` calls."""
+    writes = []
+    docs = []
+
+    def chunks(client, collection, after_id, chunk_size):
+        remaining = [d for d in docs if after_id is None or d.id > after_id]
+        for i in range(0, len(remaining), chunk_size):
+            yield remaining[i:i + chunk_size]
+
+    def documents(client, collection, doc_ids):
+        return [d for d in docs if d.id in doc_ids]
+
+    def bulk_write(client, operations):
+        writes.append(list(operations))
+        return BulkWriteResult(succeeded=len(operations))
+
+    monkeypatch.setattr(migrate, "_chunks", chunks)
+    monkeypatch.setattr(migrate, "_documents", documents)
+    monkeypatch.setattr(migrate, "bulk_write", bulk_write)
+    return docs, writes
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(str(path))
+    checkpoint.collection("reminders").update(last_id="r9", copied=3)
+    checkpoint.save()
+    assert Checkpoint(str(path)).collection("reminders") == {
+        "last_id": "r9", "done": False, "copied": 3, "skipped": 0, "unmapped": [],
+    }
+
+
+def test_checkpoint_without_skipped_ids_is_rescanned(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text(
+        '{"reminders": {"last_id": "r9", "done": true, "copied": 3, "skipped": 2}}'
+    )
+    assert Checkpoint(str(path)).collection("reminders") == {
+        "last_id": None, "done": False, "copied": 3, "skipped": 0, "unmapped": [],
+    }
+
+
+def test_checkpoint_without_a_path_is_not_saved(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoint = Checkpoint(None)
+    checkpoint.collection("reminders")["done"] = True
+    checkpoint.save()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parse_map():
+    assert _parse_map(None) == {}
+    assert _parse_map(["John=uid1", "Ann=a=b"]) == {"John": "uid1", "Ann": "a=b"}
+    for bad in ("John", "John="):
+        with pytest.raises(ValueError):
+            _parse_map([bad])
+
+
+def test_glucose_blocks_are_rekeyed_by_day():
+    doc = FakeDoc("John_2026-01-02", {"day": "2026-01-02"})
+    assert _target_id(GLUCOSE_BLOCK_COLLECTION, doc) == "2026-01-02"
+    assert _target_id("reminders", doc) == "John_2026-01-02"
+
+
+def test_resolve_owners():
+    client = FakeClient([("u1", "John"), ("u2", "Ann"), ("u3", "Ann"), ("u4", "Bo"), ("u5", "Bo")])
+    owners, ambiguous = resolve_owners(client, {"Bo": "u5"})
+    assert owners == {"John": "u1", "Bo": "u5"}
+    assert ambiguous == {"Ann"}
+
+
+def test_migrate_collection_copies_mapped_owners(source):
+    docs, writes = source
+    docs.extend(
+        FakeDoc(f"r{i}", {"User": name, "Medicine": "A"}, "reminders/")
+        for i, name in enumerate(["John", "Ann", "John"])
+    )
+    checkpoint = Checkpoint(None)
+    left = migrate_collection(
+        FakeClient(), "reminders", {"John": "u1"}, checkpoint, chunk_size=2,
+        dry_run=False, delete_source=True,
+    )
+    assert left == Counter({"Ann": 1})
+    assert writes[0] == [
+        ("set", writes[0][0][1], {"User": "u1", "Medicine": "A"}),
+        ("delete", "reminders/r0", None),
+    ]
+    assert writes[0][0][1].path == "users/u1/reminders/r0"
+    assert [len(w) for w in writes] == [2, 2]
+    assert checkpoint.collection("reminders") == {
+        "last_id": "r2", "done": True, "copied": 2, "skipped": 1, "unmapped": ["r1"],
+    }
+
+
+def test_rerun_with_map_moves_documents_left_behind(source, tmp_path):
+    docs, writes = source
+    docs.extend(FakeDoc(f"r{i}", {"User": name}) for i, name in enumerate(["John", "Ann", "Bo"]))
+    path = str(tmp_path / "checkpoint.json")
+    left = migrate_collection(
+        FakeClient(), "reminders", {"John": "u1"}, Checkpoint(path), 2, False, False
+    )
+    assert left == Counter({"Ann": 1, "Bo": 1})
+
+    writes.clear()
+    checkpoint = Checkpoint(path)
+    left = migrate_collection(
+        FakeClient(), "reminders", {"John": "u1", "Ann": "u2"}, checkpoint, 2, False, False
+    )
+    assert left == Counter({"Bo": 1})
+    assert [op[1].path for batch in writes for op in batch] == ["users/u2/reminders/r1"]
+    assert checkpoint.collection("reminders") == {
+        "last_id": "r2", "done": True, "copied": 2, "skipped": 1, "unmapped": ["r2"],
+    }
+
+
+def test_migrate_collection_resumes_and_dry_runs(source):
+    docs, writes = source
+    docs.extend(FakeDoc(f"r{i}", {"User": "John"}) for i in range(4))
+    checkpoint = Checkpoint(None)
+    checkpoint.collection("reminders")["last_id"] = "r1"
+    migrate_collection(
+        FakeClient(), "reminders", {"John": "u1"}, checkpoint, chunk_size=10,
+        dry_run=True, delete_source=False,
+    )
+    assert writes == []
+    assert checkpoint.collection("reminders")["copied"] == 2
+
+    # A finished collection with nothing left behind is not read again
+    checkpoint.collection("reminders").update(done=True, unmapped=[])
+    docs.clear()
+    docs.append(FakeDoc("r9", {"User": "Nobody"}))
+    assert migrate_collection(
+        FakeClient(), "reminders", {}, checkpoint, 10, False, False
+    ) == Counter()
+
+
+def test_failed_writes_stop_before_the_checkpoint_moves(source, monkeypatch):
+    docs, _ = source
+    docs.append(FakeDoc("r0", {"User": "John"}))
+    monkeypatch.setattr(
+        migrate, "bulk_write", lambda client, ops: BulkWriteResult(failed=1, errors=["denied"])
+    )
+    checkpoint = Checkpoint(None)
+    with pytest.raises(RuntimeError, match="denied"):
+        migrate_collection(FakeClient(), "reminders", {"John": "u1"}, checkpoint, 10, False, False)
+    assert checkpoint.collection("reminders")["last_id"] is None
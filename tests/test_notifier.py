@@ -0,0 +1,183 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import notifier
+from notifier import (
+    Channel,
+    DeliveryLedger,
+    DeliveryQueue,
+    LocalSinkChannel,
+    Notification,
+    NotificationWorker,
+)
+from repository import InMemoryRepository
+
+
+class SlowWatchRepository(InMemoryRepository):
+    """Delivers the initial reminder snapshot from another thread, as Firestore does."""
+
+    def watch_reminders(self, on_upsert, on_remove, on_ready=None):
+        watch = super().watch_reminders(on_upsert, on_remove)
+        threading.Timer(0.2, on_ready).start()
+        return watch
+
+
+class FlakyChannel(Channel):
+    def __init__(self, failures: int):
+        super().__init__("sms")
+        self.failures = failures
+        self.sent = []
+
+    def _send(self, notifications):
+        if self.failures:
+            self.failures -= 1
+            return [RuntimeError("provider down")] * len(notifications)
+        self.sent.extend(notifications)
+        return [None] * len(notifications)
+
+
+def due_reminder_repo(repo):
+    fired = datetime.now(timezone.utc) - timedelta(minutes=2)
+    repo.save_user("u1", {"phone": "+15550000001", "timezone": "UTC"})
+    repo.add_reminder(
+        "u1", {"Medicine": "Metformin", "Time": fired.strftime("%H:%M"), "Frequency": "Daily"}
+    )
+    return repo
+
+
+def test_once_waits_for_the_initial_snapshot(tmp_path):
+    repo = due_reminder_repo(SlowWatchRepository())
+    channel = LocalSinkChannel("sms", str(tmp_path), field="phone")
+    queue = DeliveryQueue({"sms": channel}, DeliveryLedger(str(tmp_path / "ledger.sqlite3")), 0)
+    asyncio.run(NotificationWorker(repo, queue).run(once=True))
+
+    (line,) = (tmp_path / "sms.jsonl").read_text().splitlines()
+    assert json.loads(line)["recipient"] == "+15550000001"
+    assert queue.sent == 1
+
+
+def test_failed_delivery_is_requeued(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_BACKOFF_SECONDS", 0)
+    repo = due_reminder_repo(InMemoryRepository())
+    channel = FlakyChannel(failures=notifier.MAX_ATTEMPTS)
+    ledger = DeliveryLedger(str(tmp_path / "ledger.sqlite3"))
+    queue = DeliveryQueue({"sms": channel}, ledger, 0)
+    worker = NotificationWorker(repo, queue)
+
+    async def scenario():
+        await worker.start()
+        assert await worker.tick() == 1
+        await queue.drain()
+        assert (queue.deferred, channel.sent) == (1, [])
+        # Nothing is resent before the retry time, and the key stays claimed
+        assert await worker.tick() == 0
+        later = notifier.time.time() + notifier.REQUEUE_DELAY_SECONDS + 1
+        assert await worker.tick(later) == 1
+        await queue.drain()
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert len(channel.sent) == 1
+    assert queue.sent == 1
+
+
+def test_gives_up_after_max_rounds(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_BACKOFF_SECONDS", 0)
+    ledger = DeliveryLedger(str(tmp_path / "ledger.sqlite3"))
+    queue = DeliveryQueue({"sms": FlakyChannel(failures=10**6)}, ledger, 0)
+    notification = Notification("r1:2026-10-18T08:00Z:sms", "sms", "+1", "u1", "A", "", "text")
+
+    async def scenario():
+        queue.start()
+        queue.resubmit(notification, notifier.MAX_ROUNDS - 1)
+        await queue.drain()
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert (queue.failed, queue.deferred) == (1, 0)
+    assert ledger.due_retries(float("inf")) == []
+    assert not ledger.claim(notification)
+
+
+def test_webhook_idempotency_key_covers_the_batch(monkeypatch):
+    requests = pytest.importorskip("requests")
+    keys = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+    def post(url, json, headers, timeout):
+        keys.append(headers["Idempotency-Key"])
+        return Response()
+
+    monkeypatch.setattr(requests, "post", post)
+    channel = notifier.WebhookChannel("https://example.com/hook")
+    a = Notification("a", "webhook", "u1", "u1", "A", "", "")
+    b = Notification("b", "webhook", "u1", "u1", "B", "", "")
+    channel._send([a, b])
+    channel._send([b, a])
+    channel._send([a])
+    assert keys[0] == keys[1] != keys[2]
+
+
+class UnlistedUserRepository(InMemoryRepository):
+    """A profile saved outside the users listener, e.g. since the initial snapshot."""
+
+    def watch_users(self, on_upsert, on_remove, on_ready=None):
+        return super().watch_users(lambda uid, profile: None, on_remove, on_ready)
+
+
+def test_profile_missing_from_the_listener_is_read_on_demand(tmp_path):
+    repo = due_reminder_repo(UnlistedUserRepository())
+    repo.add_reminder("u2", dict(repo.list_reminders("u1")[0][1]))
+    channels = {
+        "sms": LocalSinkChannel("sms", str(tmp_path), field="phone"),
+        "webhook": LocalSinkChannel("webhook", str(tmp_path)),
+    }
+    queue = DeliveryQueue(channels, DeliveryLedger(str(tmp_path / "ledger.sqlite3")), 0)
+    asyncio.run(NotificationWorker(repo, queue).run(once=True))
+
+    sms = [json.loads(line) for line in (tmp_path / "sms.jsonl").read_text().splitlines()]
+    webhook = [json.loads(line) for line in (tmp_path / "webhook.jsonl").read_text().splitlines()]
+    assert [n["recipient"] for n in sms] == ["+15550000001"]
+    # u2 has no profile at all, but the webhook only needs the uid
+    assert sorted(n["recipient"] for n in webhook) == ["u1", "u2"]
+
+
+def test_profile_changes_reach_the_worker(tmp_path):
+    repo = InMemoryRepository()
+    channel = LocalSinkChannel("sms", str(tmp_path), field="phone")
+    queue = DeliveryQueue({"sms": channel}, DeliveryLedger(str(tmp_path / "ledger.sqlite3")), 0)
+    worker = NotificationWorker(repo, queue)
+
+    async def scenario():
+        await worker.start()
+        repo.save_user("u3", {"phone": "+15550000003", "timezone": "Asia/Tokyo", "email": "x"})
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert worker._contacts["u3"] == {"phone": "+15550000003", "timezone": "Asia/Tokyo"}
+    assert repo.stats.snapshot().get("users.get") is None
+
+
+def test_abandoned_claims_are_taken_over(tmp_path):
+    path = str(tmp_path / "ledger.sqlite3")
+    notification = Notification("r1:2026-10-18T08:00Z:sms", "sms", "+1", "u1", "A", "", "text")
+    assert DeliveryLedger(path).claim(notification)
+
+    # The worker that claimed it died before sending; another one sharing the file takes over
+    ledger = DeliveryLedger(path)
+    now = notifier.time.time()
+    assert ledger.stale_claims(now) == []
+    later = now + notifier.CLAIM_TIMEOUT_SECONDS + 1
+    assert ledger.stale_claims(later) == [(notification, 0)]
+    assert ledger.stale_claims(later) == []
+    assert not ledger.claim(notification)
+
+    ledger.mark_sent(notification.key)
+    assert ledger.stale_claims(later + notifier.CLAIM_TIMEOUT_SECONDS + 1) == []
@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from reminders import ReminderIndex
+from schedule import CompiledSchedule, minute_of_day
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def fire(reminder: dict, after: datetime, timezones=None):
+    compiled = CompiledSchedule.compile([("r1", {"User": "u1", **reminder})], timezones)
+    (result,) = compiled.next_fire(after)
+    return None if np.isnat(result) else result.astype(datetime)
+
+
+def test_minute_of_day():
+    assert minute_of_day("08:30") == 510
+    assert minute_of_day("8:5") == 485
+    assert minute_of_day("25:00") is None
+    assert minute_of_day(None) is None
+
+
+def test_rows_without_a_time_are_dropped():
+    compiled = CompiledSchedule.compile([("a", {"Time": "bad"}), ("b", {"Time": "09:00"})])
+    assert list(compiled.ids) == ["b"]
+
+
+def test_daily_fires_strictly_after():
+    reminder = {"Time": "08:00", "Frequency": "Daily"}
+    assert fire(reminder, utc(2026, 10, 18, 7, 0)) == datetime(2026, 10, 18, 8, 0)
+    assert fire(reminder, utc(2026, 10, 18, 8, 0)) == datetime(2026, 10, 19, 8, 0)
+
+
+def test_weekday_reminder_skips_to_the_next_allowed_day():
+    # 2026-10-18 is a Sunday
+    reminder = {"Time": "08:00", "Frequency": "Wednesday"}
+    assert fire(reminder, utc(2026, 10, 18, 12, 0)) == datetime(2026, 10, 21, 8, 0)
+
+
+def test_once_reminder_fires_on_its_date_then_never():
+    reminder = {"Time": "08:00", "Frequency": "Once", "Date": "2026-10-20"}
+    assert fire(reminder, utc(2026, 10, 18)) == datetime(2026, 10, 20, 8, 0)
+    assert fire(reminder, utc(2026, 10, 20, 8, 0)) is None
+
+
+def test_time_zone_precedence():
+    reminder = {"Time": "08:00", "Frequency": "Daily"}
+    after = utc(2026, 10, 18)
+    assert fire(reminder, after, {"u1": "Asia/Tokyo"}) == datetime(2026, 10, 18, 23, 0)
+    # The reminder's own zone wins over the user's
+    own = {**reminder, "Timezone": "Europe/Berlin"}
+    assert fire(own, after, {"u1": "Asia/Tokyo"}) == datetime(2026, 10, 18, 6, 0)
+    # Unknown zones fall back to UTC
+    assert fire(reminder, after, {"u1": "Not/AZone"}) == datetime(2026, 10, 18, 8, 0)
+
+
+@pytest.mark.parametrize(
+    "hhmm, after, expected",
+    [
+        # 02:30 does not exist on 2026-03-08 in New York: fire at the end of the gap
+        ("02:30", utc(2026, 3, 8, 5, 0), datetime(2026, 3, 8, 7, 0)),
+        # 01:30 happens twice on 2026-11-01: fire once, at the first (EDT) occurrence
+        ("01:30", utc(2026, 11, 1, 4, 0), datetime(2026, 11, 1, 5, 30)),
+        ("01:30", utc(2026, 11, 1, 5, 30), datetime(2026, 11, 2, 6, 30)),
+        # Wall-clock time is kept across the change
+        ("08:00", utc(2026, 3, 7, 14, 0), datetime(2026, 3, 8, 12, 0)),
+        ("08:00", utc(2026, 3, 6, 14, 0), datetime(2026, 3, 7, 13, 0)),
+    ],
+)
+def test_dst_transitions(hhmm, after, expected):
+    reminder = {"Time": hhmm, "Frequency": "Daily", "Timezone": "America/New_York"}
+    assert fire(reminder, after) == expected
+
+
+def test_vectorized_matches_row_by_row():
+    reminders = [
+        (f"r{i}", {"User": "u1", "Time": f"{h:02d}:{m:02d}", "Frequency": freq, "Timezone": tz})
+        for i, (h, m, freq, tz) in enumerate(
+            (h, m, freq, tz)
+            for h in (0, 1, 2, 23)
+            for m in (0, 30)
+            for freq in ("Daily", "Sunday", "Monday, Friday")
+            for tz in ("UTC", "America/New_York", "Australia/Lord_Howe")
+        )
+    ]
+    after = utc(2026, 11, 1, 5, 15)
+    together = CompiledSchedule.compile(reminders).next_fire(after)
+    one_by_one = [CompiledSchedule.compile([row]).next_fire(after)[0] for row in reminders]
+    assert list(together) == one_by_one
+
+
+def test_reminder_index_pops_due_reminders_and_rearms_them():
+    start = utc(2026, 10, 18, 7, 0).timestamp()
+    index = ReminderIndex(start=start)
+    index.upsert("r1", {"User": "u1", "Medicine": "A", "Time": "08:00", "Frequency": "Daily"})
+    eight = utc(2026, 10, 18, 8, 0).timestamp()
+    assert index.next_fire_time() == eight
+    assert index.pop_due(eight - 1) == []
+    assert index.pop_due(eight + 60) == [("r1", "u1", "A", eight)]
+    assert index.next_fire_time() == eight + 24 * 3600
+
+    index.set_timezone("u1", "Asia/Tokyo")
+    assert index.next_fire_time() == utc(2026, 10, 18, 23, 0).timestamp()
+    index.remove("r1")
+    assert index.next_fire_time() is None
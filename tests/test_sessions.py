@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+import sessions
+from repository import InMemoryRepository
+from sessions import SessionStore
+
+USER = {"uid": "u1", "first_name": "Ada", "email": "ada@example.com"}
+
+
+@pytest.fixture
+def repo():
+    return InMemoryRepository()
+
+
+@pytest.fixture
+def store(repo):
+    return SessionStore(b"test-key", repo)
+
+
+def test_handoff_code_redeems_a_verifiable_token(store):
+    token = store.redeem(store.create(USER, "u1", "firebase", "refresh"))
+    payload = store.verify(token)
+    assert payload["sub"] == "u1"
+    assert payload["user"] == USER
+    assert store.refresh_token_for(payload["sid"]) == ("firebase", "refresh")
+
+
+def test_handoff_code_works_once(store):
+    code = store.create(USER, "u1")
+    assert store.redeem(code) is not None
+    assert store.redeem(code) is None
+    assert store.redeem("made-up") is None
+
+
+def test_expired_handoff_code_is_rejected(store, monkeypatch):
+    code = store.create(USER, "u1")
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + sessions.HANDOFF_TTL_SECONDS + 1)
+    assert store.redeem(code) is None
+
+
+def test_tampered_token_is_rejected(store):
+    token = store.redeem(store.create(USER, "u1"))
+    body, signature = token.split(".")
+    assert store.verify(f"{body}x.{signature}") is None
+    assert SessionStore(b"other-key", InMemoryRepository()).verify(token) is None
+    assert store.verify("not a token") is None
+
+
+def test_revocation_survives_a_restart(store, repo):
+    token = store.redeem(store.create(USER, "u1", "google", "refresh"))
+    store.revoke(token)
+    assert store.verify(token) is None
+    # A new process (or another replica) sharing the repository
+    assert SessionStore(b"test-key", repo).verify(token) is None
+
+
+def test_restores_are_verified_locally(store, repo):
+    token = store.redeem(store.create(USER, "u1"))
+    repo.stats.reset()
+    for _ in range(3):
+        assert store.verify(token)
+    assert repo.stats.snapshot() == {}
+
+
+def test_logout_elsewhere_is_seen_at_the_next_revocation_check(store, repo, monkeypatch):
+    token = store.redeem(store.create(USER, "u1"))
+    assert store.verify(token)
+    SessionStore(b"test-key", repo).revoke(token)
+    assert store.verify(token)
+    real_monotonic = time.monotonic
+    monkeypatch.setattr(
+        time, "monotonic", lambda: real_monotonic() + sessions.REVOCATION_CHECK_SECONDS + 1
+    )
+    assert store.verify(token) is None
+
+
+def test_expired_sessions_are_pruned(store, repo, monkeypatch):
+    store.redeem(store.create(USER, "u1"))
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + sessions.SESSION_TTL_SECONDS + 1)
+    store.purge_expired()
+    assert repo._sessions == {}
+
+
+def _call(app, method: str, body: bytes = b"") -> tuple:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": sessions.SESSION_ROUTE,
+        "raw_path": sessions.SESSION_ROUTE.encode(),
+        "query_string": b"",
+        "headers": [],
+        "scheme": "https",
+        "server": ("testserver", 443),
+    }
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    return start["status"], [v.decode() for k, v in start["headers"] if k == b"set-cookie"]
+
+
+def test_route_trades_code_for_http_only_cookie(store, monkeypatch):
+    from starlette.applications import Starlette
+
+    monkeypatch.setattr(sessions, "get_session_store", lambda: store)
+    app = Starlette(routes=sessions.session_routes())
+    code = store.create(USER, "u1")
+
+    status, cookies = _call(app, "POST", code.encode())
+    assert status == 204
+    (cookie,) = cookies
+    name, _, rest = cookie.partition("=")
+    token = rest.split(";")[0]
+    assert name == sessions.SESSION_COOKIE
+    assert "httponly" in cookie.lower() and "secure" in cookie.lower()
+    assert store.verify(token)["sub"] == "u1"
+
+    assert _call(app, "POST", code.encode())[0] == 403
+    status, cookies = _call(app, "DELETE")
+    assert status == 204 and 'max-age=0' in cookies[0].lower()
@@ -0,0 +1,43 @@
+from datetime import date
+
+from repository import InMemoryRepository
+import summary
+from summary import medications_remaining, rebuild_summary, scheduled_on
+
+
+def test_once_reminder_is_due_only_on_its_date():
+    assert scheduled_on("Once", date(2026, 10, 18), "2026-10-18")
+    assert not scheduled_on("Once", date(2026, 10, 19), "2026-10-18")
+    assert not scheduled_on("Once", date(2026, 10, 18), None)
+
+
+def test_weekday_and_daily_reminders():
+    sunday = date(2026, 10, 18)
+    assert scheduled_on("Daily", sunday)
+    assert scheduled_on("Monday, Sunday", sunday)
+    assert not scheduled_on("Monday, Tuesday", sunday)
+
+
+def test_remaining_counts_a_one_shot_reminder_once():
+    repo = InMemoryRepository()
+    repo.add_reminder("u1", {"Medicine": "A", "Time": "08:00", "Frequency": "Daily"})
+    repo.add_reminder(
+        "u1", {"Medicine": "B", "Time": "09:00", "Frequency": "Once", "Date": "2026-10-18"}
+    )
+    summary = rebuild_summary(repo, "u1")
+    assert medications_remaining(summary, date(2026, 10, 18)) == 2
+    assert medications_remaining(summary, date(2027, 3, 1)) == 1
+
+
+def test_taking_medications_drops_earlier_days(monkeypatch):
+    class Today(date):
+        @classmethod
+        def today(cls):
+            return cls(2026, 10, 18)
+
+    monkeypatch.setattr(summary, "date", Today)
+    repo = InMemoryRepository()
+    repo.set_summary("u1", {"taken": {"2026-10-16": 2, "2026-10-17": 3}})
+    summary.on_medications_taken(repo, "u1", 1)
+    summary.on_medications_taken(repo, "u1", 2)
+    assert repo.get_summary("u1")["taken"] == {"2026-10-18": 3}
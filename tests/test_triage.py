@@ -0,0 +1,113 @@
+import pytest
+
+from triage import TriageEngine, normalize
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return TriageEngine()
+
+
+def intent(engine, text):
+    match = engine.classify(text)
+    return match and match.intent.name
+
+
+def test_normalize_keeps_contractions():
+    assert normalize("I’ll be 'fine', can't   you?") == " i'll be fine can't you "
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Can you help me plan my meals for the week?",
+        "Is it normal to feel confused about carb counting?",
+        "This is urgent: what should I eat before a long drive?",
+        "What is DKA?",
+        "What are the symptoms of DKA?",
+        "Does diabetes raise the risk of a stroke?",
+        "How do I store glucagon?",
+    ],
+)
+def test_ordinary_questions_are_not_emergencies(engine, text):
+    assert not any(match.emergency for match in engine.rank(text))
+
+
+def test_contractions_do_not_match_other_words(engine):
+    names = [m.intent.name for m in engine.rank("I'll be travelling, how should I store insulin?")]
+    assert names == ["insulin_storage"]
+    assert intent(engine, "I'm feeling ill") == "sick_day"
+
+
+def test_dka_questions_get_general_information(engine):
+    assert intent(engine, "What is DKA?") == "dka_info"
+    assert intent(engine, "I think I have DKA") == "dka"
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("my son passed out", "severe_hypoglycemia"),
+        ("I have chest pain and feel sick", "cardiac_or_stroke"),
+        ("I can't stop vomiting", "dka"),
+        ("i cant stop vomiting", "dka"),
+        ("My dad is confused and sweating", "emergency"),
+        ("I want to end my life", "crisis"),
+    ],
+)
+def test_emergencies_are_answered(engine, text, expected):
+    match = engine.classify(text)
+    assert match.emergency
+    assert match.intent.name == expected
+
+
+def test_negated_emergency_is_ignored(engine):
+    assert not any(m.emergency for m in engine.rank("No chest pain, but my feet are numb"))
+    assert not any(m.emergency for m in engine.rank("I don't have chest pain"))
+
+
+def test_phrases_match_whole_words(engine):
+    assert intent(engine, "Hi!") == "greeting"
+    assert engine.rank("this is high") == []
+
+
+def test_detailed_questions_go_to_the_model(engine):
+    assert intent(engine, "thanks") == "thanks"
+    assert engine.classify(
+        "How should I adjust my basal insulin for exercise on days with late dinners?"
+    ) is None
+
+
+def test_mixed_questions_go_to_the_model(engine):
+    matches = engine.rank("I have a fever and my feet hurt")
+    assert {m.intent.name for m in matches} == {"sick_day", "foot_care"}
+    # Coverage counts each intent's own words only
+    assert all(m.coverage < 0.5 for m in matches)
+    assert engine.classify("I have a fever and my feet hurt") is None
+    assert engine.classify("Hi, what is DKA?") is None
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("my blood sugar is 38", "severe_hypoglycemia"),
+        ("blood sugar 35", "severe_hypoglycemia"),
+        ("Glucose dropped to 49!", "severe_hypoglycemia"),
+        ("sugar is 450", "dka"),
+        ("my blood sugar is over 300 and rising", "dka"),
+    ],
+)
+def test_glucose_readings_are_judged_by_value(engine, text, expected):
+    match = engine.classify(text)
+    assert match.emergency
+    assert match.intent.name == expected
+
+
+@pytest.mark.parametrize("text", ["my blood sugar is 120", "glucose 54", "sugar is 5 mmol"])
+def test_ordinary_readings_are_not_emergencies(engine, text):
+    assert not any(m.emergency for m in engine.rank(text))
+
+
+def test_cold_means_the_illness_only(engine):
+    assert engine.rank("My hands are always cold") == []
+    assert intent(engine, "I have a cold") == "sick_day"
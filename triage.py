@@ -0,0 +1,492 @@
+"""Local triage of chatbot messages.
+
+Every phrase of the intent lexicon is compiled once into a single
+Aho–Corasick automaton over normalized text, so a message is classified in
+one pass whatever the size of the lexicon. Text is lowercased, apostrophes
+inside words kept so contractions stay intact ("I'll" is not "ill"), and
+everything else that is not a letter or digit turned into single spaces. Each
+phrase is matched with a space on both sides: "hi" matches "Hi!" but not
+"this" or "high". A phrase with an apostrophe also matches its spelling
+without one ("can't" and "cant"), and a phrase ending in ``*`` matches any
+word starting with it ("hypoglyc*" covers hypoglycemia and hypoglycemic).
+
+Emergency intents outrank everything else and are answered even inside a
+longer question, unless a negation comes just before the phrase ("no chest
+pain"). Their phrases describe something happening ("can't stop vomiting"),
+not a topic, so "What is DKA?" gets general information instead. Glucose
+readings ("my blood sugar is 38") are matched by value against an intent's
+mg/dL range rather than listed number by number.
+Any other intent is answered locally only when it is the only one matched and
+its phrases cover most of the message's content words, so detailed or mixed
+questions still go to the model.
+"""
+
+import re
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+
+# Share of content words that must be matched to answer without the model
+LOCAL_ANSWER_COVERAGE = 0.5
+# An emergency phrase is ignored after a negation this many words before it
+NEGATION_WINDOW = 3
+NEGATIONS = frozenset(
+    "no not never without don't dont doesn't doesnt didn't didnt isn't isnt aren't arent "
+    "wasn't wasnt haven't havent hasn't hasnt".split()
+)
+STOP_WORDS = frozenset(
+    "a an the is are was were be been am do does did i i'm im me my we our you your it it's "
+    "its of to in on for at by with about please can could would should tell what what's "
+    "whats how how's hows and or so just if when there this that have has had get got any "
+    "some much many ok okay".split()
+)
+
+# A glucose reading in normalized text; the number is taken as mg/dL
+_READING = re.compile(
+    r" (?:blood )?(?:sugar|glucose|bg)(?:'s)?(?: level| reading)?"
+    r"(?: is| was| reads| read)?(?: of| at| dropped to| fell to| went to| down to| up to"
+    r"| over| above| under| below)? (\d{2,3})(?! mmol) "
+)
+_APOSTROPHES = re.compile(r"[’`]")
+_NON_WORD = re.compile(r"[^a-z0-9']+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces, with a space at each end.
+
+    Apostrophes are kept inside words and dropped at their edges, where they
+    are quotation marks.
+    """
+    words = _NON_WORD.sub(" ", _APOSTROPHES.sub("'", text.lower())).split()
+    words = [word for word in (w.strip("'") for w in words) if word]
+    return f" {' '.join(words)} "
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    response: str
+    phrases: tuple
+    emergency: bool = False
+    # Breaks ties between intents matched equally well
+    priority: float = 0.0
+    # Glucose readings in [low, high) mg/dL match this intent
+    readings: tuple = None
+
+
+@dataclass(frozen=True)
+class Match:
+    intent: Intent
+    score: float
+    # Share of the message's content words covered by this intent's phrases
+    coverage: float
+    phrases: tuple
+
+    @property
+    def emergency(self) -> bool:
+        return self.intent.emergency
+
+    @property
+    def response(self) -> str:
+        return self.intent.response
+
+
+_NOT_A_DOCTOR = "I am not a doctor, but here is general guidance from the American Diabetes Association (ADA)."
+
+LEXICON = (
+    # Emergencies
+    Intent(
+        "severe_hypoglycemia",
+        "🚨 **This may be severe hypoglycemia.** If the person is unconscious, having a "
+        "seizure or cannot swallow safely, **call emergency services (911) now** and use "
+        "glucagon if it has been prescribed. Do not put food or drink in their mouth. If "
+        "they are awake and can swallow, give 15 g of fast-acting carbohydrate and recheck "
+        "in 15 minutes.",
+        (
+            "passed out", "passing out", "pass out", "fainted", "fainting", "unconscious",
+            "unresponsive", "not responding", "having a seizure", "seizing", "convulsing",
+            "fitting", "can't wake", "cannot wake", "won't wake", "not waking up", "collapsed",
+            "severe hypo*", "severe low", "very low blood sugar", "need glucagon",
+            "gave glucagon", "given glucagon",
+            "took too much insulin", "too much insulin", "insulin overdose",
+            "double dose of insulin",
+        ),
+        emergency=True,
+        priority=3,
+        # Level 2 hypoglycemia; smaller numbers are more likely mmol/L
+        readings=(20, 54),
+    ),
+    Intent(
+        "dka",
+        "🚨 **These can be signs of diabetic ketoacidosis (DKA).** Check ketones now. If "
+        "ketones are moderate or large, you are vomiting, breathing fast or deeply, or "
+        "your breath smells fruity, **go to the emergency room or call 911**. Do not stop "
+        "taking insulin.",
+        (
+            "i have dka", "i think i have dka", "in dka", "going into dka", "fruity breath",
+            "breath smells fruity", "breath smells sweet", "can't stop vomiting",
+            "keep vomiting", "keep throwing up", "been vomiting", "been throwing up",
+            "large ketones", "high ketones", "ketones are high", "moderate ketones",
+            "breathing fast", "kussmaul", "reads hi",
+        ),
+        emergency=True,
+        priority=2,
+        readings=(300, 1000),
+    ),
+    Intent(
+        "cardiac_or_stroke",
+        "🚨 **Call emergency services (911) now.** Chest pain or pressure, trouble "
+        "breathing, a drooping face, arm weakness or slurred speech can be a heart attack "
+        "or stroke. People with diabetes may have milder heart attack symptoms, so do not "
+        "wait to see if it passes.",
+        (
+            "chest pain", "chest pains", "chest pressure", "chest tightness", "tight chest",
+            "having a heart attack", "having a stroke", "face drooping", "drooping face",
+            "slurred speech", "slurring", "arm weakness", "numb on one side",
+            "one side of my body", "can't breathe", "cannot breathe", "trouble breathing", "shortness of breath",
+            "short of breath", "struggling to breathe",
+        ),
+        emergency=True,
+        priority=3,
+    ),
+    Intent(
+        "crisis",
+        "🚨 **You don't have to face this alone.** If you are in danger or thinking about "
+        "harming yourself, call emergency services (911) now, or call or text **988** "
+        "(Suicide & Crisis Lifeline, US) to talk to someone right away.",
+        (
+            "suicid*", "kill myself", "end my life", "want to die", "self harm", "hurt myself",
+            "harm myself", "no reason to live",
+        ),
+        emergency=True,
+        priority=4,
+    ),
+    Intent(
+        "emergency",
+        "🚨 If experiencing confusion, seizures, or loss of consciousness, seek immediate "
+        "medical help!",
+        (
+            "this is an emergency", "it's an emergency", "having an emergency",
+            "medical emergency", "ambulance", "call 911", "calling 911", "is confused",
+            "are confused", "he's confused", "she's confused", "very confused",
+            "suddenly confused", "acting confused", "disoriented", "can't think straight",
+        ),
+        emergency=True,
+        priority=1,
+    ),
+    # Conversation
+    Intent(
+        "greeting",
+        "Hello! I'm your diabetes assistant. How can I help today?",
+        (
+            "hi", "hello", "hey", "hiya", "howdy", "good morning", "good afternoon",
+            "good evening", "greetings", "yo",
+        ),
+        priority=-1,
+    ),
+    Intent(
+        "thanks",
+        "You're welcome! Remember to always consult your healthcare team for personal advice.",
+        ("thanks", "thank you", "thank u", "thx", "ty", "appreciate it", "cheers", "helpful"),
+        priority=-0.5,
+    ),
+    Intent(
+        "goodbye",
+        "Take care! Check in any time you have a question.",
+        ("bye", "goodbye", "see you", "see ya", "good night", "later"),
+        priority=-1,
+    ),
+    # Common questions
+    Intent(
+        "hypoglycemia",
+        f"{_NOT_A_DOCTOR}\n\n**Hypoglycemia** (below 70 mg/dL) can cause shaking, "
+        "sweating, a fast heartbeat, hunger, dizziness and irritability. Use the **15-15 "
+        "rule**: take 15 g of fast-acting carbs (4 oz juice or regular soda, or glucose "
+        "tablets), recheck after 15 minutes, and repeat until you are above 70 mg/dL. Then "
+        "eat a snack or meal.",
+        (
+            "hypo", "hypos", "hypoglyc*", "hypoglycaem*", "low blood sugar", "low blood glucose",
+            "low sugar", "low glucose", "blood sugar low", "blood sugar is low",
+            "blood sugar dropped", "sugar dropped", "going low", "shaky", "shaking", "sweating",
+            "sweaty", "15 15 rule", "treat a low", "treat low", "feel low",
+        ),
+    ),
+    Intent(
+        "hyperglycemia",
+        f"{_NOT_A_DOCTOR}\n\n**Hyperglycemia** (high blood sugar) can cause thirst, "
+        "frequent urination, fatigue and blurred vision. Check your blood sugar, drink "
+        "water, and follow your care plan. If it stays above 240 mg/dL, check for ketones "
+        "and contact your doctor.",
+        (
+            "hyper", "hypers", "hyperglyc*", "hyperglycaem*", "high blood sugar",
+            "high blood glucose", "high sugar", "high glucose", "blood sugar high",
+            "blood sugar is high", "sugar spike", "spike", "spikes", "very thirsty", "thirsty",
+            "thirst", "frequent urination", "peeing a lot", "urinating a lot", "blurry vision",
+            "blurred vision",
+        ),
+    ),
+    Intent(
+        "a1c",
+        f"{_NOT_A_DOCTOR}\n\nThe **A1C** test shows your average blood sugar over about "
+        "3 months. The ADA suggests **below 7%** for many adults, but your target should be "
+        "set with your care team. An A1C of 5.7-6.4% indicates prediabetes and 6.5% or "
+        "higher indicates diabetes. The app's GMI on the Blood Glucose page is an A1C "
+        "estimate from CGM data.",
+        (
+            "a1c", "hba1c", "a1c test", "hemoglobin a1c", "haemoglobin a1c", "glycated hemoglobin",
+            "glycated haemoglobin", "gmi", "glucose management indicator",
+        ),
+    ),
+    Intent(
+        "target_range",
+        f"{_NOT_A_DOCTOR}\n\nCommon ADA targets for adults with diabetes are **80-130 "
+        "mg/dL before meals** and **below 180 mg/dL 1-2 hours after** starting a meal. With "
+        "a CGM, aim for **more than 70% of the time between 70 and 180 mg/dL**. Your own "
+        "targets may differ.",
+        (
+            "normal blood sugar", "normal glucose", "normal range", "target range",
+            "target blood sugar", "blood sugar range", "glucose range", "blood sugar target*",
+            "fasting blood sugar", "fasting glucose", "fasting sugar", "after meals",
+            "after eating", "post meal", "postprandial", "time in range", "good blood sugar",
+            "good number", "healthy blood sugar",
+        ),
+    ),
+    Intent(
+        "ketones",
+        f"{_NOT_A_DOCTOR}\n\nCheck **ketones** when your blood sugar is over 240 mg/dL or "
+        "you are sick. Use urine strips or a blood ketone meter. Small amounts mean you "
+        "should drink water and recheck. Moderate or large amounts need a call to your "
+        "doctor right away.",
+        ("ketone*", "check ketones", "urine ketones", "blood ketones", "ketone strips"),
+    ),
+    Intent(
+        "dka_info",
+        f"{_NOT_A_DOCTOR}\n\n**Diabetic ketoacidosis (DKA)** happens when the body runs "
+        "short of insulin and burns fat for fuel, making ketones that turn the blood acidic. "
+        "Signs include high blood sugar, moderate or large ketones, nausea or vomiting, fast "
+        "or deep breathing and fruity-smelling breath. It is an emergency: if you have these "
+        "signs, go to the emergency room or call 911. Do not stop taking insulin when sick.",
+        ("dka", "ketoacidosis", "diabetic ketoacidosis"),
+    ),
+    Intent(
+        "exercise",
+        f"{_NOT_A_DOCTOR}\n\nThe ADA recommends **150 minutes of moderate activity a week**, "
+        "spread over at least 3 days, plus strength training twice a week. Check your blood "
+        "sugar before and after exercise, carry fast-acting carbs, and avoid intense "
+        "exercise if you have ketones.",
+        (
+            "exercise", "exercising", "workout", "workouts", "work out", "working out",
+            "physical activity", "walking", "walk", "running", "jogging", "gym", "sport*",
+            "swimming", "cycling", "yoga", "lifting weights",
+        ),
+    ),
+    Intent(
+        "carbs",
+        f"{_NOT_A_DOCTOR}\n\nThe ADA **Diabetes Plate** is an easy start: fill half the "
+        "plate with non-starchy vegetables, a quarter with lean protein and a quarter with "
+        "carbohydrate foods such as whole grains. Consistent carbohydrate portions help "
+        "keep blood sugar steady. Use the Diet Plan page to look up carbs in foods.",
+        (
+            "carb*", "carb counting", "count carbs", "counting carbs", "carbohydrate*",
+            "glycemic index", "glycaemic index", "low carb", "plate method", "diabetes plate",
+            "what to eat", "what should i eat", "diet", "meal plan*", "sugar free",
+        ),
+    ),
+    Intent(
+        "fruit",
+        f"{_NOT_A_DOCTOR}\n\nWhole **fruit** is a healthy choice. It has fiber and vitamins; "
+        "count it as carbohydrate. About 15 g of carbs is a small apple, half a banana or a "
+        "cup of berries. Choose whole fruit over juice, which raises blood sugar quickly.",
+        (
+            "fruit*", "banana*", "apple*", "grape*", "berries", "strawberr*", "orange*",
+            "mango*", "fruit juice",
+        ),
+    ),
+    Intent(
+        "alcohol",
+        f"{_NOT_A_DOCTOR}\n\nIf you drink **alcohol**, do so in moderation, with food, "
+        "and never on an empty stomach. Alcohol can cause low blood sugar for many hours "
+        "afterwards, especially with insulin or sulfonylureas. Check your blood sugar "
+        "before bed.",
+        ("alcohol", "beer", "wine", "liquor", "spirits", "cocktail*", "drinking", "drunk"),
+    ),
+    Intent(
+        "foot_care",
+        f"{_NOT_A_DOCTOR}\n\n**Check your feet every day** for cuts, blisters, redness or "
+        "swelling. Keep them clean and dry, wear well-fitting shoes, and never walk "
+        "barefoot. Get a foot exam at every visit. See your provider promptly about a sore "
+        "that is not healing.",
+        (
+            "foot", "feet", "foot care", "toe", "toes", "toenail*", "blister*", "numb feet",
+            "tingling feet", "neuropathy", "foot ulcer*", "sore on my foot",
+        ),
+    ),
+    Intent(
+        "sick_day",
+        f"{_NOT_A_DOCTOR}\n\n**When you are sick**, check your blood sugar every 3-4 hours "
+        "and test for ketones. Keep drinking fluids and keep taking your diabetes medicines "
+        "unless your doctor says otherwise. Call your doctor if you cannot keep food down, "
+        "have moderate or large ketones, or your blood sugar stays above 240 mg/dL.",
+        (
+            "sick day*", "sick", "feel ill", "feeling ill", "felt ill", "i'm ill", "am ill",
+            "been ill", "fell ill", "flu", "a cold", "fever", "stomach bug", "infection", "covid",
+            "diarrhea", "diarrhoea", "nausea", "nauseous", "vomiting", "throwing up",
+        ),
+    ),
+    Intent(
+        "insulin_storage",
+        f"{_NOT_A_DOCTOR}\n\nKeep **unopened insulin in the refrigerator** (36-46°F / "
+        "2-8°C) and never freeze it. Most in-use pens and vials can stay at room "
+        "temperature for about 28 days. Check your product's label. Keep insulin away from "
+        "heat and direct sunlight, and carry it in your hand luggage when flying.",
+        (
+            "store insulin", "storing insulin", "insulin storage", "keep insulin",
+            "insulin in the fridge", "refrigerate insulin", "insulin cold", "insulin warm",
+            "insulin expire*", "travel with insulin", "travel*", "flying", "flight",
+        ),
+    ),
+    Intent(
+        "diabetes_basics",
+        f"{_NOT_A_DOCTOR}\n\nCommon **signs of diabetes** include thirst, frequent "
+        "urination, unexplained weight loss, fatigue and blurred vision. **Prediabetes** "
+        "means blood sugar is higher than normal: A1C 5.7-6.4% or a fasting glucose of "
+        "100-125 mg/dL. Healthy eating, activity and modest weight loss can often prevent "
+        "or delay type 2 diabetes.",
+        (
+            "symptoms of diabetes", "signs of diabetes", "diabetes symptoms", "prediabetes",
+            "pre diabetes", "borderline diabetes", "type 1", "type 2", "type one", "type two",
+        ),
+    ),
+    Intent(
+        "app_help",
+        "Here is where to find things in the app:\n\n- **Medication Reminders** lets you "
+        "set daily, one-time or weekday reminders, mark doses as taken and export your "
+        "history.\n- **Schedule** keeps your doctor's appointments.\n- **Blood Glucose** "
+        "imports Dexcom or LibreView CSV files and shows time in range.\n- **Diet Plan** "
+        "looks up carbs and protein in foods.",
+        (
+            "set a reminder", "add a reminder", "reminder*", "appointment*", "schedule",
+            "export*", "download", "import", "cgm", "dexcom", "libre", "libreview",
+            "how does this app", "how do i use", "this app",
+        ),
+    ),
+)
+
+
+class TriageEngine:
+    """All lexicon phrases compiled into one Aho–Corasick automaton."""
+
+    def __init__(self, intents=LEXICON, local_coverage: float = LOCAL_ANSWER_COVERAGE):
+        self.intents = tuple(intents)
+        self.local_coverage = local_coverage
+        # Pattern i is (intent index, phrase, word count)
+        self._patterns = []
+        self._goto = [{}]
+        self._output = [[]]
+        for intent_index, intent in enumerate(self.intents):
+            for phrase in intent.phrases:
+                prefix = phrase.endswith("*")
+                for spelling in {phrase, phrase.replace("'", "")}:
+                    key = normalize(spelling.rstrip("*"))
+                    if prefix:
+                        key = key[:-1]
+                    self._add(key, (intent_index, phrase, len(key.split())))
+        self._link()
+
+    def _add(self, key: str, pattern: tuple):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self._patterns))
+        self._patterns.append((len(key), *pattern))
+
+    def _link(self):
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Outputs of the longest proper suffix are outputs here too
+                self._output[next_state] = self._output[next_state] + self._output[target]
+
+    def _scan(self, text: str):
+        """``(start, pattern)`` for every phrase occurrence in normalized ``text``."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in output[state]:
+                yield end - self._patterns[pattern][0], self._patterns[pattern]
+
+    def rank(self, text: str) -> list:
+        """Matched intents, emergencies first, then by score."""
+        normalized = normalize(text)
+        words = normalized.split()
+        # Offset of the space before each word
+        starts = [m.start() for m in re.finditer(" ", normalized)][: len(words)]
+
+        hits = [(start, *pattern[1:]) for start, pattern in self._scan(normalized)]
+        hits.extend(self._readings(normalized))
+        # Intent index -> {phrase: word count} and the word positions they cover
+        found = {}
+        covered = {}
+        for start, intent_index, phrase, n_words in hits:
+            first = bisect_right(starts, start) - 1
+            intent = self.intents[intent_index]
+            if intent.emergency and NEGATIONS.intersection(
+                words[max(0, first - NEGATION_WINDOW):first]
+            ):
+                continue
+            covered.setdefault(intent_index, set()).update(range(first, first + n_words))
+            found.setdefault(intent_index, {})[phrase] = n_words
+
+        if not found:
+            return []
+        content = [i for i, word in enumerate(words) if word not in STOP_WORDS] or range(len(words))
+        matches = [
+            Match(
+                self.intents[index],
+                sum(phrases.values()) + self.intents[index].priority,
+                sum(1 for i in content if i in covered[index]) / len(content),
+                tuple(phrases),
+            )
+            for index, phrases in found.items()
+        ]
+        matches.sort(key=lambda m: (m.emergency, m.score), reverse=True)
+        return matches
+
+    def _readings(self, text: str):
+        """``(start, intent index, phrase, word count)`` for glucose readings in ``text``."""
+        for reading in _READING.finditer(text):
+            value = int(reading.group(1))
+            for index, intent in enumerate(self.intents):
+                if intent.readings and intent.readings[0] <= value < intent.readings[1]:
+                    phrase = reading.group(0).strip()
+                    yield reading.start(), index, phrase, len(phrase.split())
+
+    def classify(self, text: str):
+        """The match to answer locally with, or None to ask the model."""
+        matches = self.rank(text)
+        if not matches:
+            return None
+        best = matches[0]
+        if best.emergency:
+            return best
+        # A canned answer to one of several topics would drop the others
+        if len(matches) == 1 and best.coverage >= self.local_coverage:
+            return best
+        return None